@@ -0,0 +1,310 @@
+"""
+Versioned JSON catalog API
+List endpoints return a columnar payload (one array per field) and every
+response carries an ETag derived from the catalog version, so clients can
+revalidate with If-None-Match and get an empty 304.
+"""
+import hashlib
+import logging
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from sqlalchemy import select
+
+from auth import admin_required
+from catalog import catalog_version
+from models import db
+from models.brand_flavor_tag import BrandFlavorTag
+from models.brewery import Brewery
+from models.flavor_chart import FlavorChart
+from models.flavor_tag import FlavorTag
+from models.region import Region
+from models.routing import statement_timeout
+from models.sake import Sake
+
+logger = logging.getLogger(__name__)
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# 公開フィールド名 -> カラム
+FIELDS = {
+    'id': Sake.id,
+    'name': Sake.name,
+    'brewery': Brewery.name,
+    'region': Region.name,
+    'region_id': Region.sakenowa_id,
+    'f1': FlavorChart.f1,
+    'f2': FlavorChart.f2,
+    'f3': FlavorChart.f3,
+    'f4': FlavorChart.f4,
+    'f5': FlavorChart.f5,
+    'f6': FlavorChart.f6,
+}
+DEFAULT_FIELDS = ('id', 'name', 'brewery', 'region')
+FLAVOR_FIELDS = frozenset(['f1', 'f2', 'f3', 'f4', 'f5', 'f6'])
+SYNC_STATUSES = ('running', 'succeeded', 'failed')
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+def _requested_fields():
+    raw = request.args.get('fields', '')
+    if not raw:
+        return list(DEFAULT_FIELDS)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _int_arg(name, default, maximum=None):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise ApiError(f"'{name}' must be an integer")
+    if value < 0:
+        raise ApiError(f"'{name}' must not be negative")
+    return min(value, maximum) if maximum is not None else value
+
+
+def _etag():
+    """Catalog version + full query string; identical for identical requests"""
+    raw = f'{catalog_version()}|{request.full_path}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def _not_modified(etag):
+    # 圧縮レスポンスは弱いETagになるため弱比較で照合する
+    return request.if_none_match.contains_weak(etag)
+
+
+def _cached_json(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+def _not_modified_response(etag):
+    # カタログに変更がなければDBに問い合わせずに304を返す
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _base_select(fields):
+    stmt = select(*[FIELDS[f].label(f) for f in fields])\
+        .select_from(Sake)\
+        .join(Brewery, Sake.brewery_id == Brewery.id)\
+        .join(Region, Brewery.region_id == Region.id)
+    if FLAVOR_FIELDS.intersection(fields):
+        stmt = stmt.outerjoin(FlavorChart, FlavorChart.sake_id == Sake.id)
+    return stmt
+
+
+def _value(field, value):
+    # フレーバー値は小数3桁で十分（チャート描画用）
+    if field in FLAVOR_FIELDS and value is not None:
+        return round(value, 3)
+    return value
+
+
+def _columnar(fields, rows):
+    """[{...}, {...}] -> {'field': [v1, v2], ...} without repeating keys"""
+    columns = {f: [] for f in fields}
+    for row in rows:
+        for f, value in zip(fields, row):
+            columns[f].append(_value(f, value))
+    return columns
+
+
+def _list_response(stmt, fields, extra=None):
+    limit = _int_arg('limit', DEFAULT_LIMIT, MAX_LIMIT)
+    offset = _int_arg('offset', 0)
+    rows = db.session.execute(
+        stmt.order_by(Sake.id).limit(limit).offset(offset)).all()
+    payload = {
+        'version': catalog_version(),
+        'count': len(rows),
+        'offset': offset,
+        'fields': fields,
+        'data': _columnar(fields, rows),
+    }
+    if extra:
+        payload.update(extra)
+    return payload
+
+
+@api_bp.route('/sakes')
+def list_sakes():
+    etag = _etag()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+
+    fields = _requested_fields()
+    stmt = _base_select(fields)
+
+    query = request.args.get('q', '').strip()
+    if query:
+        stmt = stmt.where(Sake.name.ilike(f'%{query}%'))
+
+    flavor_tag_id = request.args.get('flavor_tag', '').strip()
+    if flavor_tag_id:
+        stmt = stmt.join(BrandFlavorTag, BrandFlavorTag.sake_id == Sake.id)\
+            .join(FlavorTag, FlavorTag.id == BrandFlavorTag.flavor_tag_id)\
+            .where(FlavorTag.sakenowa_id == flavor_tag_id)
+
+    return _cached_json(_list_response(stmt, fields), etag)
+
+
+@api_bp.route('/sakes/<int:sake_id>')
+def get_sake(sake_id):
+    etag = _etag()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+
+    fields = _requested_fields()
+    row = db.session.execute(
+        _base_select(fields).where(Sake.id == sake_id)).first()
+    if row is None:
+        raise ApiError('Sake not found', 404)
+    payload = {f: _value(f, value) for f, value in zip(fields, row)}
+    payload['version'] = catalog_version()
+    return _cached_json(payload, etag)
+
+
+HISTORY_MAX_DAYS = 3 * 365
+
+
+def _history_columns(fields, rows):
+    columns = _columnar(fields, rows)
+    columns['period'] = [p.isoformat() for p in columns['period']]
+    return columns
+
+
+@api_bp.route('/sakes/<int:sake_id>/ranking-history')
+def get_sake_ranking_history(sake_id):
+    """Rank per sync generation for one sake (?category=overall, ?days=365)"""
+    etag = _etag()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+
+    sakenowa_id = db.session.execute(
+        select(Sake.sakenowa_id).where(Sake.id == sake_id)).scalar()
+    if sakenowa_id is None:
+        raise ApiError('Sake not found', 404)
+    category = request.args.get('category', 'overall')
+    days = _int_arg('days', 365, HISTORY_MAX_DAYS)
+    from ranking_history import rank_change, sake_trend
+    fields = ['period', 'rank', 'score', 'rank_delta']
+    rows = sake_trend(sakenowa_id, category, days=days)
+    return _cached_json({
+        'version': catalog_version(),
+        'sake_id': sake_id,
+        'category': category,
+        'change_30d': rank_change(sakenowa_id, category, days=30),
+        'fields': fields,
+        'data': _history_columns(fields, rows),
+    }, etag)
+
+
+@api_bp.route('/areas/<string:area_id>/ranking-history')
+def get_area_ranking_history(area_id):
+    """Top ranks per generation for one area ranking (?days=90, ?top=10)"""
+    etag = _etag()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+
+    days = _int_arg('days', 90, HISTORY_MAX_DAYS)
+    top = _int_arg('top', 10, 100)
+    from ranking_history import category_trend
+    rows = category_trend(f'area_{area_id}', days=days, top=top)
+    # 履歴はSakenowaのIDで持つので、現在の銘柄IDと名前に引き直す
+    brands = {r.sakenowa_id for r in rows}
+    sakes = {}
+    if brands:
+        sakes = {brand: {'id': sake_id, 'name': name}
+                 for brand, sake_id, name in db.session.execute(
+                     select(Sake.sakenowa_id, Sake.id, Sake.name)
+                     .where(Sake.sakenowa_id.in_(brands)))}
+    fields = ['period', 'sakenowa_id', 'rank', 'rank_delta']
+    return _cached_json({
+        'version': catalog_version(),
+        'area_id': area_id,
+        'fields': fields,
+        'data': _history_columns(fields, rows),
+        'sakes': sakes,
+    }, etag)
+
+
+@api_bp.route('/tags/<string:flavor_tag_id>/sakes')
+def list_tag_sakes(flavor_tag_id):
+    etag = _etag()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+
+    flavor_tag = FlavorTag.query.filter_by(sakenowa_id=flavor_tag_id).first()
+    if flavor_tag is None:
+        raise ApiError('Flavor tag not found', 404)
+
+    fields = _requested_fields()
+    stmt = _base_select(fields)\
+        .join(BrandFlavorTag, BrandFlavorTag.sake_id == Sake.id)\
+        .where(BrandFlavorTag.flavor_tag_id == flavor_tag.id)
+    tag = {'tag': {'id': flavor_tag.sakenowa_id, 'name': flavor_tag.name}}
+    return _cached_json(_list_response(stmt, fields, extra=tag), etag)
+
+
+@api_bp.route('/export/<string:dataset>')
+@admin_required
+@statement_timeout(10 * 60 * 1000)  # 全件エクスポートは通常の読み取り上限を超える
+def export_dataset(dataset):
+    """Stream a full or incremental (?since=) dump as csv/ndjson/parquet"""
+    from export import DEFAULT_CHUNK_ROWS, ExportError, ExportJob, parse_since
+    try:
+        job = ExportJob(dataset, request.args.get('format', 'csv'),
+                        since=parse_since(request.args.get('since')),
+                        chunk_rows=_int_arg('chunk', DEFAULT_CHUNK_ROWS, 10000)
+                        or DEFAULT_CHUNK_ROWS)
+    except ExportError as e:
+        raise ApiError(str(e))
+
+    response = Response(stream_with_context(job.encoded_chunks()),
+                        mimetype=job.mimetype)
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="{dataset}.{job.fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    if job.watermark is not None:
+        # 次回の増分エクスポートで since に渡す値
+        response.headers['X-Export-Watermark'] = job.watermark.isoformat()
+    return response
+
+
+@api_bp.route('/admin/sync-runs')
+@admin_required
+def list_sync_runs():
+    """Recent Sakenowa sync runs, newest first (?limit=, ?status=)"""
+    from sync_history import recent_runs
+    status = request.args.get('status')
+    if status and status not in SYNC_STATUSES:
+        raise ApiError(f"'status' must be one of {', '.join(SYNC_STATUSES)}")
+    runs = recent_runs(limit=_int_arg('limit', 20, 200) or 20, status=status)
+    response = jsonify({'runs': [run.to_dict() for run in runs]})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
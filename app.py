@@ -1,25 +1,56 @@
+import time
+
+# 起動時間の計測はモジュールのimportから始める（/health の boot_ms）
+_import_started = time.perf_counter()
+
 import os
 import logging
 import sys
-from flask import Flask, jsonify
+from flask import Flask
 from flask_login import LoginManager
-from sqlalchemy import text
+from logging_config import configure_logging
+from config import (auth_config, boot_config, catalog_config,
+                    database_config, health_config, normalize_database_url,
+                    profiling_config, throttling_config, upload_config)
+from auth import init_auth
+from commands import bootstrap_database, register_commands
 from models import db
+from models.routing import init_routing
 
 # Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("sake_app.log"),
-        logging.StreamHandler(sys.stdout)
-    ])
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize login manager
 login_manager = LoginManager()
 
 
+# fork後の子プロセスで破棄するエンジン（最後に作ったアプリの分だけ持つ）
+_fork_engines = []
+
+
+def _dispose_inherited_engines():
+    for engine in _fork_engines:
+        engine.dispose(close=False)
+
+
+# フックは取り消せないので、create_app() ごとではなくプロセスで1回だけ登録する
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_inherited_engines)
+
+
+def _dispose_engines_after_fork(app):
+    """Make the app safe to build before fork (gunicorn --preload)
+
+    Pooled connections opened in the master must not be shared with
+    workers, so each child drops the inherited pool without closing the
+    parent's sockets. Only the most recently created app's engines are
+    kept, so apps built by tests or CLI commands are not held forever.
+    """
+    with app.app_context():
+        _fork_engines[:] = db.engines.values()
+
+
 def create_app():
     """Application factory function"""
     try:
@@ -28,17 +59,12 @@ def create_app():
         logger.debug("Flask application instance created")
 
         # Get the database URL from environment variables
-        database_url = os.environ.get('DATABASE_URL')
-
-        # URLが 'postgres://' で始まる場合は 'postgresql://' に変換
-        if database_url and database_url.startswith("postgres://"):
-            database_url = database_url.replace("postgres://", "postgresql://",
-                                                1)
+        database_url = normalize_database_url(os.environ.get('DATABASE_URL'))
 
         if not database_url:
             logger.error("No DATABASE_URL found in environment variables")
             raise ValueError("DATABASE_URL is required")
-        logger.debug(f"Database URL configuration found: {database_url}")
+        logger.debug("Database URL configuration found")
 
         # Debug log for configuration
         logger.debug("Starting Flask configuration...")
@@ -50,16 +76,34 @@ def create_app():
 
         # Configure Flask application
         app.config.update(
-            SQLALCHEMY_DATABASE_URI=database_url,
             SQLALCHEMY_TRACK_MODIFICATIONS=False,
             SECRET_KEY=os.environ.get('SECRET_KEY'),
+            **database_config(database_url),
+            **boot_config(),
+            **auth_config(),
+            **catalog_config(),
+            **upload_config(),
+            **health_config(),
+            **profiling_config(),
+            **throttling_config(),
         )
+        # 日本語を\uXXXXにエスケープしない（JSONのバイト数が約半分になる）
+        app.json.ensure_ascii = False
         logger.info("Flask configuration completed")
 
         # Initialize extensions with debug logs
         logger.debug("Starting Flask extensions initialization...")
+        # 機能ごとのモジュールは使う所で読み込む（無効な機能の分は起動時に払わない）
         try:
+            # 最初に登録したafter_requestが最後に実行される → 圧縮は最後
+            from streaming import init_compression
+            init_compression(app)
+            # 制限超過はDBに触れる前（最初のbefore_request）で429を返す
+            if app.config['RATE_LIMIT_ENABLED']:
+                from throttling import init_throttling
+                init_throttling(app)
             db.init_app(app)
+            init_routing(app)
             logger.debug("Database initialization completed")
 
             login_manager.init_app(app)
@@ -68,71 +112,75 @@ def create_app():
             login_manager.login_view = 'main.login'
             logger.info("Flask extensions initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize extensions: {str(e)}",
+            logger.error("Failed to initialize extensions: %s", e,
                          exc_info=True)
             raise
 
-        # Add health check endpoint
-        @app.route('/health')
-        def health_check():
-            return jsonify({"status": "healthy", "port": 5000})
+        # /health, /health/live, /health/ready（ロードバランサは ready を見る）
+        from health import init_health
+        init_health(app)
 
-        # user_loaderはapp.app_context()の外に置くべきです
-        # login_manager.user_loader デコレータはアプリケーションインスタンスに関連付けられるため
-        from models.user import User  # user_loaderの前にインポート
+        # user_loaderはセッション内の本人情報とキャッシュを優先し、DBアクセスを避ける
+        init_auth(app, login_manager)
 
-        @login_manager.user_loader
-        def load_user(id):
-            try:
-                return User.query.get(int(id))
-            except Exception as e:
-                logger.error(f"Error loading user {id}: {e}")
-                return None
+        # ハッシュ付き静的ファイル（flask build-assets の成果物）を配信
+        from assets import init_assets
+        init_assets(app)
+        # 一覧カードのタグ表示（listingのtag_idsから、クエリなしで引く）
+        from tag_loader import init_tag_loader
+        init_tag_loader(app)
 
         # Blueprintのインポートと登録もapp.app_context()の外に置くべきです
         try:
             from routes import bp  # routesモジュールからbpをインポート
             app.register_blueprint(bp)  # Blueprintを登録
+            from api import api_bp
+            app.register_blueprint(api_bp)
             logger.info("Blueprints registered successfully")
         except Exception as e:
-            logger.error(f"Failed to register blueprints: {str(e)}",
+            logger.error("Failed to register blueprints: %s", e,
                          exc_info=True)
             raise
 
-        # データベース関連の操作はapp.app_context()内で実行します
-        with app.app_context():
-
-            try:
-                db.create_all()
-                logger.info("All tables created successfully (if not exist)")
-            except Exception as e:
-                logger.error(f"Failed to create tables: {e}", exc_info=True)
-
-            # 👇ここを追記（データの初期投入）
-            try:
-                from sakenowa import update_database
-                logger.info("Running initial update_database() for Sakenowa")
-                with app.app_context():
-                    update_database()
-                logger.info("Initial data update completed")
-            except Exception as e:
-                logger.error(f"Initial data update failed: {e}", exc_info=True)
-
-        logger.info("Application creation completed successfully")
+        register_commands(app)
+
+        # 一部のリクエストだけプロファイルを取る（無効ならミドルウェア自体を入れない）
+        if (app.config['PROFILE_SAMPLE_RATE'] or app.config['PROFILE_TOKEN']
+                or app.config['ADMIN_API_TOKEN']):
+            from profiler import init_profiling
+            init_profiling(app)
+
+        # カタログのスナップショットをmmap（--preload ならfork前に1回だけ）
+        # numpy はスナップショットが実際にあるときだけ読み込まれる
+        from catalog_snapshot import init_snapshot
+        init_snapshot(app)
+
+        # 本番の起動経路ではDDLもネットワークI/Oも行わない
+        # （テーブル作成は flask db upgrade / flask init-db、同期は flask sync-sakenowa）
+        if app.config['BOOTSTRAP_ON_START']:
+            bootstrap_database(app)
+
+        _dispose_engines_after_fork(app)
+
+        boot_ms = (time.perf_counter() - _import_started) * 1000
+        app.config['BOOT_MS'] = round(boot_ms, 1)
+        logger.info("Application creation completed in %.1f ms", boot_ms)
         return app
 
     except Exception as e:
-        logger.error(f"Error creating application: {str(e)}", exc_info=True)
+        logger.error("Error creating application: %s", e, exc_info=True)
         raise
 
 
 if __name__ == "__main__":
     port = 5000
+    # 開発サーバーでは従来通り起動時にテーブル作成とデータ投入を行う
+    os.environ.setdefault('SAKE_BOOTSTRAP', '1')
     try:
         app = create_app()
-        logger.info(f"Starting Flask application on port {port}")
+        logger.info("Starting Flask application on port %s", port)
         # Always serve on 0.0.0.0 to make it accessible
         app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
     except Exception as e:
-        logger.error(f"Failed to start application: {str(e)}", exc_info=True)
+        logger.error("Failed to start application: %s", e, exc_info=True)
         sys.exit(1)
@@ -0,0 +1,283 @@
+"""
+Static asset pipeline
+`flask build-assets` writes content-hashed copies of the files under
+static/ to static/dist/, together with gzip/brotli variants and resized
+WebP/AVIF versions of the images, and records them in manifest.json.
+Templates call asset_url() instead of url_for('static', ...). It runs
+once at build time (bin/post_compile), not when a dyno starts.
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import Blueprint, current_app, send_from_directory, url_for
+
+from streaming import preferred_encoding
+
+logger = logging.getLogger(__name__)
+
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+FAR_FUTURE = 365 * 24 * 3600
+
+TEXT_EXTENSIONS = ('.css', '.js', '.svg', '.json')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+RESPONSIVE_WIDTHS = (480, 960, 1600)
+
+# ルート直下のアイコン（1.5MB）は縮小版だけを配信する
+ICON_SOURCE = 'generated-icon.png'
+ICON_SIZES = {'favicon.png': 64, 'apple-touch-icon.png': 180}
+
+# ビルドで使う任意の依存: import名 -> (パッケージ名, ないと省略される処理)
+OPTIONAL_PACKAGES = {
+    'brotli': ('brotli', 'precompressed .br files'),
+    'PIL': ('Pillow', 'WebP/AVIF image variants and the resized icons'),
+}
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+bp = Blueprint('assets', __name__)
+
+_manifest = {'files': {}, 'images': {}}
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(logical, data, ext=None):
+    root, original_ext = posixpath.splitext(logical)
+    return f'{root}.{_digest(data)}{ext or original_ext}'
+
+
+def _write(dist_dir, relpath, data):
+    path = os.path.join(dist_dir, *relpath.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def missing_packages():
+    """[(package, what the build skips)] for optional packages not installed"""
+    return [(package, skipped)
+            for module, (package, skipped) in OPTIONAL_PACKAGES.items()
+            if importlib.util.find_spec(module) is None]
+
+
+def _precompress(path, data):
+    """Write .gz (and .br when the brotli package is installed) next to path"""
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def _image_variants(dist_dir, logical, source_path):
+    """Resized WebP/AVIF copies; needs Pillow (AVIF needs Pillow >= 11.3)"""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping image variants")
+        return []
+
+    formats = ['webp']
+    if features.check('avif'):
+        formats.insert(0, 'avif')
+
+    variants = []
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+        widths = [w for w in RESPONSIVE_WIDTHS if w < image.width]
+        widths.append(image.width)
+        for fmt in formats:
+            for width in widths:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+                root = posixpath.splitext(logical)[0]
+                tmp = os.path.join(dist_dir, '_tmp.' + fmt)
+                resized.save(tmp, fmt.upper(), quality=75)
+                with open(tmp, 'rb') as f:
+                    data = f.read()
+                os.remove(tmp)
+                relpath = f'{root}-{width}w.{_digest(data)}.{fmt}'
+                _write(dist_dir, relpath, data)
+                variants.append({'format': fmt, 'width': width,
+                                 'path': relpath})
+    return variants
+
+
+def _icons(dist_dir, root_path):
+    source = os.path.join(root_path, ICON_SOURCE)
+    if not os.path.exists(source):
+        return {}
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    files = {}
+    with Image.open(source) as image:
+        for name, size in ICON_SIZES.items():
+            tmp = os.path.join(dist_dir, '_tmp.png')
+            image.resize((size, size), Image.LANCZOS).save(tmp, 'PNG',
+                                                         optimize=True)
+            with open(tmp, 'rb') as f:
+                data = f.read()
+            os.remove(tmp)
+            files[name] = _hashed_name(name, data)
+            _write(dist_dir, files[name], data)
+    return files
+
+
+def _rewrite_css_urls(css, css_logical, files):
+    """Point url(...) references at the hashed copies"""
+    base = posixpath.dirname(css_logical)
+
+    def replace(match):
+        target = match.group(2)
+        if re.match(r'^(data:|https?:|//|/|#)', target):
+            return match.group(0)
+        logical = posixpath.normpath(posixpath.join(base, target))
+        if logical in files:
+            rel = posixpath.relpath(files[logical], base or '.')
+            return f'url("{rel}")'
+        return f'url("/static/{logical}")'
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def build_assets(app):
+    """Rebuild static/dist and return the new manifest"""
+    static_dir = app.static_folder
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = [d for d in dirnames
+                       if os.path.join(dirpath, d) != dist_dir]
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            logical = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            sources.append((logical, path))
+
+    files, images = {}, {}
+
+    # 画像を先に処理し、CSS内のurl()をハッシュ付きの名前に書き換えられるようにする
+    for logical, path in sources:
+        if not logical.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        files[logical] = _hashed_name(logical, data)
+        _write(dist_dir, files[logical], data)
+        images[logical] = _image_variants(dist_dir, logical, path)
+
+    for logical, path in sources:
+        if logical in files:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if logical.endswith('.css'):
+            data = _rewrite_css_urls(data.decode('utf-8'), logical,
+                                     files).encode('utf-8')
+        files[logical] = _hashed_name(logical, data)
+        written = _write(dist_dir, files[logical], data)
+        if logical.endswith(TEXT_EXTENSIONS):
+            _precompress(written, data)
+
+    files.update(_icons(dist_dir, app.root_path))
+
+    manifest = {'files': files, 'images': images}
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w',
+              encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    logger.info("Built %d assets (%d images with variants)", len(files),
+                sum(1 for v in images.values() if v))
+    return manifest
+
+
+def load_manifest(app):
+    global _manifest
+    path = os.path.join(app.static_folder, DIST_DIRNAME, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {'files': {}, 'images': {}}
+    except ValueError as e:
+        logger.error("Invalid asset manifest %s: %s", path, e)
+        _manifest = {'files': {}, 'images': {}}
+
+
+def asset_url(filename, default=''):
+    """url_for('static', filename=...) replacement that emits hashed URLs
+
+    Falls back to the plain static URL when the pipeline has not been run,
+    or to `default` for build-only assets such as favicon.png.
+    """
+    hashed = _manifest['files'].get(filename)
+    if hashed:
+        return url_for('assets.serve', filename=hashed)
+    if default != '' and not os.path.exists(
+            os.path.join(current_app.static_folder, filename)):
+        return default
+    return url_for('static', filename=filename)
+
+
+def image_srcset(filename, fmt):
+    """srcset string for one format, e.g. for <source type="image/webp">"""
+    variants = _manifest['images'].get(filename) or []
+    return ', '.join(
+        f"{url_for('assets.serve', filename=v['path'])} {v['width']}w"
+        for v in variants if v['format'] == fmt)
+
+
+def image_formats(filename):
+    variants = _manifest['images'].get(filename) or []
+    return sorted({v['format'] for v in variants})
+
+
+@bp.route('/assets/<path:filename>')
+def serve(filename):
+    """Serve hashed files forever, preferring precompressed variants"""
+    dist_dir = os.path.join(current_app.static_folder, DIST_DIRNAME)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    suffixes = {'br': '.br', 'gzip': '.gz'}
+    available = [enc for enc, suffix in suffixes.items()
+                 if os.path.exists(os.path.join(dist_dir, filename + suffix))]
+
+    encoding = preferred_encoding(available)
+    served = filename + suffixes[encoding] if encoding else filename
+
+    response = send_from_directory(dist_dir, served, mimetype=mimetype,
+                                   max_age=FAR_FUTURE)
+    response.headers['Cache-Control'] = (
+        f'public, max-age={FAR_FUTURE}, immutable')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_assets(app):
+    """Register the /assets route and the template helpers"""
+    load_manifest(app)
+    app.register_blueprint(bp)
+    app.jinja_env.globals.update(asset_url=asset_url,
+                                 image_srcset=image_srcset,
+                                 image_formats=image_formats)
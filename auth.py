@@ -0,0 +1,131 @@
+"""
+Login session helpers
+The signed Flask session carries a small identity (id, username) so that
+most requests can restore current_user without touching the users table.
+"""
+import hmac
+import logging
+import time
+from functools import wraps
+
+from flask import abort, current_app, request, session
+from flask_login import (UserMixin, current_user, user_logged_in,
+                         user_logged_out)
+
+from cache import TTLCache
+from models import db
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_SESSION_KEY = '_identity'
+
+# user id -> SessionUser
+_user_cache = TTLCache('users', ttl=60, maxsize=4096)
+
+
+class SessionUser(UserMixin):
+    """Lightweight stand-in for User used as current_user"""
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+def _store_identity(user):
+    session[IDENTITY_SESSION_KEY] = {
+        'id': user.id,
+        'username': user.username,
+        'iat': int(time.time()),
+    }
+
+
+def load_user(user_id):
+    """Flask-Login user_loader: session identity, then cache, then database"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    max_age = current_app.config['SESSION_IDENTITY_MAX_AGE']
+    identity = session.get(IDENTITY_SESSION_KEY)
+    if (identity and identity.get('id') == user_id
+            and time.time() - identity.get('iat', 0) < max_age):
+        return SessionUser(user_id, identity.get('username'))
+
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    try:
+        user = db.session.get(User, user_id)
+    except Exception as e:
+        logger.error("Error loading user %s: %s", user_id, e)
+        return None
+    if user is None:
+        session.pop(IDENTITY_SESSION_KEY, None)
+        return None
+
+    session_user = SessionUser(user.id, user.username)
+    _user_cache.set(user_id, session_user,
+                    ttl=current_app.config['USER_CACHE_TTL'])
+    _store_identity(user)
+    return session_user
+
+
+def forget_user(user_id):
+    """Drop a user from this worker's cache (e.g. after deleting them)"""
+    _user_cache.pop(int(user_id))
+
+
+def _has_admin_token():
+    token = current_app.config.get('ADMIN_API_TOKEN')
+    header = request.headers.get('Authorization', '')
+    if not token or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].strip().encode(),
+                               token.encode())
+
+
+def is_admin():
+    """Bearer ADMIN_API_TOKEN, or a logged-in user in ADMIN_USERNAMES"""
+    if _has_admin_token():
+        return True
+    return (current_user.is_authenticated and current_user.username
+            in current_app.config.get('ADMIN_USERNAMES', ()))
+
+
+def admin_required(view):
+    """401 for anonymous callers, 403 for non-admin users"""
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not is_admin():
+            abort(403 if current_user.is_authenticated else 401)
+        return view(*args, **kwargs)
+
+    return wrapped
+
+
+def _on_login(sender, user, **extra):
+    _store_identity(user)
+    forget_user(user.id)
+
+
+def _on_logout(sender, user, **extra):
+    session.pop(IDENTITY_SESSION_KEY, None)
+    if user is not None and getattr(user, 'id', None) is not None:
+        forget_user(user.id)
+
+
+def init_auth(app, login_manager):
+    """Register the user loader and the session identity signals"""
+    login_manager.user_loader(load_user)
+    user_logged_in.connect(_on_login, app)
+    user_logged_out.connect(_on_logout, app)
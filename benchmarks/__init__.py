@@ -0,0 +1,5 @@
+"""
+Benchmark harnesses
+Run them as modules from the project root, e.g.
+    python -m benchmarks.bench_routes --scale 10
+"""
@@ -0,0 +1,178 @@
+"""
+Offline ingest benchmark
+Starts the Sakenowa stand-in server in a subprocess, points
+sakenowa.update_database() at it and records wall time per phase, rows
+per second, peak RSS and the number of SQL statements issued.
+
+    python -m benchmarks.bench_ingest --scale 10
+    python -m benchmarks.bench_ingest --scale 1 --latency-ms 200 --error-rate 0.1
+
+DATABASE_URL defaults to a throw-away SQLite file. Pointing it at
+PostgreSQL requires --reset, because the tables are dropped first.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmarks.bench_routes import RESULTS_DIR, QueryCounter, _git_commit
+from benchmarks.sakenowa_stub import add_stub_arguments
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _stub_command(args, port):
+    cmd = [sys.executable, '-m', 'benchmarks.sakenowa_stub',
+           '--port', str(port), '--scale', str(args.scale),
+           '--latency-ms', str(args.latency_ms),
+           '--error-rate', str(args.error_rate),
+           '--error-status', str(args.error_status),
+           '--body-rate', str(args.body_rate), '--seed', str(args.seed)]
+    if args.fixtures:
+        cmd += ['--fixtures', args.fixtures]
+    for endpoint in args.fail_endpoint:
+        cmd += ['--fail-endpoint', endpoint]
+    return cmd
+
+
+def _wait_until_up(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('stub server exited during start-up')
+        try:
+            # 存在しないパスへの404でも起動確認になる
+            urllib.request.urlopen(f'{base_url}/ping', timeout=1)
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.1)
+            continue
+        return
+    raise RuntimeError('stub server did not start in time')
+
+
+def _peak_rss_kb():
+    # Linux は KB、macOS は bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _table_counts():
+    from sqlalchemy import func, select
+    from models import db
+    counts = {}
+    for table in db.metadata.sorted_tables:
+        counts[table.name] = db.session.execute(
+            select(func.count()).select_from(table)).scalar()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_stub_arguments(parser)
+    parser.add_argument('--reset', action='store_true',
+                        help='allow dropping tables in a non-SQLite database')
+    parser.add_argument('--output', help='result JSON path')
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.gettempdir(), 'sake_ingest_bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('CATALOG_SNAPSHOT_PATH', os.path.join(
+        tempfile.gettempdir(), 'sake_ingest_bench.snapshot'))
+    # 前回の失敗分のチェックポイントから再開すると取得時間が測れない
+    os.environ['SAKENOWA_CHECKPOINT_DIR'] = tempfile.mkdtemp(
+        prefix='sake_ingest_checkpoints_')
+    if not os.environ['DATABASE_URL'].startswith('sqlite') and not args.reset:
+        parser.error('the benchmark drops all tables; pass --reset to confirm')
+
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    stub = subprocess.Popen(_stub_command(args, port), cwd=PROJECT_ROOT)
+    try:
+        _wait_until_up(base_url, stub)
+        # sakenowa は import 時に SAKENOWA_API_BASE を読む
+        os.environ['SAKENOWA_API_BASE'] = base_url
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+        from app import create_app
+        from models import db
+        import sakenowa
+
+        app = create_app()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            engines = list(db.engines.values())
+
+            rss_before = _peak_rss_kb()
+            with QueryCounter(engines) as counter:
+                started = time.perf_counter()
+                ok = sakenowa.update_database()
+                wall = time.perf_counter() - started
+            rss_peak = _peak_rss_kb()
+            statements = counter.count
+            counts = _table_counts()
+            dialect = db.engine.dialect.name
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    phases = dict(sakenowa.last_phase_timings)
+    fetch_s = phases.get('fetch', 0)
+    write_s = sum(v for k, v in phases.items() if k != 'fetch')
+    rows = sum(counts.values())
+    report = {
+        'commit': _git_commit(),
+        'scale': args.scale,
+        'dialect': dialect,
+        'python': platform.python_version(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'stub': {'latency_ms': args.latency_ms, 'error_rate': args.error_rate,
+                 'body_rate': args.body_rate,
+                 'fail_endpoints': args.fail_endpoint,
+                 'fixtures': args.fixtures},
+        'success': ok,
+        'wall_s': round(wall, 3),
+        'phases_s': phases,
+        'rows': counts,
+        'rows_per_s': round(rows / write_s, 1) if write_s else None,
+        'statements': statements,
+        'peak_rss_kb': rss_peak,
+        'rss_growth_kb': rss_peak - rss_before,
+    }
+
+    print(f"success={ok} wall {wall:.2f}s (fetch {fetch_s:.2f}s, "
+          f"write {write_s:.2f}s)  {rows} rows  "
+          f"{report['rows_per_s']} rows/s  {statements} statements  "
+          f"peak RSS {rss_peak / 1024:.1f} MB")
+    for phase, seconds in phases.items():
+        print(f'  {phase:<20}{seconds:>9.3f}s')
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"ingest-{report['commit']}-x{args.scale:g}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Wrote {output}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Route-level benchmark
+Seeds a synthetic catalog, drives every route in routes.py (and the JSON
+API) through the Flask test client and records latency percentiles, SQL
+statement counts and peak Python memory per route.
+
+    python -m benchmarks.bench_routes --scale 10
+    python -m benchmarks.bench_routes --scale 1 --compare benchmarks/results/abc123-x1.json
+
+DATABASE_URL defaults to a throw-away SQLite file. Pointing it at
+PostgreSQL requires --reset, because seeding drops every table.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+logger = logging.getLogger('benchmarks.routes')
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL,
+            text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Counts statements on every engine while active"""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+        self.count = 0
+        self._event = event
+        self._engines = engines
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        for engine in self._engines:
+            self._event.listen(engine, 'before_cursor_execute',
+                               self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self._engines:
+            self._event.remove(engine, 'before_cursor_execute',
+                               self._on_execute)
+
+
+def build_scenarios(app):
+    """(name, path, needs_login) for each route, using ids from the seed"""
+    from models import db
+    from models.flavor_tag import FlavorTag
+    from models.flavor_chart import FlavorChart
+    from models.ranking import Ranking
+    from models.region import Region
+    from models.sake import Sake
+
+    with app.app_context():
+        sake_id = db.session.query(FlavorChart.sake_id).order_by(
+            FlavorChart.sake_id).limit(1).scalar()
+        tag = FlavorTag.query.order_by(FlavorTag.id).first()
+        region = db.session.query(Region).join(
+            Ranking, Ranking.category == 'area_' + Region.sakenowa_id
+        ).first() or Region.query.first()
+        name_part = db.session.query(Sake.name).limit(1).scalar()[:1]
+
+    return [
+        ('index', '/', False),
+        ('search_all', '/search', False),
+        ('search_name', f'/search?q={name_part}', False),
+        ('search_tag', f'/search?flavor_tag={tag.sakenowa_id}', False),
+        ('search_direction',
+         '/search?flavor_direction=dry&flavor_intensity=7', False),
+        ('search_region', f'/search?region={region.sakenowa_id}', False),
+        ('sake_detail', f'/sake/{sake_id}', False),
+        ('regions', '/regions', False),
+        ('area_rankings', f'/area_rankings/{region.sakenowa_id}', False),
+        ('flavor_tag_ranking', f'/flavor_tag/{tag.sakenowa_id}', False),
+        ('login_form', '/login', False),
+        ('signup_form', '/signup', False),
+        ('mypage', '/mypage', True),
+        ('api_sakes', '/api/v1/sakes?fields=id,name,f1,f2&limit=200', False),
+        ('api_sake', f'/api/v1/sakes/{sake_id}', False),
+        ('api_tag_sakes', f'/api/v1/tags/{tag.sakenowa_id}/sakes', False),
+    ]
+
+
+def run_scenario(app, client, path, iterations, warmup):
+    from models import db
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    for _ in range(warmup):
+        client.get(path).get_data()
+
+    latencies, queries, statuses, sizes = [], [], set(), []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(iterations):
+        with QueryCounter(engines) as counter:
+            started = time.perf_counter()
+            response = client.get(path)
+            body = response.get_data()  # ストリーミング応答も最後まで読む
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+        statuses.add(response.status_code)
+        sizes.append(len(body))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'path': path,
+        'iterations': iterations,
+        'status': sorted(statuses),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p90_ms': round(_percentile(latencies, 90), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': max(queries),
+        'bytes': max(sizes),
+        'peak_mem_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(current, baseline_path):
+    """Print p50/p90/query deltas against an earlier result file"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline.get('commit')} (x{baseline.get('scale')})")
+    print(f"{'route':<22}{'p50 ms':>18}{'p90 ms':>18}{'queries':>12}")
+    for name, now in current['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            print(f'{name:<22}{"(new)":>18}')
+            continue
+
+        def delta(key):
+            if not before[key]:
+                return f"{now[key]}"
+            pct = (now[key] - before[key]) / before[key] * 100
+            return f"{now[key]} ({pct:+.0f}%)"
+
+        print(f"{name:<22}{delta('p50_ms'):>18}{delta('p90_ms'):>18}"
+              f"{before['queries']:>5} -> {now['queries']:<4}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=float, default=1,
+                        help='catalog size multiple (1, 10, 100)')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--routes', help='comma separated scenario names')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='reuse the data already in DATABASE_URL')
+    parser.add_argument('--reset', action='store_true',
+                        help='allow seeding a non-SQLite database')
+    parser.add_argument('--output', help='result JSON path')
+    parser.add_argument('--compare', help='earlier result JSON to diff against')
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.gettempdir(), 'sake_bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    database_url = os.environ['DATABASE_URL']
+    if (not args.no_seed and not database_url.startswith('sqlite')
+            and not args.reset):
+        parser.error('seeding drops all tables; pass --reset to confirm')
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # 同じクライアントから連打するので、計測ではレート制限を外す
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    from app import create_app
+    from benchmarks.catalog_factory import (BENCH_PASSWORD, BENCH_USERNAME,
+                                            seed_catalog)
+    from models import db
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    counts = None
+    if not args.no_seed:
+        with app.app_context():
+            started = time.perf_counter()
+            counts = seed_catalog(scale=args.scale)
+            print(f"Seeded x{args.scale} in "
+                  f"{time.perf_counter() - started:.1f}s: {counts}")
+
+    scenarios = build_scenarios(app)
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        scenarios = [s for s in scenarios if s[0] in wanted]
+
+    anonymous = app.test_client()
+    logged_in = app.test_client()
+    logged_in.post('/login', data={'username': BENCH_USERNAME,
+                                   'password': BENCH_PASSWORD})
+
+    results = {}
+    for name, path, needs_login in scenarios:
+        client = logged_in if needs_login else anonymous
+        results[name] = run_scenario(app, client, path, args.iterations,
+                                     args.warmup)
+        r = results[name]
+        print(f"{name:<22} p50 {r['p50_ms']:>8.2f} ms  p90 {r['p90_ms']:>8.2f}"
+              f" ms  {r['queries']:>3} queries  {r['peak_mem_kb']:>9.1f} KB"
+              f"  {r['status']}")
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+
+    report = {
+        'commit': _git_commit(),
+        'scale': args.scale,
+        'dialect': dialect,
+        'python': platform.python_version(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'seed_counts': counts,
+        'routes': results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['commit']}-x{args.scale:g}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
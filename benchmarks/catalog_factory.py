@@ -0,0 +1,190 @@
+"""
+Synthetic catalog generator
+Produces a Sakenowa-shaped catalog (plus users and reviews) at a multiple
+of the real dataset size, using Core bulk inserts so that 100x stays
+practical on SQLite as well as PostgreSQL.
+"""
+import logging
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from catalog import refresh_listings, refresh_rollups, refresh_tag_leaderboards
+from models import db
+from models.brand_flavor_tag import BrandFlavorTag
+from models.brewery import Brewery
+from models.flavor_chart import FlavorChart, quantize
+from models.flavor_tag import FlavorTag
+from models.ranking import Ranking
+from models.region import Region
+from models.review import Review
+from models.sake import Sake
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+# おおよその実データ件数（さけのわ API, 2024年時点）
+BASE_SIZES = {
+    'breweries': 1700,
+    'sakes': 3200,
+    'flavor_tags': 180,
+    'users': 200,
+    'reviews': 2000,
+}
+REGION_COUNT = 47
+FLAVOR_CHART_RATIO = 0.35
+TAGS_PER_SAKE = (3, 10)
+OVERALL_RANKING_SIZE = 100
+AREA_RANKING_SIZE = 10
+BATCH_SIZE = 5000
+
+BENCH_USERNAME = 'bench_user'
+BENCH_PASSWORD = 'bench-password'
+
+PREFECTURES = [
+    '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県', '茨城県',
+    '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県', '新潟県', '富山県',
+    '石川県', '福井県', '山梨県', '長野県', '岐阜県', '静岡県', '愛知県', '三重県',
+    '滋賀県', '京都府', '大阪府', '兵庫県', '奈良県', '和歌山県', '鳥取県', '島根県',
+    '岡山県', '広島県', '山口県', '徳島県', '香川県', '愛媛県', '高知県', '福岡県',
+    '佐賀県', '長崎県', '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県'
+]
+NAME_PARTS = ['山', '川', '鶴', '月', '花', '泉', '雪', '菊', '松', '風', '白', '龍',
+              '正', '宗', '錦', '美', '光', '寿', '酔', '峰']
+
+
+def scaled_sizes(scale):
+    sizes = {k: max(1, int(v * scale)) for k, v in BASE_SIZES.items()}
+    sizes['flavor_tags'] = BASE_SIZES['flavor_tags']
+    sizes['regions'] = REGION_COUNT
+    return sizes
+
+
+def _name(rng, suffix):
+    return ''.join(rng.choice(NAME_PARTS)
+                   for _ in range(rng.randint(2, 3))) + suffix
+
+
+def _bulk(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def _reset_sequences():
+    """IDを明示して投入したので、PostgreSQLのシーケンスを追いつかせる"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in db.metadata.sorted_tables:
+        if 'id' in table.c:
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"))
+
+
+def seed_catalog(scale=1, seed=0):
+    """Drop and recreate every table, then fill it with synthetic data
+
+    Returns the row counts that were inserted.
+    """
+    rng = random.Random(seed)
+    sizes = scaled_sizes(scale)
+    now = datetime.utcnow()
+    stamp = {'created_at': now, 'updated_at': now}
+
+    db.drop_all()
+    db.create_all()
+
+    regions = [dict(id=i + 1, name=PREFECTURES[i], sakenowa_id=str(i + 1),
+                    **stamp) for i in range(REGION_COUNT)]
+    _bulk(Region, regions)
+
+    breweries = [dict(id=i + 1, name=_name(rng, '酒造'),
+                      sakenowa_brewery_id=str(i + 1),
+                      region_id=rng.randint(1, REGION_COUNT), **stamp)
+                 for i in range(sizes['breweries'])]
+    _bulk(Brewery, breweries)
+    brewery_region = {b['id']: b['region_id'] for b in breweries}
+
+    sakes = []
+    for i in range(sizes['sakes']):
+        created = now - timedelta(minutes=i)
+        sakes.append(dict(id=i + 1, name=_name(rng, ''),
+                          sakenowa_id=str(i + 1),
+                          brewery_id=rng.randint(1, sizes['breweries']),
+                          created_at=created, updated_at=created))
+    _bulk(Sake, sakes)
+
+    charts = [dict(sake_id=s['id'],
+                   **{f'f{k}': round(rng.random(), 6) for k in range(1, 7)},
+                   **stamp)
+              for s in sakes if rng.random() < FLAVOR_CHART_RATIO]
+    for chart in charts:
+        chart.update(quantize([chart[f'f{k}'] for k in range(1, 7)]))
+    _bulk(FlavorChart, charts)
+
+    tags = [dict(id=i + 1, name=f'{_name(rng, "")}香', sakenowa_id=str(i + 1),
+                 **stamp) for i in range(sizes['flavor_tags'])]
+    _bulk(FlavorTag, tags)
+
+    brand_tags = []
+    for s in sakes:
+        count = rng.randint(*TAGS_PER_SAKE)
+        for tag_id in rng.sample(range(1, len(tags) + 1), count):
+            brand_tags.append(dict(sake_id=s['id'], flavor_tag_id=tag_id,
+                                   **stamp))
+    _bulk(BrandFlavorTag, brand_tags)
+
+    rankings = []
+    ranked = rng.sample(sakes, min(OVERALL_RANKING_SIZE, len(sakes)))
+    for rank, s in enumerate(ranked, start=1):
+        rankings.append(dict(sake_id=s['id'], rank=rank,
+                             score=round(4.5 - rank * 0.01, 3),
+                             category='overall', **stamp))
+    by_region = {}
+    for s in sakes:
+        by_region.setdefault(brewery_region[s['brewery_id']], []).append(s)
+    for region_id, members in by_region.items():
+        picked = rng.sample(members, min(AREA_RANKING_SIZE, len(members)))
+        for rank, s in enumerate(picked, start=1):
+            rankings.append(dict(sake_id=s['id'], rank=rank,
+                                 score=round(4.3 - rank * 0.02, 3),
+                                 category=f'area_{region_id}', **stamp))
+    _bulk(Ranking, rankings)
+
+    # パスワードハッシュは1件だけ計算し、全ユーザーで使い回す
+    bench_user = User(username=BENCH_USERNAME, email='bench@example.com')
+    bench_user.set_password(BENCH_PASSWORD)
+    users = [dict(id=1, username=BENCH_USERNAME, email='bench@example.com',
+                  password_hash=bench_user.password_hash, **stamp)]
+    users += [dict(id=i + 1, username=f'user{i}', email=f'user{i}@example.com',
+                   password_hash=bench_user.password_hash, **stamp)
+              for i in range(1, sizes['users'])]
+    _bulk(User, users)
+
+    reviews = []
+    for i in range(sizes['reviews']):
+        created = now - timedelta(hours=i)
+        reviews.append(dict(
+            user_id=1 if i % 10 == 0 else rng.randint(1, sizes['users']),
+            sake_id=rng.randint(1, sizes['sakes']),
+            rating=float(rng.randint(1, 5)), comment='ベンチマーク用レビュー',
+            created_at=created, updated_at=created,
+            **{f'f{k}': round(rng.random(), 3) for k in range(1, 7)}))
+    _bulk(Review, reviews)
+
+    _reset_sequences()
+    db.session.commit()
+    listings = refresh_listings()
+    refresh_rollups()
+    refresh_tag_leaderboards()
+
+    counts = {
+        'regions': len(regions), 'breweries': len(breweries),
+        'sakes': len(sakes), 'flavor_charts': len(charts),
+        'flavor_tags': len(tags), 'brand_flavor_tags': len(brand_tags),
+        'rankings': len(rankings), 'users': len(users),
+        'reviews': len(reviews), 'catalog_listings': listings,
+    }
+    logger.info("Seeded synthetic catalog x%s: %s", scale, counts)
+    return counts
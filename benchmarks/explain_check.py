@@ -0,0 +1,164 @@
+"""
+EXPLAIN regression check
+Drives every benchmark route against a seeded database, captures each
+SELECT it issues and runs EXPLAIN on it. Exits non-zero when a plan does a
+sequential scan of a large table, so a dropped or unused index is caught
+before it reaches production.
+
+    python -m benchmarks.explain_check --scale 1
+    DATABASE_URL=postgresql://... python -m benchmarks.explain_check --reset
+
+Understands PostgreSQL (EXPLAIN (FORMAT JSON)) and SQLite (EXPLAIN QUERY PLAN).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+# 主キー順の全件走査などは意図的なもの（ページ全体を出す一覧）
+ALLOWED_SCANS = {
+    ('search_all', 'catalog_listings'),
+    ('search_name', 'catalog_listings'),
+    ('api_sakes', 'sakes'),
+}
+LARGE_TABLE_ROWS = 1000
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def _capture(engines, sink):
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            sink.append((conn.engine, statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return lambda: [event.remove(e, 'before_cursor_execute',
+                                 before_cursor_execute) for e in engines]
+
+
+def _postgres_scans(plan):
+    """Relation names of every Seq Scan node in a JSON plan"""
+    scans = []
+    stack = [plan[0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan':
+            scans.append(node.get('Relation Name'))
+        stack.extend(node.get('Plans', []))
+    return scans
+
+
+def _sqlite_scans(rows):
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        # "SCAN sakes USING INDEX ..." / "COVERING INDEX" は索引走査なので除外
+        match = _SQLITE_SCAN.match(detail.strip())
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+def seq_scans(engine, statement, parameters):
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            plan = conn.exec_driver_sql(
+                'EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return _postgres_scans(plan)
+        rows = conn.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        return _sqlite_scans(rows)
+
+
+def _large_tables(threshold):
+    from sqlalchemy import func, select
+    from models import db
+    large = set()
+    for table in db.metadata.sorted_tables:
+        count = db.session.execute(
+            select(func.count()).select_from(table)).scalar()
+        if count >= threshold:
+            large.add(table.name)
+    return large
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--reset', action='store_true',
+                        help='allow seeding a non-SQLite database')
+    parser.add_argument('--min-rows', type=int, default=LARGE_TABLE_ROWS,
+                        help='tables with at least this many rows are "large"')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.gettempdir(), 'sake_explain.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    if (not args.no_seed and not os.environ['DATABASE_URL'].startswith('sqlite')
+            and not args.reset):
+        parser.error('seeding drops all tables; pass --reset to confirm')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    from app import create_app
+    from benchmarks.bench_routes import build_scenarios
+    from benchmarks.catalog_factory import (BENCH_PASSWORD, BENCH_USERNAME,
+                                            seed_catalog)
+    from models import db
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        if not args.no_seed:
+            seed_catalog(scale=args.scale)
+        if db.engine.dialect.name == 'postgresql':
+            # 統計情報がないとプランナが小さい表とみなして Seq Scan を選ぶ
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+        large = _large_tables(args.min_rows)
+        engines = list(db.engines.values())
+
+    client = app.test_client()
+    client.post('/login', data={'username': BENCH_USERNAME,
+                                'password': BENCH_PASSWORD})
+
+    failures = []
+    checked = 0
+    for name, path, _ in build_scenarios(app):
+        captured = []
+        stop = _capture(engines, captured)
+        try:
+            client.get(path).get_data()
+        finally:
+            stop()
+
+        with app.app_context():
+            for engine, statement, parameters in captured:
+                checked += 1
+                tables = [t for t in seq_scans(engine, statement, parameters)
+                          if t in large and (name, t) not in ALLOWED_SCANS]
+                if tables:
+                    failures.append((name, tables, statement))
+                elif args.verbose:
+                    print(f'ok   {name}: {" ".join(statement.split())[:100]}')
+
+    for name, tables, statement in failures:
+        print(f"FAIL {name}: sequential scan on {', '.join(sorted(set(tables)))}")
+        print(f"     {' '.join(statement.split())[:300]}")
+    print(f'{checked} statements checked, {len(failures)} with sequential '
+          f'scans on large tables ({", ".join(sorted(large))})')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Local Sakenowa API stand-in
+Serves the seven endpoints used by sakenowa.fetch_data() either from
+fixture files (<dir>/<endpoint>.json, e.g. brands.json) or from generated
+data, with optional latency, error and slow-body injection.
+
+    python -m benchmarks.sakenowa_stub --scale 10 --port 8765
+    SAKENOWA_API_BASE=http://127.0.0.1:8765 flask sync-sakenowa
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.catalog_factory import (PREFECTURES, TAGS_PER_SAKE, _name,
+                                        scaled_sizes)
+
+logger = logging.getLogger('benchmarks.sakenowa_stub')
+
+ENDPOINTS = ('areas', 'breweries', 'brands', 'flavor-charts', 'flavor-tags',
+             'brand-flavor-tags', 'rankings')
+CHUNK_SIZE = 16 * 1024
+
+
+def generate_payloads(scale=1, seed=0):
+    """Sakenowa-shaped responses for every endpoint"""
+    rng = random.Random(seed)
+    sizes = scaled_sizes(scale)
+
+    areas = [{'id': i + 1, 'name': PREFECTURES[i]}
+             for i in range(sizes['regions'])]
+    breweries = [{'id': i + 1, 'name': _name(rng, '酒造'),
+                  'areaId': rng.randint(1, sizes['regions'])}
+                 for i in range(sizes['breweries'])]
+    brands = [{'id': i + 1, 'name': _name(rng, ''),
+               'breweryId': rng.randint(1, sizes['breweries'])}
+              for i in range(sizes['sakes'])]
+    charts = [{'brandId': b['id'],
+               **{f'f{k}': round(rng.random(), 6) for k in range(1, 7)}}
+              for b in brands if rng.random() < 0.35]
+    tags = [{'id': i + 1, 'tag': f'{_name(rng, "")}香'}
+            for i in range(sizes['flavor_tags'])]
+    brand_tags = [{'brandId': b['id'],
+                   'tagIds': rng.sample(range(1, len(tags) + 1),
+                                        rng.randint(*TAGS_PER_SAKE))}
+                  for b in brands]
+
+    brewery_area = {b['id']: b['areaId'] for b in breweries}
+    by_area = {}
+    for b in brands:
+        by_area.setdefault(brewery_area[b['breweryId']], []).append(b['id'])
+    overall = [{'rank': r, 'score': round(4.5 - r * 0.01, 3), 'brandId': bid}
+               for r, bid in enumerate(
+                   rng.sample([b['id'] for b in brands], min(100, len(brands))),
+                   start=1)]
+    area_rankings = [
+        {'areaId': area_id,
+         'ranking': [{'rank': r, 'score': round(4.3 - r * 0.02, 3),
+                      'brandId': bid}
+                     for r, bid in enumerate(
+                         rng.sample(ids, min(10, len(ids))), start=1)]}
+        for area_id, ids in sorted(by_area.items())]
+
+    return {
+        'areas': {'areas': areas},
+        'breweries': {'breweries': breweries},
+        'brands': {'brands': brands},
+        'flavor-charts': {'flavorCharts': charts},
+        'flavor-tags': {'tags': tags},
+        'brand-flavor-tags': {'flavorTags': brand_tags},
+        'rankings': {'yearMonth': '202401', 'overall': overall,
+                     'areas': area_rankings},
+    }
+
+
+def load_fixtures(directory):
+    payloads = {}
+    for endpoint in ENDPOINTS:
+        with open(os.path.join(directory, f'{endpoint}.json'),
+                  encoding='utf-8') as f:
+            payloads[endpoint] = json.load(f)
+    return payloads
+
+
+class StubConfig:
+    """Fault injection knobs; can be changed while the server is running"""
+
+    def __init__(self, latency_ms=0, error_rate=0.0, error_status=503,
+                 body_rate=0, fail_endpoints=(), seed=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # 0 = 制限なし。>0 なら bytes/sec でボディを小分けに送る
+        self.body_rate = body_rate
+        self.fail_endpoints = set(fail_endpoints)
+        self.rng = random.Random(seed)
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def should_fail(self, endpoint):
+        if endpoint in self.fail_endpoints:
+            return True
+        with self._lock:
+            return self.rng.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'SakenowaStub/1.0'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        endpoint = self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+        body = self.server.bodies.get(endpoint)
+        if body is None:
+            self.send_error(404)
+            return
+
+        config = self.server.config
+        config.record(endpoint)
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+        if config.should_fail(endpoint):
+            self.send_error(config.error_status)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not config.body_rate:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(len(chunk) / config.body_rate)
+
+
+def make_server(payloads, config=None, host='127.0.0.1', port=0):
+    """Build a server for payloads; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    # エンドポイント毎に一度だけシリアライズしておく
+    server.bodies = {name: json.dumps(data, ensure_ascii=False).encode('utf-8')
+                     for name, data in payloads.items()}
+    server.config = config or StubConfig()
+    return server
+
+
+def start_in_thread(payloads, config=None):
+    """Start a stub on a free port; returns (server, base_url)"""
+    server = make_server(payloads, config)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='sakenowa-stub', daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
+
+
+def add_stub_arguments(parser):
+    parser.add_argument('--fixtures', help='directory of <endpoint>.json files')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='size of generated data (ignored with --fixtures)')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--fail-endpoint', action='append', default=[],
+                        help='always fail this endpoint (repeatable)')
+    parser.add_argument('--body-rate', type=int, default=0,
+                        help='throttle bodies to this many bytes/sec')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def stub_from_args(args):
+    if args.fixtures:
+        payloads = load_fixtures(args.fixtures)
+    else:
+        payloads = generate_payloads(args.scale, args.seed)
+    config = StubConfig(latency_ms=args.latency_ms, error_rate=args.error_rate,
+                        error_status=args.error_status,
+                        body_rate=args.body_rate,
+                        fail_endpoints=args.fail_endpoint, seed=args.seed)
+    return payloads, config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_stub_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--dump', help='write generated payloads as fixtures '
+                                       'to this directory and exit')
+    args = parser.parse_args(argv)
+
+    payloads, config = stub_from_args(args)
+    if args.dump:
+        os.makedirs(args.dump, exist_ok=True)
+        for endpoint, data in payloads.items():
+            with open(os.path.join(args.dump, f'{endpoint}.json'), 'w',
+                      encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        print(f'Wrote {len(payloads)} fixtures to {args.dump}')
+        return 0
+
+    server = make_server(payloads, config, args.host, args.port)
+    print(f'Serving Sakenowa stub on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,59 @@
+"""
+Small in-process caches
+Each gunicorn worker keeps its own copy; entries expire after `ttl` seconds.
+"""
+import threading
+import time
+
+# name -> TTLCache, used by the readiness check to report cache warmth
+_registry = {}
+
+
+class TTLCache:
+    """Thread-safe dict with per-entry expiry and a size bound"""
+
+    def __init__(self, name, ttl, maxsize=1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.monotonic():
+            with self._lock:
+                self._data.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if len(self._data) >= self.maxsize and key not in self._data:
+                # 一番古いエントリを捨てる（dictは挿入順）
+                self._data.pop(next(iter(self._data)), None)
+            self._data[key] = (expires, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_cache(name):
+    return _registry.get(name)
+
+
+def all_caches():
+    return dict(_registry)
@@ -0,0 +1,364 @@
+"""
+Catalog version tracking and derived listing data
+The catalog only changes when the Sakenowa sync runs, so a cheap version
+string is enough to drive ETags and cache keys for catalog responses, and
+the flat catalog_listings table only has to be rebuilt once per sync.
+The region and brewery rollups and the per-tag leaderboards are derived
+from the listings in the same way, after they have been rebuilt.
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+
+from cache import TTLCache
+from models import db
+from models.brand_flavor_tag import BrandFlavorTag
+from models.brewery import Brewery
+from models.brewery_rollup import BreweryRollup
+from models.catalog_listing import CatalogListing
+from models.flavor_chart import FlavorChart
+from models.flavor_tag import FlavorTag
+from models.ranking import Ranking
+from models.region import Region
+from models.region_rollup import RegionRollup
+from models.review import Review
+from models.sake import Sake
+from models.tag_leaderboard import TagLeaderboard
+
+logger = logging.getLogger(__name__)
+
+# 他のワーカーで同期が走っても、この秒数以内には新しい版が見える
+_version_cache = TTLCache('catalog_version', ttl=30, maxsize=1)
+
+
+def catalog_version(cached=True):
+    """Short opaque string that changes whenever the catalog is rebuilt
+
+    cached=False reads it from the database, for callers that must not see
+    the previous catalog's ids after a sync in another process.
+    """
+    version = _version_cache.get('version') if cached else None
+    if version is None:
+        count, latest = db.session.query(func.count(Sake.id),
+                                         func.max(Sake.updated_at)).one()
+        raw = f'{count}:{latest.isoformat() if latest else ""}'
+        version = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+        _version_cache.set('version', version)
+    return version
+
+
+def invalidate_catalog_version():
+    """Forget this worker's cached version (call after a sync)"""
+    _version_cache.clear()
+
+
+LISTING_BATCH_SIZE = 2000
+
+
+def _ranking_maps():
+    overall, area = {}, {}
+    rows = db.session.execute(select(Ranking.sake_id, Ranking.category,
+                                     Ranking.rank, Ranking.score))
+    for sake_id, category, rank, score in rows:
+        if category == 'overall':
+            target, key = overall, None
+        elif category.startswith('area_'):
+            target, key = area, category[len('area_'):]
+        else:
+            continue
+        # 同じ銘柄が複数回載っていれば上位の方を採用
+        current = target.get(sake_id)
+        if current is None or rank < current[1]:
+            target[sake_id] = (key, rank, score)
+    return overall, area
+
+
+def _tag_map():
+    tags = {}
+    rows = db.session.execute(
+        select(BrandFlavorTag.sake_id, BrandFlavorTag.flavor_tag_id)
+        .order_by(BrandFlavorTag.sake_id, BrandFlavorTag.flavor_tag_id))
+    for sake_id, tag_id in rows:
+        tags.setdefault(sake_id, []).append(tag_id)
+    return tags
+
+
+def refresh_listings(commit=True):
+    """Rebuild catalog_listings from the normalized tables and commit
+
+    Runs as one transaction (delete + insert), so on PostgreSQL readers keep
+    seeing the previous rows until the new set is committed. With
+    commit=False the rows join the caller's transaction instead.
+    Returns the number of listings written.
+    """
+    overall, area = _ranking_maps()
+    tags = _tag_map()
+    now = datetime.utcnow()
+
+    stmt = select(Sake.id, Sake.name, Sake.sakenowa_id, Sake.created_at,
+                  Brewery.id, Brewery.name, Region.sakenowa_id, Region.name,
+                  FlavorChart.f1, FlavorChart.f2, FlavorChart.f3,
+                  FlavorChart.f4, FlavorChart.f5, FlavorChart.f6,
+                  FlavorChart.bucket_code, FlavorChart.description)\
+        .join(Brewery, Sake.brewery_id == Brewery.id)\
+        .join(Region, Brewery.region_id == Region.id)\
+        .outerjoin(FlavorChart, FlavorChart.sake_id == Sake.id)
+
+    try:
+        db.session.execute(delete(CatalogListing))
+        batch, count = [], 0
+        for (sake_id, name, sakenowa_id, created_at, brewery_id, brewery_name,
+             region_id, region_name, f1, f2, f3, f4, f5, f6, flavor_code,
+             flavor_description) in db.session.execute(stmt):
+            _, overall_rank, overall_score = overall.get(sake_id,
+                                                         (None, None, None))
+            area_id, area_rank, area_score = area.get(sake_id,
+                                                      (None, None, None))
+            batch.append(dict(
+                sake_id=sake_id, name=name, sakenowa_id=sakenowa_id,
+                created_at=created_at, brewery_id=brewery_id,
+                brewery_name=brewery_name, region_id=region_id,
+                region_name=region_name,
+                f1=f1, f2=f2, f3=f3, f4=f4, f5=f5, f6=f6,
+                flavor_code=flavor_code, flavor_description=flavor_description,
+                overall_rank=overall_rank, overall_score=overall_score,
+                area_id=area_id, area_rank=area_rank, area_score=area_score,
+                tag_ids=tags.get(sake_id, []), refreshed_at=now))
+            if len(batch) >= LISTING_BATCH_SIZE:
+                db.session.execute(insert(CatalogListing), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(CatalogListing), batch)
+            count += len(batch)
+        if commit:
+            db.session.commit()
+    except Exception as e:
+        logger.error("Failed to refresh catalog listings: %s", e, exc_info=True)
+        if commit:
+            db.session.rollback()
+        raise
+
+    logger.info("Refreshed %s catalog listings", count)
+    return count
+
+
+FLAVOR_KEYS = ('f1', 'f2', 'f3', 'f4', 'f5', 'f6')
+ROLLUP_TOP_TAGS = 10
+
+
+class _Rollup:
+    """Running totals for one region or brewery"""
+    __slots__ = ('sake_count', 'charted_count', 'sums', 'tags', 'best_rank',
+                 'best_rank_sake_id')
+
+    def __init__(self):
+        self.sake_count = 0
+        self.charted_count = 0
+        self.sums = [0.0] * len(FLAVOR_KEYS)
+        self.tags = {}
+        self.best_rank = None
+        self.best_rank_sake_id = None
+
+    def add(self, sake_id, flavors, rank, tag_ids):
+        self.sake_count += 1
+        if flavors[0] is not None:
+            self.charted_count += 1
+            for i, value in enumerate(flavors):
+                self.sums[i] += value or 0.0
+        for tag_id in tag_ids:
+            self.tags[tag_id] = self.tags.get(tag_id, 0) + 1
+        if rank is not None and (self.best_rank is None or rank < self.best_rank):
+            self.best_rank, self.best_rank_sake_id = rank, sake_id
+
+    def values(self, tag_names):
+        means = {key: (round(total / self.charted_count, 4)
+                       if self.charted_count else None)
+                 for key, total in zip(FLAVOR_KEYS, self.sums)}
+        top = sorted(self.tags.items(), key=lambda t: (-t[1], t[0]))
+        top_tags = [{'id': tag_names[tag_id][0], 'name': tag_names[tag_id][1],
+                     'count': count}
+                    for tag_id, count in top if tag_id in tag_names][:ROLLUP_TOP_TAGS]
+        return dict(sake_count=self.sake_count,
+                    charted_count=self.charted_count, best_rank=self.best_rank,
+                    best_rank_sake_id=self.best_rank_sake_id,
+                    top_tags=top_tags, **means)
+
+
+def _rank_key(entry):
+    # 順位なしは末尾、同順位は名前順
+    return (entry['rank'] is None, entry['rank'] or 0, entry['name'])
+
+
+def refresh_rollups(commit=True):
+    """Rebuild region_rollups and brewery_rollups from catalog_listings
+
+    One grouped pass over the listings; like refresh_listings() the delete
+    and insert share one transaction, joining the caller's with
+    commit=False. Returns (regions, breweries) written.
+    """
+    brewery_ids = dict(db.session.execute(
+        select(Brewery.id, Brewery.sakenowa_brewery_id)).all())
+    tag_names = {tag_id: (sakenowa_id, name) for tag_id, sakenowa_id, name in
+                 db.session.execute(select(FlavorTag.id, FlavorTag.sakenowa_id,
+                                           FlavorTag.name))}
+    now = datetime.utcnow()
+
+    regions, breweries = {}, {}
+    region_names, brewery_info, brewery_sakes = {}, {}, {}
+    stmt = select(CatalogListing.sake_id, CatalogListing.name,
+                  CatalogListing.brewery_id, CatalogListing.brewery_name,
+                  CatalogListing.region_id, CatalogListing.region_name,
+                  CatalogListing.overall_rank, CatalogListing.flavor_description,
+                  CatalogListing.tag_ids,
+                  *[getattr(CatalogListing, key) for key in FLAVOR_KEYS])\
+        .execution_options(yield_per=2000)
+    for (sake_id, name, brewery_id, brewery_name, region_id, region_name, rank,
+         description, tag_ids, *flavors) in db.session.execute(stmt):
+        brewery_key = brewery_ids.get(brewery_id)
+        if brewery_key is None:
+            continue
+        tag_ids = tag_ids or []
+        region_names[region_id] = region_name
+        regions.setdefault(region_id, _Rollup()).add(sake_id, flavors, rank,
+                                                     tag_ids)
+        breweries.setdefault(brewery_key, _Rollup()).add(sake_id, flavors, rank,
+                                                         tag_ids)
+        brewery_info[brewery_key] = (brewery_name, region_id, region_name)
+        brewery_sakes.setdefault(brewery_key, []).append(
+            {'id': sake_id, 'name': name, 'rank': rank,
+             'description': description})
+
+    brewery_rows, region_breweries = [], {}
+    for brewery_key, rollup in breweries.items():
+        brewery_name, region_id, region_name = brewery_info[brewery_key]
+        brewery_rows.append(dict(
+            brewery_id=brewery_key, name=brewery_name, region_id=region_id,
+            region_name=region_name,
+            sakes=sorted(brewery_sakes[brewery_key], key=_rank_key),
+            refreshed_at=now, **rollup.values(tag_names)))
+        region_breweries.setdefault(region_id, []).append(
+            {'id': brewery_key, 'name': brewery_name,
+             'sake_count': rollup.sake_count, 'rank': rollup.best_rank})
+    region_rows = [dict(
+        region_id=region_id, name=region_names[region_id],
+        brewery_count=len(region_breweries[region_id]),
+        breweries=sorted(region_breweries[region_id], key=_rank_key),
+        refreshed_at=now, **rollup.values(tag_names))
+        for region_id, rollup in regions.items()]
+
+    try:
+        db.session.execute(delete(RegionRollup))
+        db.session.execute(delete(BreweryRollup))
+        if region_rows:
+            db.session.execute(insert(RegionRollup), region_rows)
+        for start in range(0, len(brewery_rows), LISTING_BATCH_SIZE):
+            db.session.execute(insert(BreweryRollup),
+                               brewery_rows[start:start + LISTING_BATCH_SIZE])
+        if commit:
+            db.session.commit()
+    except Exception as e:
+        logger.error("Failed to refresh region/brewery rollups: %s", e,
+                     exc_info=True)
+        if commit:
+            db.session.rollback()
+        raise
+
+    logger.info("Refreshed rollups for %d regions and %d breweries",
+                len(region_rows), len(brewery_rows))
+    return len(region_rows), len(brewery_rows)
+
+
+# タグ別ランキングに残す件数（ページは上位20件、APIで先まで読める余裕を持たせる）
+TAG_LEADERBOARD_SIZE = int(os.environ.get('TAG_LEADERBOARD_SIZE', 100))
+# ランキングのスコアとレビュー評価を混ぜる割合
+RANKING_WEIGHT = 0.7
+# レビュー平均を全体平均へ引き寄せる仮想レビュー数（少数レビューの過大評価を防ぐ）
+REVIEW_PRIOR_COUNT = 5
+
+
+def _review_stats():
+    """sake_id -> (review count, rating sum), plus the global mean rating"""
+    stats = {sake_id: (count, total) for sake_id, count, total in
+             db.session.execute(
+                 select(Review.sake_id, func.count(Review.id),
+                        func.sum(Review.rating)).group_by(Review.sake_id))}
+    count = sum(c for c, _ in stats.values())
+    mean = sum(t for _, t in stats.values()) / count if count else None
+    return stats, mean
+
+
+def blended_score(ranking_score, review_count, rating_sum, mean_rating):
+    """Ranking score blended with a Bayesian average of the reviews
+
+    Both are on the 5-point scale. Returns None when the sake has neither.
+    """
+    review_score = None
+    if review_count:
+        review_score = ((REVIEW_PRIOR_COUNT * mean_rating + rating_sum)
+                        / (REVIEW_PRIOR_COUNT + review_count))
+    if ranking_score is None:
+        return review_score
+    if review_score is None:
+        return ranking_score
+    return RANKING_WEIGHT * ranking_score + (1 - RANKING_WEIGHT) * review_score
+
+
+def _leaderboard_key(entry):
+    # スコアなしは末尾、同点は新しい銘柄を先に
+    sake_id, score = entry
+    return (score is None, -(score or 0.0), -sake_id)
+
+
+def refresh_tag_leaderboards(commit=True):
+    """Rebuild tag_leaderboards from catalog_listings and review aggregates
+
+    Keeps the top TAG_LEADERBOARD_SIZE sakes of every tag. Same transaction
+    rules as refresh_listings(). Returns the number of rows written.
+    """
+    reviews, mean_rating = _review_stats()
+    entries = {}
+    stmt = select(CatalogListing.sake_id, CatalogListing.overall_score,
+                  CatalogListing.area_score, CatalogListing.tag_ids)\
+        .execution_options(yield_per=2000)
+    for sake_id, overall_score, area_score, tag_ids in db.session.execute(stmt):
+        if not tag_ids:
+            continue
+        # 全国ランキング外の銘柄は都道府県ランキングのスコアで代用する
+        ranking_score = overall_score if overall_score is not None else area_score
+        count, total = reviews.get(sake_id, (0, 0.0))
+        score = blended_score(ranking_score, count, total, mean_rating)
+        for tag_id in tag_ids:
+            entries.setdefault(tag_id, []).append((sake_id, score))
+
+    try:
+        db.session.execute(delete(TagLeaderboard))
+        batch, written = [], 0
+        for tag_id, tag_entries in entries.items():
+            tag_entries.sort(key=_leaderboard_key)
+            for rank, (sake_id, score) in enumerate(
+                    tag_entries[:TAG_LEADERBOARD_SIZE], 1):
+                batch.append(dict(flavor_tag_id=tag_id, rank=rank,
+                                  sake_id=sake_id,
+                                  score=None if score is None else round(score, 4)))
+            if len(batch) >= LISTING_BATCH_SIZE:
+                db.session.execute(insert(TagLeaderboard), batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(TagLeaderboard), batch)
+            written += len(batch)
+        if commit:
+            db.session.commit()
+    except Exception as e:
+        logger.error("Failed to refresh tag leaderboards: %s", e, exc_info=True)
+        if commit:
+            db.session.rollback()
+        raise
+
+    logger.info("Refreshed tag leaderboards for %d tags (%d rows)",
+                len(entries), written)
+    return written
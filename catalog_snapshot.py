@@ -0,0 +1,336 @@
+"""
+Memory-mapped catalog snapshot
+After each sync the catalog listings are written to one binary file of
+aligned arrays (flavor vectors, id maps, string tables, tag membership).
+Every gunicorn worker maps it read-only, so all processes on a node share
+one physical copy through the page cache. A new snapshot is written to a
+temporary file and renamed into place; readers notice the new inode and
+switch over on their next lookup.
+
+Layout: b'SAKESNP1', uint32 header length, JSON header, then each array
+at a 64-byte aligned offset. Arrays are little-endian and readable with
+numpy.frombuffer(); without numpy they are exposed as memoryview casts.
+numpy is only imported once a snapshot is actually mapped.
+"""
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+
+from models import db
+from models.catalog_listing import CatalogListing
+
+# 最初にスナップショットをmapした時に読み込む（_load_numpy）
+numpy = None
+_numpy_loaded = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SAKESNP1'
+ALIGNMENT = 64
+FLAVOR_COUNT = 6
+
+# array typecode -> (numpy dtype, memoryview format)
+_TYPES = {
+    'i': ('<i4', 'i'),
+    'I': ('<u4', 'I'),
+    'f': ('<f4', 'f'),
+    'B': ('|u1', 'B'),
+}
+
+
+def _load_numpy():
+    """Import numpy on first use; None when it is not installed"""
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy as module
+            numpy = module
+        except ImportError:
+            numpy = None
+        _numpy_loaded = True
+    return numpy
+
+
+def snapshot_path(app=None):
+    app = app or current_app
+    return app.config.get('CATALOG_SNAPSHOT_PATH') or os.path.join(
+        app.instance_path, 'catalog.snapshot')
+
+
+class _StringTable:
+    """Deduplicated UTF-8 strings -> (index per value, offsets, data)"""
+
+    def __init__(self):
+        self._index = {}
+        self.offsets = array('I', [0])
+        self.data = bytearray()
+
+    def add(self, value):
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = self.append(value)
+        return index
+
+    def append(self, value):
+        """Add without deduplication; the index is the row number"""
+        self.data += (value or '').encode('utf-8')
+        self.offsets.append(len(self.data))
+        return len(self.offsets) - 2
+
+
+def _pad(handle):
+    remainder = handle.tell() % ALIGNMENT
+    if remainder:
+        handle.write(b'\0' * (ALIGNMENT - remainder))
+
+
+def write_snapshot(path=None, version=None):
+    """Write catalog_listings to a new snapshot file and rename it into place
+
+    Returns the number of sakes written.
+    """
+    path = path or snapshot_path()
+    sake_ids = array('i')
+    flavors = array('f')
+    overall_rank = array('i')
+    tag_offsets = array('i', [0])
+    tag_ids = array('i')
+    names, breweries, regions, region_ids = (_StringTable(), _StringTable(),
+                                             _StringTable(), _StringTable())
+    brewery_idx, region_idx = array('i'), array('i')
+
+    rows = db.session.execute(
+        select(CatalogListing.sake_id, CatalogListing.name,
+               CatalogListing.brewery_name, CatalogListing.region_id,
+               CatalogListing.region_name, CatalogListing.overall_rank,
+               CatalogListing.tag_ids,
+               *[getattr(CatalogListing, f'f{i}')
+                 for i in range(1, FLAVOR_COUNT + 1)])
+        .order_by(CatalogListing.sake_id)
+        .execution_options(yield_per=2000))
+    for (sake_id, name, brewery_name, region_id, region_name, rank, tags,
+         *values) in rows:
+        sake_ids.append(sake_id)
+        names.append(name)  # 行番号で引くので重複排除しない
+        brewery_idx.append(breweries.add(brewery_name))
+        region = region_ids.add(region_id)
+        if region == len(regions.offsets) - 1:
+            # 地域名は重複排除せず地域IDの索引と同じ行に置く（名前が重複・変更されても対応がずれない）
+            regions.append(region_name)
+        region_idx.append(region)
+        overall_rank.append(rank or 0)
+        flavors.extend(math.nan if v is None else v for v in values)
+        tag_ids.extend(tags or [])
+        tag_offsets.append(len(tag_ids))
+
+    arrays = {
+        'sake_ids': (sake_ids, [len(sake_ids)]),
+        'flavors': (flavors, [len(sake_ids), FLAVOR_COUNT]),
+        'overall_rank': (overall_rank, [len(sake_ids)]),
+        'brewery_idx': (brewery_idx, [len(sake_ids)]),
+        'region_idx': (region_idx, [len(sake_ids)]),
+        'tag_offsets': (tag_offsets, [len(tag_offsets)]),
+        'tag_ids': (tag_ids, [len(tag_ids)]),
+    }
+    for table_name, table in (('names', names),
+                              ('breweries', breweries),
+                              ('regions', regions),
+                              ('region_ids', region_ids)):
+        arrays[f'{table_name}.offsets'] = (table.offsets,
+                                           [len(table.offsets)])
+        arrays[f'{table_name}.data'] = (array('B', table.data),
+                                        [len(table.data)])
+
+    if sys.byteorder != 'little':
+        for values, _ in arrays.values():
+            values.byteswap()
+
+    # ヘッダーにオフセットを書くため、先に配置を決める
+    entries = {name: {'dtype': _TYPES[values.typecode][0], 'shape': shape,
+                      'nbytes': len(values) * values.itemsize}
+               for name, (values, shape) in arrays.items()}
+    header = {
+        'format': 1,
+        'version': version,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'count': len(sake_ids),
+        'arrays': entries,
+    }
+    # オフセット桁数でヘッダー長が変わるので、確定するまで繰り返す
+    header_size = 0
+    while True:
+        offset = len(MAGIC) + 4 + header_size
+        for entry in entries.values():
+            offset += -offset % ALIGNMENT
+            entry['offset'] = offset
+            offset += entry['nbytes']
+        encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if len(encoded) == header_size:
+            break
+        header_size = len(encoded)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack('<I', len(encoded)))
+        handle.write(encoded)
+        for name, (values, _) in arrays.items():
+            _pad(handle)
+            assert handle.tell() == entries[name]['offset']
+            values.tofile(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    # 同一ディレクトリ内のrenameは原子的。読み手は旧ファイルを開いたまま使い続けられる
+    os.replace(tmp_path, path)
+
+    logger.info("Wrote catalog snapshot %s (%d sakes, %d bytes)", path,
+                len(sake_ids), offset)
+    return len(sake_ids)
+
+
+class CatalogSnapshot:
+    """Read-only view of one snapshot file"""
+
+    def __init__(self, path):
+        self.path = path
+        # 配列の型（ndarray / memoryview）はこの属性で判断する
+        self.numpy = _load_numpy()
+        with open(path, 'rb') as handle:
+            self._stat = os.fstat(handle.fileno())
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot')
+        (header_size,) = struct.unpack_from('<I', self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + header_size])
+        self.version = self.header.get('version')
+        self.count = self.header['count']
+        self._arrays = {name: self._view(entry)
+                        for name, entry in self.header['arrays'].items()}
+
+    def _view(self, entry):
+        offset, nbytes = entry['offset'], entry['nbytes']
+        if numpy is not None:
+            values = numpy.frombuffer(self._map, dtype=entry['dtype'],
+                                      count=nbytes // numpy.dtype(
+                                          entry['dtype']).itemsize,
+                                      offset=offset)
+            return values.reshape(entry['shape'])
+        # memoryview は多次元のスライスができないので1次元のまま扱う
+        fmt = next(f for d, f in _TYPES.values() if d == entry['dtype'])
+        return memoryview(self._map)[offset:offset + nbytes].cast(fmt)
+
+    def identity(self):
+        return (self._stat.st_ino, self._stat.st_mtime_ns, self._stat.st_size)
+
+    def array(self, name):
+        """The raw array (numpy.ndarray, or a flat memoryview without numpy)"""
+        return self._arrays[name]
+
+    def index_of(self, sake_id):
+        sake_ids = self._arrays['sake_ids']
+        if numpy is not None:
+            i = int(numpy.searchsorted(sake_ids, sake_id))
+        else:
+            i = bisect.bisect_left(sake_ids, sake_id)
+        if i < self.count and sake_ids[i] == sake_id:
+            return i
+        return None
+
+    def _string(self, table, i):
+        offsets = self._arrays[f'{table}.offsets']
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        data = self._arrays[f'{table}.data']
+        return bytes(data[start:end]).decode('utf-8')
+
+    def name(self, i):
+        return self._string('names', i)
+
+    def brewery_name(self, i):
+        return self._string('breweries', int(self._arrays['brewery_idx'][i]))
+
+    def region_name(self, i):
+        return self._string('regions', int(self._arrays['region_idx'][i]))
+
+    def region_id(self, i):
+        return self._string('region_ids', int(self._arrays['region_idx'][i]))
+
+    def overall_rank(self, i):
+        rank = int(self._arrays['overall_rank'][i])
+        return rank or None
+
+    def flavors(self, i):
+        """(f1..f6) or None when the sake has no flavor chart"""
+        flavors = self._arrays['flavors']
+        row = (flavors[i] if numpy is not None
+               else flavors[i * FLAVOR_COUNT:(i + 1) * FLAVOR_COUNT])
+        values = [float(v) for v in row]
+        return None if math.isnan(values[0]) else tuple(values)
+
+    def tag_ids(self, i):
+        offsets = self._arrays['tag_offsets']
+        return [int(t) for t in
+                self._arrays['tag_ids'][int(offsets[i]):int(offsets[i + 1])]]
+
+
+_lock = threading.Lock()
+_current = None
+_checked_at = 0.0
+
+
+def get_snapshot():
+    """This process's snapshot, reopened when the file has been replaced
+
+    Returns None when no snapshot has been written yet.
+    """
+    global _current, _checked_at
+    interval = 5
+    path = None
+    if has_app_context():
+        interval = current_app.config.get('CATALOG_SNAPSHOT_CHECK_SECONDS', 5)
+        path = snapshot_path()
+    now = time.monotonic()
+    if _current is not None and now - _checked_at < interval:
+        return _current
+
+    with _lock:
+        if _current is not None and now - _checked_at < interval:
+            return _current
+        _checked_at = now
+        path = path or (_current.path if _current is not None else None)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return _current
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if _current is None or _current.identity() != identity:
+            try:
+                # 古いmmapは参照がなくなった時点で解放される
+                _current = CatalogSnapshot(path)
+                logger.info("Mapped catalog snapshot %s (%d sakes)", path,
+                            _current.count)
+            except (OSError, ValueError) as e:
+                logger.error("Failed to map catalog snapshot %s: %s", path, e)
+        return _current
+
+
+def init_snapshot(app):
+    """Map the snapshot at boot (before gunicorn forks, when preloading)"""
+    with app.app_context():
+        get_snapshot()
@@ -0,0 +1,184 @@
+"""
+Flask CLI commands
+Heavy modules (sakenowa -> requests) are imported inside the commands so
+that web workers never pay for them at boot.
+"""
+import logging
+import os
+import sys
+
+import click
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_database(app):
+    """Create missing tables and load Sakenowa data (development only)"""
+    with app.app_context():
+        try:
+            db.create_all()
+            logger.info("All tables created successfully (if not exist)")
+        except Exception as e:
+            logger.error("Failed to create tables: %s", e, exc_info=True)
+
+        try:
+            from sakenowa import update_database
+            logger.info("Running initial update_database() for Sakenowa")
+            update_database()
+            logger.info("Initial data update completed")
+        except Exception as e:
+            logger.error("Initial data update failed: %s", e, exc_info=True)
+
+
+def init_migrations(app):
+    """Enable `flask db ...` (Flask-Migrate) when running under the Flask CLI
+
+    The `db` command group itself comes from Flask-Migrate's entry point;
+    Alembic is only imported when the app is loaded by a CLI command, so
+    gunicorn workers do not pay for it.
+    """
+    if click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'),
+            render_as_batch=True)
+
+
+def register_commands(app):
+    """Attach the project's CLI commands to the app"""
+    init_migrations(app)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create all tables that do not exist yet."""
+        db.create_all()
+        click.echo('Tables created')
+
+    @app.cli.command('sync-sakenowa')
+    def sync_sakenowa_command():
+        """Rebuild the catalog from the Sakenowa API."""
+        from sakenowa import update_database
+        if not update_database():
+            click.echo('Sakenowa sync failed', err=True)
+            sys.exit(1)
+        click.echo('Sakenowa sync completed')
+
+    @app.cli.command('refresh-listings')
+    @click.option('--if-empty', is_flag=True,
+                  help='Only rebuild when the listings or snapshot are missing.')
+    def refresh_listings_command(if_empty):
+        """Rebuild catalog_listings, rollups, tag leaderboards and the snapshot."""
+        from catalog import (catalog_version, invalidate_catalog_version,
+                             refresh_listings, refresh_rollups,
+                             refresh_tag_leaderboards)
+        from catalog_snapshot import snapshot_path, write_snapshot
+        from models.catalog_listing import CatalogListing
+        if (if_empty and db.session.query(CatalogListing.sake_id).first()
+                and os.path.exists(snapshot_path(app))):
+            click.echo('catalog_listings already populated')
+            return
+        count = refresh_listings()
+        refresh_rollups()
+        refresh_tag_leaderboards()
+        invalidate_catalog_version()
+        write_snapshot(version=catalog_version())
+        click.echo(f'Refreshed {count} listings and the catalog snapshot')
+
+    @app.cli.command('export')
+    @click.argument('dataset', type=click.Choice(['catalog', 'reviews']))
+    @click.option('--format', 'fmt', default='csv',
+                  type=click.Choice(['csv', 'ndjson', 'parquet']))
+    @click.option('--since', help='Only rows updated after this ISO datetime.')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False),
+                  help='Write to this file instead of stdout.')
+    @click.option('--chunk-rows', default=1000, show_default=True)
+    def export_command(dataset, fmt, since, output, chunk_rows):
+        """Stream a catalog or reviews dump (full or incremental)."""
+        from export import ExportError, ExportJob, parse_since
+        try:
+            job = ExportJob(dataset, fmt, since=parse_since(since),
+                            chunk_rows=chunk_rows)
+        except ExportError as e:
+            raise click.UsageError(str(e))
+
+        stream = open(output, 'wb') if output else click.get_binary_stream('stdout')
+        try:
+            for data in job.encoded_chunks():
+                stream.write(data)
+        finally:
+            if output:
+                stream.close()
+        if job.watermark is not None:
+            click.echo(f'watermark: {job.watermark.isoformat()}', err=True)
+
+    @app.cli.command('import-reviews')
+    @click.argument('username')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'ndjson']),
+                  help='Defaults to the file extension.')
+    @click.option('--encoding', default='utf-8-sig', show_default=True)
+    @click.option('--rating-scale', default=5.0, show_default=True,
+                  help='Maximum rating in the source app.')
+    @click.option('--batch-size', default=1000, show_default=True)
+    def import_reviews_command(username, path, fmt, encoding, rating_scale,
+                               batch_size):
+        """Import a user's reviews from another app's CSV/JSON/NDJSON export."""
+        from models.user import User
+        from review_import import ReviewImport, ReviewImportError, detect_format
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.UsageError(f'Unknown user {username}')
+        fmt = fmt or detect_format(path)
+        if fmt is None:
+            raise click.UsageError('Cannot tell the format; pass --format')
+
+        def progress(result):
+            click.echo(f'\r{result.rows} rows, {result.imported} imported, '
+                       f'{result.error_count} errors', nl=False, err=True)
+
+        try:
+            job = ReviewImport(user.id, fmt, encoding=encoding,
+                               rating_scale=rating_scale, batch_size=batch_size)
+            with open(path, 'rb') as stream:
+                result = job.run(stream, progress=progress)
+        except ReviewImportError as e:
+            raise click.ClickException(str(e))
+        click.echo('', err=True)
+        for line, message in result.errors:
+            click.echo(f'line {line}: {message}', err=True)
+        click.echo(f'Imported {result.imported} reviews ({result.skipped} already '
+                   f'present, {result.error_count} rows rejected)')
+
+    @app.cli.command('drain')
+    @click.option('--off', is_flag=True, help='End the drain.')
+    def drain_command(off):
+        """Make /health/ready fail on this node (before a restart)."""
+        from health import drain_path
+        path = drain_path(app)
+        if off:
+            if os.path.exists(path):
+                os.remove(path)
+            click.echo('Drain ended')
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w'):
+            pass
+        click.echo(f'Draining: {path} (remove with "flask drain --off")')
+
+    @app.cli.command('build-assets')
+    @click.option('--strict', is_flag=True,
+                  help='Fail instead of skipping work an optional package is missing for.')
+    def build_assets_command(strict):
+        """Fingerprint, precompress and resize the files under static/."""
+        from assets import build_assets, load_manifest, missing_packages
+        missing = missing_packages()
+        for package, skipped in missing:
+            click.echo(f'{package} is not installed: skipping {skipped} '
+                       '(install the "assets" extra)', err=True)
+        if missing and strict:
+            raise click.ClickException('optional asset packages are missing')
+        manifest = build_assets(app)
+        load_manifest(app)
+        click.echo(f"Built {len(manifest['files'])} assets")
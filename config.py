@@ -0,0 +1,231 @@
+"""
+Environment based configuration helpers
+Everything here only reads os.environ; create_app() applies the result.
+"""
+import os
+
+
+def _bool_env(name, default=False):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _int_env(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _float_env(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+
+def normalize_database_url(url):
+    """URLが 'postgres://' で始まる場合は 'postgresql://' に変換"""
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def _is_postgres(url):
+    return url.startswith('postgresql')
+
+
+def engine_options(url, statement_timeout_ms=None):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the given database URL
+
+    Tunables:
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+        DB_STATEMENT_TIMEOUT_MS (PostgreSQL only, 0 disables)
+    """
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': _int_env('DB_POOL_RECYCLE', 1800),
+    }
+
+    # SQLiteのインメモリDBなどはQueuePool以外を使うためサイズ指定は不可
+    if not url.startswith('sqlite'):
+        options.update(
+            pool_size=_int_env('DB_POOL_SIZE', 5),
+            max_overflow=_int_env('DB_MAX_OVERFLOW', 10),
+            pool_timeout=_int_env('DB_POOL_TIMEOUT', 10),
+        )
+
+    if statement_timeout_ms is None:
+        statement_timeout_ms = _int_env('DB_STATEMENT_TIMEOUT_MS', 30000)
+    if _is_postgres(url) and statement_timeout_ms:
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout_ms}'
+        }
+
+    return options
+
+
+def replica_urls():
+    """Read replica URLs from DATABASE_REPLICA_URLS (comma separated)"""
+    raw = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return [normalize_database_url(u.strip()) for u in raw.split(',') if u.strip()]
+
+
+def replica_binds():
+    """SQLALCHEMY_BINDS entries for every configured read replica
+
+    Replicas get their own statement timeout (DB_READ_STATEMENT_TIMEOUT_MS)
+    because they only ever serve the read-only routes.
+    """
+    read_timeout = _int_env('DB_READ_STATEMENT_TIMEOUT_MS', 5000)
+    binds = {}
+    for index, url in enumerate(replica_urls()):
+        binds[f'replica_{index}'] = dict(
+            url=url, **engine_options(url, statement_timeout_ms=read_timeout))
+    return binds
+
+
+def database_config(database_url):
+    """Flask config entries for the primary database and its replicas"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(database_url),
+        'SQLALCHEMY_BINDS': replica_binds(),
+        # 書き込み後にこの秒数だけプライマリへ固定する（read-your-writes）
+        'DB_REPLICA_PIN_SECONDS': _int_env('DB_REPLICA_PIN_SECONDS', 10),
+    }
+
+
+def boot_config():
+    """Flask config entries controlling what happens at startup
+
+    SAKE_BOOTSTRAP=1 restores the old behaviour of running db.create_all()
+    and a full Sakenowa sync inside create_app(). Production workers leave
+    it off so that booting does no DDL and no network I/O.
+    """
+    return {
+        'BOOTSTRAP_ON_START': _bool_env('SAKE_BOOTSTRAP', False),
+    }
+
+
+def auth_config():
+    """Flask config entries for login sessions and password hashing
+
+    PASSWORD_HASH_METHOD takes a Werkzeug method string such as
+    "scrypt:32768:8:1" or "pbkdf2:sha256:600000". Stored hashes created
+    with a different method or salt length are upgraded the next time the
+    user logs in.
+
+    Admin-only endpoints accept either a logged-in user listed in
+    ADMIN_USERNAMES (comma separated) or "Authorization: Bearer
+    <ADMIN_API_TOKEN>" for scripts.
+    """
+    return {
+        # セッションに載せた本人情報を信用する秒数（過ぎたらDBで再確認）
+        'SESSION_IDENTITY_MAX_AGE': _int_env('SESSION_IDENTITY_MAX_AGE', 300),
+        'USER_CACHE_TTL': _int_env('USER_CACHE_TTL', 60),
+        'PASSWORD_HASH_METHOD': os.environ.get('PASSWORD_HASH_METHOD') or None,
+        'PASSWORD_SALT_LENGTH': _int_env('PASSWORD_SALT_LENGTH', 16),
+        'ADMIN_USERNAMES': frozenset(
+            u.strip() for u in os.environ.get('ADMIN_USERNAMES', '').split(',')
+            if u.strip()),
+        'ADMIN_API_TOKEN': os.environ.get('ADMIN_API_TOKEN') or None,
+    }
+
+
+def catalog_config():
+    """Flask config entries for the memory-mapped catalog snapshot
+
+    CATALOG_SNAPSHOT_PATH defaults to <instance>/catalog.snapshot; every
+    worker on a node must see the same file.
+    """
+    return {
+        'CATALOG_SNAPSHOT_PATH': os.environ.get('CATALOG_SNAPSHOT_PATH') or None,
+        # 差し替えを確認する間隔（秒）
+        'CATALOG_SNAPSHOT_CHECK_SECONDS': _int_env(
+            'CATALOG_SNAPSHOT_CHECK_SECONDS', 5),
+    }
+
+
+def upload_config():
+    """Flask config entries for file uploads (review import)
+
+    MAX_UPLOAD_MB bounds the request body; 50k reviews of CSV is about 5 MB.
+    """
+    return {
+        'MAX_CONTENT_LENGTH': _int_env('MAX_UPLOAD_MB', 32) * 1024 * 1024,
+        'REVIEW_IMPORT_BATCH_SIZE': _int_env('REVIEW_IMPORT_BATCH_SIZE', 1000),
+    }
+
+
+def health_config():
+    """Flask config entries for /health/ready
+
+    HEALTH_DRAIN_FILE defaults to <instance>/drain; while it exists every
+    worker on the node reports not-ready (see "flask drain").
+    """
+    return {
+        # これより遅いDBの往復は not-ready とみなす
+        'HEALTH_DB_LATENCY_MS': _int_env('HEALTH_DB_LATENCY_MS', 250),
+        'HEALTH_REQUIRE_SNAPSHOT': _bool_env('HEALTH_REQUIRE_SNAPSHOT', True),
+        'HEALTH_DRAIN_FILE': os.environ.get('HEALTH_DRAIN_FILE') or None,
+    }
+
+
+def profiling_config():
+    """Flask config entries for request profiling (off by default)
+
+    PROFILE_SAMPLE_RATE is the share of requests to profile (0.01 = 1%).
+    Any request with "X-Profile-Token: <PROFILE_TOKEN>" is profiled too;
+    PROFILE_TOKEN falls back to ADMIN_API_TOKEN. PROFILE_DIR defaults to
+    <instance>/profiles and keeps the newest PROFILE_KEEP profiles.
+    """
+    return {
+        'PROFILE_SAMPLE_RATE': _float_env('PROFILE_SAMPLE_RATE', 0.0),
+        'PROFILE_TOKEN': os.environ.get('PROFILE_TOKEN') or None,
+        'PROFILE_INTERVAL_MS': _int_env('PROFILE_INTERVAL_MS', 10),
+        'PROFILE_DIR': os.environ.get('PROFILE_DIR') or None,
+        'PROFILE_KEEP': _int_env('PROFILE_KEEP', 500),
+    }
+
+
+# 重いエンドポイントの既定値: エンドポイント名 -> (毎秒の補充数, バケット容量)
+# "POST endpoint" のようにメソッドを付けると、そのメソッドだけを数える
+DEFAULT_RATE_LIMITS = {
+    'main.search': (2.0, 10.0),
+    'main.area_rankings': (5.0, 20.0),
+    'main.flavor_tag_ranking': (2.0, 10.0),
+    # フォームの表示（GET）は数えず、アップロードだけを制限する
+    'POST main.import_reviews': (0.05, 3.0),
+}
+
+
+def _rate_limits_env(name):
+    """'endpoint=rate:burst,...' -> {endpoint: (rate, burst)}"""
+    rules = {}
+    for item in os.environ.get(name, '').split(','):
+        endpoint, _, spec = item.partition('=')
+        if not endpoint.strip() or not spec:
+            continue
+        rate, _, burst = spec.partition(':')
+        rate = float(rate)
+        rules[endpoint.strip()] = (rate, float(burst) if burst else max(1.0, rate))
+    return rules
+
+
+def throttling_config():
+    """Flask config entries for per-client rate limiting
+
+    RATE_LIMITS overrides the defaults per endpoint as
+    "main.search=2:10,main.area_rankings=5:20" (tokens per second:burst);
+    prefix an endpoint with a method ("POST main.import_reviews=0.05:3")
+    to limit only that method.
+    Behind a reverse proxy set TRUSTED_PROXY_COUNT to the number of hops
+    that append to X-Forwarded-For, otherwise every client shares the
+    proxy's address.
+    """
+    rules = dict(DEFAULT_RATE_LIMITS)
+    rules.update(_rate_limits_env('RATE_LIMITS'))
+    return {
+        'RATE_LIMIT_ENABLED': _bool_env('RATE_LIMIT_ENABLED', True),
+        'RATE_LIMITS': rules,
+        'TRUSTED_PROXY_COUNT': _int_env('TRUSTED_PROXY_COUNT', 0),
+    }
@@ -1,11 +1,12 @@
 import logging
 from sqlalchemy import text
+from logging_config import configure_logging
 from app import create_app
 from models import db
 from models.user import User
 from models.region import Region
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 def verify_database_encoding():
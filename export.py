@@ -0,0 +1,234 @@
+"""
+Bulk export of the catalog and reviews
+Rows come from a server-side cursor (yield_per) in fixed-size chunks and
+are encoded chunk by chunk, so memory stays flat whatever the table size.
+Formats: CSV, NDJSON and Parquet (needs pyarrow).
+
+Incremental exports pass `since`; every export is bounded above by the
+newest updated_at seen when it started, which is returned as the
+watermark to use for the next run.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import JSON, Boolean, Date, DateTime, Float, Integer, func, select
+
+from models import db
+from models.catalog_listing import CatalogListing
+from models.review import Review
+from models.sake import Sake
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 1000
+
+# pyarrow は重いので Parquet 出力を要求された時だけ読み込む
+pyarrow = None
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _load_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportError('Parquet export needs pyarrow installed')
+        pyarrow = pa
+    return pyarrow
+
+
+def _catalog_columns():
+    columns = [c for c in CatalogListing.__table__.c
+               if c.name not in ('refreshed_at',)]
+    return columns + [Sake.updated_at.label('updated_at')]
+
+
+# dataset -> (columns, FROM句を組み立てる関数, ウォーターマーク列, 主キー)
+DATASETS = {
+    'catalog': (
+        _catalog_columns,
+        lambda stmt: stmt.select_from(CatalogListing).join(
+            Sake, Sake.id == CatalogListing.sake_id),
+        Sake.updated_at,
+        CatalogListing.sake_id,
+    ),
+    'reviews': (
+        lambda: list(Review.__table__.c),
+        lambda stmt: stmt.select_from(Review),
+        Review.updated_at,
+        Review.id,
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportJob:
+    """A planned export: dataset, format and the updated_at window"""
+
+    def __init__(self, dataset, fmt='csv', since=None,
+                 chunk_rows=DEFAULT_CHUNK_ROWS):
+        if dataset not in DATASETS:
+            raise ExportError(f"Unknown dataset '{dataset}'")
+        if fmt not in FORMATS:
+            raise ExportError(f"Unknown format '{fmt}'")
+        if fmt == 'parquet':
+            _load_pyarrow()
+        self.dataset = dataset
+        self.fmt = fmt
+        self.since = since
+        self.chunk_rows = chunk_rows
+        columns, self._from, self._watermark_col, self._key = DATASETS[dataset]
+        self.columns = columns()
+        self.column_names = [c.name for c in self.columns]
+        # 開始時点の最新 updated_at を上限にする（次回の since になる）
+        self.watermark = db.session.execute(
+            self._from(select(func.max(self._watermark_col)))).scalar()
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.fmt]
+
+    def statement(self):
+        stmt = self._from(select(*self.columns))
+        if self.since is not None:
+            stmt = stmt.where(self._watermark_col > self.since)
+        if self.watermark is not None:
+            stmt = stmt.where(self._watermark_col <= self.watermark)
+        return stmt.order_by(self._watermark_col, self._key)
+
+    def row_chunks(self):
+        """Lists of rows, chunk_rows at a time, from a server-side cursor"""
+        result = db.session.execute(
+            self.statement().execution_options(yield_per=self.chunk_rows))
+        total = 0
+        for partition in result.partitions():
+            total += len(partition)
+            yield partition
+        logger.info("Exported %s %s rows as %s", total, self.dataset,
+                    self.fmt)
+
+    def encoded_chunks(self):
+        """Bytes for the whole export, one piece per chunk of rows"""
+        if self.fmt == 'parquet':
+            return _parquet_chunks(self.columns, self.row_chunks())
+        encoder = {'csv': _csv_chunks, 'ndjson': _ndjson_chunks}[self.fmt]
+        return encoder(self.column_names, self.row_chunks())
+
+
+def parse_since(value):
+    """ISO 8601 date/datetime -> datetime (None for empty)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"'since' must be an ISO 8601 datetime: {value}")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow(json.dumps(v, ensure_ascii=False)
+                            if isinstance(v, list) else v for v in row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(columns, chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False,
+                       default=_json_default) + '\n'
+            for row in rows).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file for ParquetWriter that hands bytes back per chunk
+
+    tell() keeps counting across drains so the footer offsets stay right.
+    """
+
+    def __init__(self):
+        self._pieces = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._pieces.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def _arrow_type(column):
+    kind = column.type
+    if isinstance(kind, Boolean):
+        return pyarrow.bool_()
+    if isinstance(kind, Integer):
+        return pyarrow.int64()
+    if isinstance(kind, Float):
+        return pyarrow.float64()
+    if isinstance(kind, DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(kind, Date):
+        return pyarrow.date32()
+    # JSON は CSV と同じくJSON文字列で出す
+    return pyarrow.string()
+
+
+def _parquet_chunks(columns, chunks):
+    # 最初のチャンクから推測すると全件NULLの列で型が決まらないので、列定義から作る
+    schema = pyarrow.schema([(c.name, _arrow_type(c)) for c in columns])
+    json_columns = [i for i, c in enumerate(columns)
+                    if isinstance(c.type, JSON)]
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(
+        pyarrow.PythonFile(sink, mode='w'), schema, compression='zstd')
+    for rows in chunks:
+        if json_columns:
+            rows = [tuple(json.dumps(v, ensure_ascii=False)
+                          if i in json_columns and v is not None else v
+                          for i, v in enumerate(row)) for row in rows]
+        # 1チャンク = 1 row group
+        arrays = [pyarrow.array(values, type=field.type)
+                  for values, field in zip(zip(*rows), schema)]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,185 @@
+"""
+Search facet counts
+Counts per flavor tag, prefecture and flavor axis for the current result
+set, computed from the memory-mapped catalog snapshot in one pass: the
+result set becomes a boolean mask over the snapshot rows, tag and region
+facets are one numpy.bincount each, and each flavor axis counts the rows
+at or past the same threshold the search's direction filter applies
+(f >= t / f <= t), so a facet's count is the result count of its link.
+Without numpy the same pass runs as a plain loop. The unfiltered facets
+are computed once per snapshot and threshold and reused.
+"""
+import logging
+import struct
+import threading
+
+from catalog_snapshot import FLAVOR_COUNT, get_snapshot
+from tag_loader import flavor_tag_names
+
+logger = logging.getLogger(__name__)
+
+# 表示するタグの数（件数の多い順）
+TOP_TAGS = 20
+DEFAULT_THRESHOLD = 0.5
+# 全件ファセットを保持するしきい値の数（強さ1-10）。それ以上は毎回数える
+MAX_CACHED_THRESHOLDS = 10
+
+
+def _float32(value):
+    # スナップショットの値はfloat32。しきい値も同じ精度に丸めて比較する
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+class _FacetIndex:
+    """Per-snapshot arrays the facet pass needs, built once"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.identity = snapshot.identity()
+        count = snapshot.count
+        # 地域の索引 -> (地域ID, 地域名)。地域名はスナップショット側で地域IDの索引に揃えてある
+        self.regions = {}
+        region_idx = snapshot.array('region_idx')
+        for i in range(count):
+            index = int(region_idx[i])
+            if index not in self.regions:
+                self.regions[index] = (snapshot.region_id(i),
+                                       snapshot.region_name(i))
+        self.region_count = max(self.regions, default=-1) + 1
+        # スナップショットをmapした時に読み込まれたnumpy（なければ None）
+        numpy = self.numpy = snapshot.numpy
+        if numpy is not None:
+            offsets = snapshot.array('tag_offsets')
+            # タグ1件ごとに、それが属する行番号
+            self.tag_rows = numpy.repeat(numpy.arange(count), numpy.diff(offsets))
+        self.unfiltered = {}  # しきい値 -> 全件のファセット
+
+    def rows_for(self, sake_ids):
+        """Boolean mask (numpy) or set of row numbers for the given sake ids"""
+        snapshot, numpy = self.snapshot, self.numpy
+        if numpy is not None:
+            mask = numpy.zeros(snapshot.count, dtype=bool)
+            all_ids = snapshot.array('sake_ids')
+            ids = numpy.fromiter(sake_ids, dtype=all_ids.dtype)
+            if snapshot.count and len(ids):
+                positions = numpy.minimum(numpy.searchsorted(all_ids, ids),
+                                          snapshot.count - 1)
+                # スナップショットより新しい銘柄は数えない
+                mask[positions[all_ids[positions] == ids]] = True
+            return mask
+        rows = set()
+        for sake_id in sake_ids:
+            i = snapshot.index_of(sake_id)
+            if i is not None:
+                rows.add(i)
+        return rows
+
+    def counts(self, mask, threshold):
+        """(tag counts, region counts, [(f >= t, f <= t) per axis], total)"""
+        if self.numpy is not None:
+            return self._numpy_counts(mask, threshold)
+        return self._loop_counts(mask, threshold)
+
+    def _numpy_counts(self, mask, threshold):
+        snapshot, numpy = self.snapshot, self.numpy
+        tag_ids = snapshot.array('tag_ids')
+        region_idx = snapshot.array('region_idx')
+        flavors = snapshot.array('flavors')
+        if mask is not None:
+            tag_ids = tag_ids[mask[self.tag_rows]]
+            region_idx = region_idx[mask]
+            flavors = flavors[mask]
+        tags = numpy.bincount(tag_ids) if len(tag_ids) else numpy.zeros(0, int)
+        regions = numpy.bincount(region_idx, minlength=self.region_count)
+        # NaN（チャートのない軸）はどちらの比較でも False になる（SQLのNULLと同じ）
+        threshold = numpy.float32(threshold)
+        high = (flavors >= threshold).sum(axis=0).tolist()
+        low = (flavors <= threshold).sum(axis=0).tolist()
+        tag_counts = {int(t): int(tags[t]) for t in numpy.flatnonzero(tags)}
+        region_counts = {int(r): int(regions[r])
+                         for r in numpy.flatnonzero(regions)}
+        total = snapshot.count if mask is None else int(mask.sum())
+        return tag_counts, region_counts, list(zip(high, low)), total
+
+    def _loop_counts(self, rows, threshold):
+        snapshot = self.snapshot
+        offsets = snapshot.array('tag_offsets')
+        tag_ids = snapshot.array('tag_ids')
+        region_idx = snapshot.array('region_idx')
+        flavors = snapshot.array('flavors')
+        threshold = _float32(threshold)
+        tag_counts, region_counts = {}, {}
+        high, low = [0] * FLAVOR_COUNT, [0] * FLAVOR_COUNT
+        for i in (range(snapshot.count) if rows is None else rows):
+            for t in tag_ids[offsets[i]:offsets[i + 1]]:
+                tag_counts[t] = tag_counts.get(t, 0) + 1
+            region = region_idx[i]
+            region_counts[region] = region_counts.get(region, 0) + 1
+            for axis in range(FLAVOR_COUNT):
+                value = flavors[i * FLAVOR_COUNT + axis]
+                # NaN はどちらの比較も False
+                if value >= threshold:
+                    high[axis] += 1
+                if value <= threshold:
+                    low[axis] += 1
+        total = snapshot.count if rows is None else len(rows)
+        return tag_counts, region_counts, list(zip(high, low)), total
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def _facet_index(snapshot):
+    global _index
+    index = _index
+    if index is None or index.identity != snapshot.identity():
+        with _lock:
+            if _index is None or _index.identity != snapshot.identity():
+                _index = _FacetIndex(snapshot)
+            index = _index
+    return index
+
+
+def _payload(index, counts):
+    tag_counts, region_counts, axes, total = counts
+    names = flavor_tag_names()
+    tags = sorted(((count, tag_id) for tag_id, count in tag_counts.items()
+                   if tag_id in names), key=lambda c: (-c[0], names[c[1]].name))
+    return {
+        'total': total,
+        'tags': [{'id': names[tag_id].sakenowa_id, 'name': names[tag_id].name,
+                  'count': count} for count, tag_id in tags[:TOP_TAGS]],
+        'regions': sorted(({'id': index.regions[r][0],
+                            'name': index.regions[r][1], 'count': count}
+                           for r, count in region_counts.items()),
+                          key=lambda r: (-r['count'], r['id'])),
+        'flavors': {f'f{axis + 1}': {'high': high, 'low': low}
+                    for axis, (high, low) in enumerate(axes)},
+    }
+
+
+def search_facets(sake_ids=None, threshold=DEFAULT_THRESHOLD):
+    """Facet counts for a result set, or the whole catalog when sake_ids is None
+
+    threshold is the 0-1 flavor threshold the facet links will filter by.
+    Returns None when no snapshot has been written yet. Facets are an aid,
+    so a failure is logged and the search page renders without them.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    try:
+        index = _facet_index(snapshot)
+        if sake_ids is None:
+            # 全件の集計はスナップショットとしきい値ごとに1回だけ
+            facets = index.unfiltered.get(threshold)
+            if facets is None:
+                facets = _payload(index, index.counts(None, threshold))
+                if len(index.unfiltered) < MAX_CACHED_THRESHOLDS:
+                    index.unfiltered[threshold] = facets
+            return facets
+        return _payload(index, index.counts(index.rows_for(sake_ids), threshold))
+    except Exception as e:
+        logger.error("Failed to compute search facets: %s", e, exc_info=True)
+        return None
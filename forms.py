@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField
+from flask_wtf.file import FileAllowed, FileField, FileRequired
+from wtforms import StringField, PasswordField, SelectField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
 from models.user import User
 
@@ -24,3 +25,16 @@ class SignupForm(FlaskForm):
     def validate_email(self, field):
         if User.query.filter_by(email=field.data).first():
             raise ValidationError('このメールアドレスは既に登録されています')
+
+
+class ReviewImportForm(FlaskForm):
+    file = FileField('File',
+                     validators=[FileRequired(message='ファイルを選択してください'),
+                                 FileAllowed(['csv', 'json', 'ndjson', 'jsonl'],
+                                             message='CSV・JSON・NDJSONファイルを選択してください')])
+    encoding = SelectField('Encoding', choices=[('utf-8-sig', 'UTF-8'),
+                                                ('cp932', 'Shift_JIS (Excel)')],
+                           default='utf-8-sig')
+    rating_scale = SelectField('Rating scale', coerce=int,
+                               choices=[(5, '5段階'), (10, '10段階'), (100, '100点満点')],
+                               default=5)
@@ -0,0 +1,148 @@
+"""
+Liveness and readiness endpoints
+/health/live only says the process answers requests. /health/ready is
+what the load balancer should route on: it answers 503 while the node is
+draining, while this process is running a Sakenowa sync, when a database
+round trip is slow or failing, when no catalog snapshot is mapped, or
+when the per-worker caches every page needs cannot be filled.
+"""
+import logging
+import os
+import time
+
+from flask import current_app, jsonify
+from sqlalchemy import text
+
+from cache import all_caches
+from catalog import catalog_version
+from catalog_snapshot import get_snapshot
+from models import db
+from tag_loader import flavor_tag_names
+
+logger = logging.getLogger(__name__)
+
+# readiness の前に温めておくキャッシュ: キャッシュ名 -> 読み込み関数
+WARMERS = {
+    'catalog_version': catalog_version,
+    'flavor_tag_names': flavor_tag_names,
+}
+
+
+def drain_path(app=None):
+    app = app or current_app
+    return app.config.get('HEALTH_DRAIN_FILE') or os.path.join(
+        app.instance_path, 'drain')
+
+
+def _check_drain():
+    draining = os.path.exists(drain_path())
+    return {'ok': not draining, 'draining': draining}
+
+
+def _check_sync():
+    from sync_history import sync_running
+    running = sync_running()
+    return {'ok': not running, 'running': running}
+
+
+def _check_database():
+    """SELECT 1 on the primary and every replica; the slowest one counts"""
+    threshold = current_app.config.get('HEALTH_DB_LATENCY_MS', 250)
+    latencies = {}
+    try:
+        for key, engine in db.engines.items():
+            started = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            latencies[key or 'primary'] = round(
+                (time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        logger.error("Readiness database check failed: %s", e)
+        return {'ok': False, 'error': str(e), 'latency_ms': latencies}
+    return {'ok': max(latencies.values(), default=0) <= threshold,
+            'latency_ms': latencies, 'threshold_ms': threshold}
+
+
+def _check_catalog():
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return {'ok': not current_app.config.get('HEALTH_REQUIRE_SNAPSHOT', True),
+                'loaded': False}
+    return {'ok': True, 'loaded': True, 'version': snapshot.version,
+            'sakes': snapshot.count}
+
+
+def _check_caches(warm):
+    """Fill the caches in WARMERS when they are empty, then report sizes
+
+    A cold worker gets no traffic until it is ready, so the readiness probe
+    itself is what warms it.
+    """
+    caches = all_caches()
+    cold = []
+    for name, load in WARMERS.items():
+        cache = caches.get(name)
+        if cache is None or len(cache):
+            continue
+        if warm:
+            try:
+                load()
+                continue
+            except Exception as e:
+                logger.error("Failed to warm cache %s: %s", name, e)
+        cold.append(name)
+    return {'ok': not cold, 'cold': cold,
+            'entries': {name: len(cache) for name, cache in sorted(caches.items())}}
+
+
+def readiness():
+    """(ready, {check name: details})"""
+    checks = {
+        'drain': _check_drain(),
+        'sync': _check_sync(),
+        'database': _check_database(),
+        'catalog': _check_catalog(),
+    }
+    # DBに届かないときは温めようとしない（プールの待ち時間だけ遅くなる）
+    checks['caches'] = _check_caches(warm='error' not in checks['database'])
+    return all(check['ok'] for check in checks.values()), checks
+
+
+def _no_store(response, status=200):
+    response.status_code = status
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_health(app):
+    """Register /health, /health/live and /health/ready"""
+
+    @app.route('/health')
+    def health_check():
+        # 既存の監視向け。中身は liveness と同じ
+        return jsonify({
+            "status": "healthy",
+            "port": 5000,
+            "boot_ms": app.config.get('BOOT_MS')
+        })
+
+    @app.route('/health/live')
+    def health_live():
+        return _no_store(jsonify({'status': 'alive',
+                                  'boot_ms': app.config.get('BOOT_MS')}))
+
+    last_ready = [None]
+
+    @app.route('/health/ready')
+    def health_ready():
+        ready, checks = readiness()
+        # 状態が変わったときだけ記録する（プローブは数秒ごとに来る）
+        if ready != last_ready[0]:
+            last_ready[0] = ready
+            failing = [name for name, check in checks.items() if not check['ok']]
+            logger.info("Readiness changed to %s%s",
+                        'ready' if ready else 'not ready',
+                        f" ({', '.join(failing)})" if failing else '')
+        return _no_store(jsonify({'status': 'ready' if ready else 'not_ready',
+                                  'checks': checks}),
+                         200 if ready else 503)
@@ -0,0 +1,117 @@
+"""
+Asynchronous logging setup
+Request threads only enqueue records; a background QueueListener does the I/O.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+APP_LOG_FILE = os.environ.get('SAKE_APP_LOG', 'sake_app.log')
+SAKENOWA_LOG_FILE = os.environ.get('SAKENOWA_LOG', 'sakenowa_update.log')
+
+# 例: LOG_LEVEL=INFO, LOG_LEVELS="sakenowa=DEBUG,routes=WARNING"
+DEFAULT_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+MODULE_LEVELS = os.environ.get('LOG_LEVELS', '')
+# 高頻度ログ（リクエスト毎のINFOなど）のサンプリング率
+DEFAULT_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.1'))
+
+_listener = None
+
+
+def sampled(rate=None):
+    """Return an `extra` dict marking a record as sampled at `rate`"""
+    return {'sample_rate': DEFAULT_SAMPLE_RATE if rate is None else rate}
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a random share of records that were logged with sampled()"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+def _parse_module_levels(spec):
+    """Parse "name=LEVEL,name=LEVEL" into a dict"""
+    levels = {}
+    for item in spec.split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_handlers():
+    """Create the blocking handlers that run on the listener thread"""
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    app_file = logging.FileHandler(APP_LOG_FILE, encoding='utf-8')
+    stdout = logging.StreamHandler(sys.stdout)
+
+    # Sakenowa同期のログは専用ファイルにも書き出す
+    sakenowa_file = logging.FileHandler(SAKENOWA_LOG_FILE, encoding='utf-8')
+    sakenowa_file.addFilter(logging.Filter('sakenowa'))
+
+    handlers = [app_file, stdout, sakenowa_file]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _start_listener(log_queue):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue,
+                                               *_build_handlers(),
+                                               respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    """The listener thread does not survive fork (gunicorn --preload)"""
+    if _listener is not None:
+        _start_listener(_listener.queue)
+
+
+def stop_logging():
+    """Flush pending records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+
+def configure_logging():
+    """Install the queue-based logging pipeline (idempotent)"""
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(DEFAULT_LEVEL)
+
+    for name, level in _parse_module_levels(MODULE_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    # urllib3の接続ログは同期中に大量に出るため抑制
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+    _start_listener(log_queue)
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
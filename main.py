@@ -1,22 +1,11 @@
 import logging
 import sys
 from sqlalchemy import text
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-import os
-import socket
-import signal
-import psutil
+from logging_config import configure_logging
 from models import db, Ranking  # Rankingモデルを追加
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("sake_app.log"),
-        logging.StreamHandler(sys.stdout)
-    ])
+configure_logging()
 logger = logging.getLogger(__name__)
 
 def check_database():
@@ -29,12 +18,12 @@ def check_database():
 
         # Check if rankings table exists and has data
         ranking_count = db.session.query(Ranking).count()
-        logger.info(f"Found {ranking_count} rankings in database")
+        logger.info("Found %d rankings in database", ranking_count)
 
         logger.info("Database connection successful")
         return True
     except Exception as e:
-        logger.error(f"Database check failed: {str(e)}")
+        logger.error("Database check failed: %s", e)
         return False
 
 def main():
@@ -53,7 +42,7 @@ def main():
             logger.info("Database verification successful")
 
     except Exception as e:
-        logger.error(f"Application startup error: {str(e)}", exc_info=True)
+        logger.error("Application startup error: %s", e, exc_info=True)
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""indexes for hot join paths
+
+- flavor_charts.sake_id becomes unique (one chart per sake)
+- brand_flavor_tags gets a unique (sake_id, flavor_tag_id) index and the
+  reverse (flavor_tag_id, sake_id) index for tag -> sake lookups
+- reviews (sake_id, created_at) for per-sake review listings
+- rankings (category, rank) replaces the single-column category index
+- sakes.brewery_id (brewery -> sakes) and sakes.created_at (latest sakes)
+
+Duplicate rows that would violate the new unique indexes are removed
+first. Indexes that already exist (tables created by db.create_all() from
+the current models) are skipped.
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-19 16:38:49.555075
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_path_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+NEW_INDEXES = [
+    ('brand_flavor_tags', 'idx_brand_flavor_tag_sake_tag', ['sake_id', 'flavor_tag_id'], True),
+    ('brand_flavor_tags', 'idx_brand_flavor_tag_tag_sake', ['flavor_tag_id', 'sake_id'], False),
+    ('flavor_charts', 'idx_flavor_chart_sake', ['sake_id'], True),
+    ('rankings', 'idx_category_rank', ['category', 'rank'], False),
+    ('reviews', 'idx_sake_created', ['sake_id', 'created_at'], False),
+    ('sakes', 'ix_sakes_brewery_id', ['brewery_id'], False),
+    ('sakes', 'ix_sakes_created_at', ['created_at'], False),
+]
+
+
+def _index_names(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # 一意インデックスの前に重複行を削除する
+    op.execute("DELETE FROM flavor_charts WHERE id NOT IN "
+               "(SELECT MAX(id) FROM flavor_charts GROUP BY sake_id)")
+    op.execute("DELETE FROM brand_flavor_tags WHERE id NOT IN "
+               "(SELECT MIN(id) FROM brand_flavor_tags GROUP BY sake_id, flavor_tag_id)")
+
+    for table, name, columns, unique in NEW_INDEXES:
+        if name not in _index_names(table):
+            op.create_index(name, table, columns, unique=unique)
+
+    # (category, rank) の先頭列と重複するので不要
+    if 'ix_rankings_category' in _index_names('rankings'):
+        op.drop_index('ix_rankings_category', table_name='rankings')
+
+
+def downgrade():
+    op.create_index('ix_rankings_category', 'rankings', ['category'], unique=False)
+    for table, name, columns, unique in reversed(NEW_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,85 @@
+"""flavor buckets
+
+Every flavor chart axis is quantized into three levels at ingest. The
+packed level code and the derived description are stored on
+flavor_charts and copied to catalog_listings, both indexed, so flavor
+filters are equality lookups. Existing charts are backfilled here.
+
+Revision ID: 0005_flavor_buckets
+Revises: 0004_sync_runs
+Create Date: 2026-10-19 16:53:27.637030
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models.flavor_chart import quantize
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_flavor_buckets'
+down_revision = '0004_sync_runs'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 1000
+
+
+def _column_names(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _backfill():
+    conn = op.get_bind()
+    charts = sa.table('flavor_charts', sa.column('id'),
+                      *[sa.column(f'f{i}') for i in range(1, 7)],
+                      sa.column('bucket_code'), sa.column('description'))
+    rows = conn.execute(sa.select(charts.c.id, *[charts.c[f'f{i}'] for i in range(1, 7)])
+                        .where(charts.c.bucket_code.is_(None))).all()
+    stmt = charts.update().where(charts.c.id == sa.bindparam('chart_id')).values(
+        bucket_code=sa.bindparam('code'), description=sa.bindparam('text'))
+    params = []
+    for chart_id, *values in rows:
+        fields = quantize(values)
+        if fields['bucket_code'] is not None:
+            params.append({'chart_id': chart_id, 'code': fields['bucket_code'],
+                           'text': fields['description']})
+    for start in range(0, len(params), BACKFILL_BATCH):
+        conn.execute(stmt, params[start:start + BACKFILL_BATCH])
+
+    op.execute("UPDATE catalog_listings SET "
+               "flavor_code = (SELECT bucket_code FROM flavor_charts "
+               "WHERE flavor_charts.sake_id = catalog_listings.sake_id), "
+               "flavor_description = (SELECT description FROM flavor_charts "
+               "WHERE flavor_charts.sake_id = catalog_listings.sake_id)")
+
+
+def upgrade():
+    # db.create_all() で作成済みの列は追加しない（値の埋め戻しは行う）
+    if 'flavor_code' not in _column_names('catalog_listings'):
+        with op.batch_alter_table('catalog_listings', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('flavor_code', sa.SmallInteger(), nullable=True))
+            batch_op.add_column(sa.Column('flavor_description', sa.String(length=100), nullable=True))
+            batch_op.create_index('idx_listing_flavor_code', ['flavor_code'], unique=False)
+
+    if 'bucket_code' not in _column_names('flavor_charts'):
+        with op.batch_alter_table('flavor_charts', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('bucket_code', sa.SmallInteger(), nullable=True))
+            batch_op.add_column(sa.Column('description', sa.String(length=100), nullable=True))
+            batch_op.create_index('idx_flavor_chart_code', ['bucket_code'], unique=False)
+            batch_op.create_index('idx_flavor_chart_description', ['description'], unique=False)
+
+    _backfill()
+
+
+def downgrade():
+    with op.batch_alter_table('flavor_charts', schema=None) as batch_op:
+        batch_op.drop_index('idx_flavor_chart_description')
+        batch_op.drop_index('idx_flavor_chart_code')
+        batch_op.drop_column('description')
+        batch_op.drop_column('bucket_code')
+
+    with op.batch_alter_table('catalog_listings', schema=None) as batch_op:
+        batch_op.drop_index('idx_listing_flavor_code')
+        batch_op.drop_column('flavor_description')
+        batch_op.drop_column('flavor_code')
@@ -0,0 +1,56 @@
+"""partial chart codes
+
+Charts with only some axes used to get no bucket_code, so the flavor
+filter needed an "OR flavor_code IS NULL" branch that no index can serve.
+quantize() now codes every chart with at least one value; backfill the
+charts and listings that are still NULL.
+
+Revision ID: 0010_partial_chart_codes
+Revises: 0009_listing_region_index
+Create Date: 2026-10-19 17:50:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models.flavor_chart import quantize
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_partial_chart_codes'
+down_revision = '0009_listing_region_index'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 1000
+
+
+def upgrade():
+    conn = op.get_bind()
+    charts = sa.table('flavor_charts', sa.column('id'),
+                      *[sa.column(f'f{i}') for i in range(1, 7)],
+                      sa.column('bucket_code'))
+    rows = conn.execute(sa.select(charts.c.id, *[charts.c[f'f{i}'] for i in range(1, 7)])
+                        .where(charts.c.bucket_code.is_(None))).all()
+    stmt = charts.update().where(charts.c.id == sa.bindparam('chart_id')).values(
+        bucket_code=sa.bindparam('code'))
+    params = []
+    for chart_id, *values in rows:
+        code = quantize(values)['bucket_code']
+        if code is not None:
+            params.append({'chart_id': chart_id, 'code': code})
+    for start in range(0, len(params), BACKFILL_BATCH):
+        conn.execute(stmt, params[start:start + BACKFILL_BATCH])
+
+    op.execute("UPDATE catalog_listings SET "
+               "flavor_code = (SELECT bucket_code FROM flavor_charts "
+               "WHERE flavor_charts.sake_id = catalog_listings.sake_id) "
+               "WHERE flavor_code IS NULL")
+
+
+def downgrade():
+    # 一部の軸だけのチャートのコードを消す（説明文がNULLなのはそのチャートだけ）
+    op.execute("UPDATE flavor_charts SET bucket_code = NULL "
+               "WHERE description IS NULL")
+    op.execute("UPDATE catalog_listings SET flavor_code = NULL "
+               "WHERE flavor_description IS NULL")
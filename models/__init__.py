@@ -3,9 +3,11 @@ Models package initialization
 Initialize SQLAlchemy instance
 """
 from flask_sqlalchemy import SQLAlchemy
+from .routing import RoutingSession
 
 # Initialize SQLAlchemy without immediate app binding
-db = SQLAlchemy()
+# (RoutingSession sends read-only requests to a replica when configured)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Import models and expose them for external use
 from .sake import Sake
@@ -17,9 +19,16 @@ from .flavor_chart import FlavorChart
 from .flavor_tag import FlavorTag
 from .ranking import Ranking
 from .brand_flavor_tag import BrandFlavorTag
+from .catalog_listing import CatalogListing
+from .sync_run import SyncRun
+from .ranking_history import RankingHistory
+from .brewery_rollup import BreweryRollup
+from .region_rollup import RegionRollup
+from .tag_leaderboard import TagLeaderboard
 
 # Export database instance and models
 __all__ = [
     'db', 'Sake', 'Brewery', 'Region', 'User', 'Review', 'FlavorChart',
-    'FlavorTag', 'Ranking', 'BrandFlavorTag'
+    'FlavorTag', 'Ranking', 'BrandFlavorTag', 'CatalogListing', 'SyncRun',
+    'RankingHistory', 'BreweryRollup', 'RegionRollup', 'TagLeaderboard'
 ]
\ No newline at end of file
@@ -9,5 +9,11 @@ class BrandFlavorTag(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # 銘柄 -> タグ（詳細ページ）とタグ -> 銘柄（タグ検索・ランキング）の両方向
+        db.Index('idx_brand_flavor_tag_sake_tag', 'sake_id', 'flavor_tag_id', unique=True),
+        db.Index('idx_brand_flavor_tag_tag_sake', 'flavor_tag_id', 'sake_id'),
+    )
+
     sake = db.relationship('Sake', backref=db.backref('flavor_tags', lazy='dynamic'))
     flavor_tag = db.relationship('FlavorTag')
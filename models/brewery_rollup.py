@@ -0,0 +1,42 @@
+from datetime import datetime
+from . import db
+
+class BreweryRollup(db.Model):
+    """Per-brewery aggregates for the brewery page
+
+    Rebuilt from catalog_listings by catalog.refresh_rollups() after every
+    sync; keyed by the Sakenowa brewery id because breweries.id changes on
+    each sync.
+    """
+    __tablename__ = 'brewery_rollups'
+    brewery_id = db.Column(db.String(10), primary_key=True)  # breweries.sakenowa_brewery_id
+    name = db.Column(db.String(200), nullable=False)
+    region_id = db.Column(db.String(10), nullable=False)  # regions.sakenowa_id
+    region_name = db.Column(db.String(100), nullable=False)
+
+    sake_count = db.Column(db.Integer, nullable=False, default=0)
+    charted_count = db.Column(db.Integer, nullable=False, default=0)
+    # フレーバーチャートを持つ銘柄の平均
+    f1 = db.Column(db.Float)
+    f2 = db.Column(db.Float)
+    f3 = db.Column(db.Float)
+    f4 = db.Column(db.Float)
+    f5 = db.Column(db.Float)
+    f6 = db.Column(db.Float)
+    best_rank = db.Column(db.Integer)  # 総合ランキングの最高順位
+    best_rank_sake_id = db.Column(db.Integer)
+
+    top_tags = db.Column(db.JSON, nullable=False, default=list)  # [{id, name, count}]
+    sakes = db.Column(db.JSON, nullable=False, default=list)  # [{id, name, rank, description}]
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_brewery_rollup_region', 'region_id', 'best_rank'),
+    )
+
+    @property
+    def has_flavor_chart(self):
+        return self.f1 is not None
+
+    def __repr__(self):
+        return f'<BreweryRollup {self.brewery_id} {self.name}>'
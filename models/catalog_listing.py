@@ -0,0 +1,62 @@
+from datetime import datetime
+from . import db
+
+class CatalogListing(db.Model):
+    """One denormalized row per sake with everything a catalog card shows
+
+    Rebuilt from sakes/breweries/regions/flavor_charts/rankings/
+    brand_flavor_tags by catalog.refresh_listings() after every sync, so the
+    listing pages read a single table instead of a four-way join.
+    """
+    __tablename__ = 'catalog_listings'
+    sake_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    sakenowa_id = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    brewery_id = db.Column(db.Integer, nullable=False)
+    brewery_name = db.Column(db.String(200), nullable=False)
+    region_id = db.Column(db.String(10), nullable=False)  # regions.sakenowa_id
+    region_name = db.Column(db.String(100), nullable=False)
+
+    f1 = db.Column(db.Float)
+    f2 = db.Column(db.Float)
+    f3 = db.Column(db.Float)
+    f4 = db.Column(db.Float)
+    f5 = db.Column(db.Float)
+    f6 = db.Column(db.Float)
+    flavor_code = db.Column(db.SmallInteger)  # flavor_charts.bucket_code
+    flavor_description = db.Column(db.String(100))
+
+    overall_rank = db.Column(db.Integer)
+    overall_score = db.Column(db.Float)
+    area_id = db.Column(db.String(10))  # ランキングカテゴリ area_<id> の <id>
+    area_rank = db.Column(db.Integer)
+    area_score = db.Column(db.Float)
+
+    tag_ids = db.Column(db.JSON, nullable=False, default=list)  # flavor_tags.id
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_listing_created', 'created_at'),
+        db.Index('idx_listing_overall_rank', 'overall_rank'),
+        db.Index('idx_listing_area_rank', 'area_id', 'area_rank'),
+        db.Index('idx_listing_name', 'name'),
+        db.Index('idx_listing_flavor_code', 'flavor_code'),
+        # 検索の都道府県絞り込み（新着順）
+        db.Index('idx_listing_region', 'region_id', 'created_at'),
+    )
+
+    @classmethod
+    def card_columns(cls):
+        """Columns a catalog card needs, for queries returning plain Rows"""
+        return (cls.sake_id, cls.name, cls.brewery_name, cls.region_name,
+                cls.f1, cls.f2, cls.f3, cls.f4, cls.f5, cls.f6,
+                cls.f1.isnot(None).label('has_flavor_chart'), cls.tag_ids)
+
+    @property
+    def has_flavor_chart(self):
+        return self.f1 is not None
+
+    def __repr__(self):
+        return f'<CatalogListing {self.sake_id} {self.name}>'
@@ -1,6 +1,87 @@
 from datetime import datetime
+from functools import lru_cache
+from itertools import product
 from . import db
 
+# 各軸を3段階に量子化する（境界は従来の説明文と同じ 0.4 / 0.6）
+LOW, MID, HIGH = 0, 1, 2
+LOW_BELOW = 0.4
+HIGH_ABOVE = 0.6
+AXIS_COUNT = 6
+# 一部の軸だけのチャートで、値のない軸に入れる段階。NULLの軸は生の値の比較で
+# 必ず外れるので、どの段階を入れても絞り込みの結果は変わらない
+MISSING_LEVEL = MID
+
+# 説明文に使う軸の左右ラベル（f2 の香り-温度は説明文に含めない）
+DESCRIPTION_LABELS = {
+    1: ('華やか', '重厚'),
+    3: ('淡麗', '濃醇'),
+    4: ('甘口', '辛口'),
+    5: ('特性', '個性'),
+    6: ('若年', '熟成'),
+}
+
+
+def flavor_level(value):
+    if value < LOW_BELOW:
+        return LOW
+    if value > HIGH_ABOVE:
+        return HIGH
+    return MID
+
+
+def pack_levels(levels):
+    """Six levels -> one base-3 code, f1 in the lowest digit (0..728)"""
+    return sum(level * 3 ** i for i, level in enumerate(levels))
+
+
+def unpack_code(code):
+    return tuple(code // 3 ** i % 3 for i in range(AXIS_COUNT))
+
+
+@lru_cache(maxsize=None)
+def describe_code(code):
+    """The 「やや〇〇な」 description for a packed code"""
+    levels = unpack_code(code)
+    descriptions = []
+    for axis, (left, right) in DESCRIPTION_LABELS.items():
+        if levels[axis - 1] == LOW:
+            descriptions.append(f"やや{left}な")
+        elif levels[axis - 1] == HIGH:
+            descriptions.append(f"やや{right}な")
+    return ''.join(descriptions) if descriptions else '標準的な'
+
+
+@lru_cache(maxsize=256)
+def codes_matching(constraints):
+    """Every packed code with the given levels, e.g. ((6, LOW), (4, (MID, HIGH)))
+
+    Each axis takes one level or a tuple of allowed levels. Turns a per-axis
+    filter into an IN (...) lookup on the indexed code.
+    """
+    wanted = {axis: levels if isinstance(levels, tuple) else (levels,)
+              for axis, levels in constraints}
+    choices = [wanted.get(axis, (LOW, MID, HIGH))
+               for axis in range(1, AXIS_COUNT + 1)]
+    return tuple(sorted(pack_levels(levels) for levels in product(*choices)))
+
+
+def quantize(values):
+    """f1..f6 -> {'bucket_code', 'description'}
+
+    Every chart with at least one value gets a code, so flavor filters never
+    need an IS NULL branch; missing axes are stored as MISSING_LEVEL. The
+    description is only given for a full chart.
+    """
+    if len(values) != AXIS_COUNT or all(v is None for v in values):
+        return {'bucket_code': None, 'description': None}
+    code = pack_levels([MISSING_LEVEL if v is None else flavor_level(v)
+                        for v in values])
+    complete = all(v is not None for v in values)
+    return {'bucket_code': code,
+            'description': describe_code(code) if complete else None}
+
+
 class FlavorChart(db.Model):
     __tablename__ = 'flavor_charts'
     id = db.Column(db.Integer, primary_key=True)
@@ -11,5 +92,25 @@ class FlavorChart(db.Model):
     f4 = db.Column(db.Float)
     f5 = db.Column(db.Float)
     f6 = db.Column(db.Float)
+    # 取り込み時に quantize() で計算して保存する
+    bucket_code = db.Column(db.SmallInteger)
+    description = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # 1銘柄に1チャート。一覧のJOINはこのインデックスを使う
+        db.Index('idx_flavor_chart_sake', 'sake_id', unique=True),
+        db.Index('idx_flavor_chart_code', 'bucket_code'),
+        db.Index('idx_flavor_chart_description', 'description'),
+    )
+
+    @property
+    def values(self):
+        return (self.f1, self.f2, self.f3, self.f4, self.f5, self.f6)
+
+    @property
+    def levels(self):
+        if self.bucket_code is None or None in self.values:
+            return None
+        return unpack_code(self.bucket_code)
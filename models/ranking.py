@@ -7,12 +7,13 @@ class Ranking(db.Model):
     sake_id = db.Column(db.Integer, db.ForeignKey('sakes.id', ondelete='CASCADE'), nullable=False)
     rank = db.Column(db.Integer, nullable=False, index=True)
     score = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(50), nullable=False, index=True)
+    category = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
         db.Index('idx_sake_category', 'sake_id', 'category'),
+        db.Index('idx_category_rank', 'category', 'rank'),
     )
 
     # Define the relationship with Sake model
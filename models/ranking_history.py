@@ -0,0 +1,31 @@
+from datetime import datetime
+from . import db
+
+class RankingHistory(db.Model):
+    """One ranking entry per sync generation (one generation per day)
+
+    Rankings are keyed by the Sakenowa brand id because sakes.id changes
+    on every sync. rank_delta is the change since the previous generation
+    (positive = moved up, NULL = newly ranked). Old generations are thinned
+    to one per week and then one per month by ranking_history.prune_history().
+    """
+    __tablename__ = 'ranking_history'
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)  # 同期した日（世代）
+    category = db.Column(db.String(50), nullable=False)
+    sakenowa_id = db.Column(db.String(10), nullable=False)
+    rank = db.Column(db.SmallInteger, nullable=False)
+    rank_delta = db.Column(db.SmallInteger)
+    score = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 銘柄ごとの推移
+        db.Index('idx_ranking_history_brand', 'sakenowa_id', 'category', 'period'),
+        # カテゴリ（全国・都道府県）ごとの推移
+        db.Index('idx_ranking_history_category', 'category', 'period', 'rank'),
+        db.Index('idx_ranking_history_period', 'period'),
+    )
+
+    def __repr__(self):
+        return f'<RankingHistory {self.period} {self.category} {self.sakenowa_id} #{self.rank}>'
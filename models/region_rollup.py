@@ -0,0 +1,35 @@
+from datetime import datetime
+from . import db
+
+class RegionRollup(db.Model):
+    """Per-prefecture aggregates for the region page
+
+    Rebuilt together with brewery_rollups; the brewery list is embedded so
+    the page is a single primary-key read.
+    """
+    __tablename__ = 'region_rollups'
+    region_id = db.Column(db.String(10), primary_key=True)  # regions.sakenowa_id
+    name = db.Column(db.String(100), nullable=False)
+
+    sake_count = db.Column(db.Integer, nullable=False, default=0)
+    brewery_count = db.Column(db.Integer, nullable=False, default=0)
+    charted_count = db.Column(db.Integer, nullable=False, default=0)
+    f1 = db.Column(db.Float)
+    f2 = db.Column(db.Float)
+    f3 = db.Column(db.Float)
+    f4 = db.Column(db.Float)
+    f5 = db.Column(db.Float)
+    f6 = db.Column(db.Float)
+    best_rank = db.Column(db.Integer)
+    best_rank_sake_id = db.Column(db.Integer)
+
+    top_tags = db.Column(db.JSON, nullable=False, default=list)  # [{id, name, count}]
+    breweries = db.Column(db.JSON, nullable=False, default=list)  # [{id, name, sake_count, best_rank}]
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @property
+    def has_flavor_chart(self):
+        return self.f1 is not None
+
+    def __repr__(self):
+        return f'<RegionRollup {self.region_id} {self.name}>'
@@ -23,6 +23,7 @@ class Review(db.Model):
     __table_args__ = (
         db.Index('idx_user_sake', 'user_id', 'sake_id'),
         db.Index('idx_sake_rating', 'sake_id', 'rating'),
+        db.Index('idx_sake_created', 'sake_id', 'created_at'),
     )
 
     def get_flavor_profile(self):
@@ -0,0 +1,107 @@
+"""
+Read replica routing for db.session
+Safe (GET/HEAD) requests read from a replica bind; writes, flushes and
+requests made shortly after a write by the same client use the primary.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+PIN_SESSION_KEY = '_db_pin_until'
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica chosen for this request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # INSERT/UPDATE/DELETE文は常にプライマリへ
+        is_write = isinstance(clause, UpdateBase)
+        if (bind is None and not is_write and not self._flushing
+                and has_app_context()):
+            replica_key = g.get('db_replica_key')
+            if replica_key is not None:
+                return self._db.engines[replica_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                **kwargs)
+
+
+def use_primary():
+    """Send the rest of this request's queries to the primary"""
+    g.db_replica_key = None
+
+
+def _set_local_timeout(connection, timeout_ms):
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(
+            f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+
+
+def statement_timeout(ms):
+    """Override the statement timeout (PostgreSQL) for one view
+
+    Transactions begun from here on get it from the after_begin hook; one
+    already begun before the view (user_loader, rate limiter,
+    catalog_version()) gets it straight away.
+    """
+
+    def decorator(view):
+
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            g.statement_timeout_ms = int(ms)
+            db_session = current_app.extensions['sqlalchemy'].session()
+            if db_session.in_transaction():
+                _set_local_timeout(db_session.connection(), ms)
+            return view(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _apply_statement_timeout(session, transaction, connection):
+    """SET LOCAL only when a view asked for a non-default timeout"""
+    if not has_app_context():
+        return
+    timeout_ms = g.get('statement_timeout_ms')
+    if timeout_ms:
+        _set_local_timeout(connection, timeout_ms)
+
+
+def init_routing(app):
+    """Register the request hooks that pick a bind for each request"""
+    replica_keys = sorted(k for k in app.config.get('SQLALCHEMY_BINDS', {})
+                          if k.startswith('replica_'))
+    pin_seconds = app.config.get('DB_REPLICA_PIN_SECONDS', 10)
+
+    if not replica_keys:
+        return
+
+    @app.before_request
+    def choose_database_bind():
+        g.db_replica_key = None
+        if request.method not in SAFE_METHODS:
+            return
+        if session.get(PIN_SESSION_KEY, 0) > time.time():
+            return
+        g.db_replica_key = random.choice(replica_keys)
+
+    @app.after_request
+    def pin_after_write(response):
+        # 書き込み直後は自分の変更がレプリカに届くまでプライマリを読む
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            session[PIN_SESSION_KEY] = time.time() + pin_seconds
+        return response
+
+    logger.info("Read replica routing enabled for %d replica(s)",
+                len(replica_keys))
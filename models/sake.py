@@ -6,8 +6,8 @@ class Sake(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
     sakenowa_id = db.Column(db.String(10), unique=True, nullable=False, index=True)
-    brewery_id = db.Column(db.Integer, db.ForeignKey('breweries.id', ondelete='CASCADE'), nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    brewery_id = db.Column(db.Integer, db.ForeignKey('breweries.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Define relationships with back_populates instead of backref
@@ -41,26 +41,29 @@ class Sake(db.Model):
         }
 
     def get_flavor_description(self):
-        """Get a descriptive interpretation of the flavor profile"""
-        profile = self.get_flavor_profile()
-        if not profile:
-            return None
-
-        descriptions = []
-        for key, value in profile.items():
-            if isinstance(value, dict):
-                continue
-            if value < 0.4:
-                left = key.split('-')[0]
-                descriptions.append(f"やや{left}な")
-            elif value > 0.6:
-                right = key.split('-')[1]
-                descriptions.append(f"やや{right}な")
+        """Get a descriptive interpretation of the flavor profile
 
-        return ''.join(descriptions) if descriptions else '標準的な'
+        Stored on the flavor chart at ingest; computed only for charts
+        written before the column existed.
+        """
+        chart = self.flavor_chart
+        if not chart:
+            return None
+        if chart.description is not None:
+            return chart.description
+        from models.flavor_chart import quantize
+        return quantize(chart.values)['description']
 
     def get_flavor_tags(self):
-        """Get all flavor tags for this sake"""
+        """Get all flavor tags for this sake, by name, in one query
+
+        For a page of sakes use tag_loader.load_flavor_tags() instead
+        (mypage and brewery pages do).
+        """
         from models.brand_flavor_tag import BrandFlavorTag
-        brand_flavor_tags = BrandFlavorTag.query.filter_by(sake_id=self.id).all()
-        return sorted([tag.flavor_tag for tag in brand_flavor_tags], key=lambda x: x.name)
\ No newline at end of file
+        from models.flavor_tag import FlavorTag
+        return FlavorTag.query\
+            .join(BrandFlavorTag, FlavorTag.id == BrandFlavorTag.flavor_tag_id)\
+            .filter(BrandFlavorTag.sake_id == self.id)\
+            .order_by(FlavorTag.name)\
+            .all()
\ No newline at end of file
@@ -0,0 +1,40 @@
+from datetime import datetime
+from . import db
+
+class SyncRun(db.Model):
+    """One Sakenowa sync: timings, fetch sizes, row deltas and outcome
+
+    Written by sakenowa.update_database() on its own connection, so a run
+    shows up as 'running' while the catalog transaction is still open.
+    """
+    __tablename__ = 'sync_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running / succeeded / failed
+    error = db.Column(db.Text)
+    duration_ms = db.Column(db.Integer)
+
+    phases = db.Column(db.JSON)  # フェーズ名 -> 秒
+    fetches = db.Column(db.JSON)  # エンドポイント -> {latency_ms, bytes, attempts, checkpoint}
+    tables = db.Column(db.JSON)  # テーブル名 -> {inserted, updated, deleted, rows}
+
+    __table_args__ = (
+        db.Index('idx_sync_run_started', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'status': self.status,
+            'error': self.error,
+            'duration_ms': self.duration_ms,
+            'phases': self.phases or {},
+            'fetches': self.fetches or {},
+            'tables': self.tables or {},
+        }
+
+    def __repr__(self):
+        return f'<SyncRun {self.id} {self.status}>'
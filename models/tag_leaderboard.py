@@ -0,0 +1,16 @@
+from . import db
+
+class TagLeaderboard(db.Model):
+    """Top sakes per flavor tag, ranked by a blended score
+
+    Rebuilt by catalog.refresh_tag_leaderboards() after every sync. The
+    primary key (flavor_tag_id, rank) makes a tag's top N one range read.
+    """
+    __tablename__ = 'tag_leaderboards'
+    flavor_tag_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # flavor_tags.id
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    sake_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float)  # ランキングのスコアとレビュー評価の加重平均（どちらもなければNULL）
+
+    def __repr__(self):
+        return f'<TagLeaderboard {self.flavor_tag_id}#{self.rank} {self.sake_id}>'
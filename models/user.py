@@ -1,8 +1,29 @@
 from datetime import datetime
+from functools import lru_cache
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
 
+def _hash_password(password, method, salt_length):
+    if method:
+        return generate_password_hash(password, method=method,
+                                      salt_length=salt_length)
+    return generate_password_hash(password, salt_length=salt_length)
+
+
+@lru_cache(maxsize=8)
+def _expected_hash_shape(method, salt_length):
+    """(stored method string, salt length) Werkzeug writes for this config
+
+    'scrypt' is stored as 'scrypt:32768:8:1' and 'pbkdf2' as
+    'pbkdf2:sha256:<iterations>', so the configured string cannot be
+    compared directly. Hashing a dummy once per process gives the real form.
+    """
+    stored_method, salt, _ = _hash_password('', method, salt_length).split('$', 2)
+    return stored_method, len(salt)
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -20,11 +41,23 @@ class User(UserMixin, db.Model):
     reviews = db.relationship('Review', backref='author', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _hash_password(
+            password, current_app.config.get('PASSWORD_HASH_METHOD'),
+            current_app.config.get('PASSWORD_SALT_LENGTH', 16))
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """True when the stored hash differs from the configured method or salt length"""
+        if not self.password_hash or self.password_hash.count('$') < 2:
+            return False
+        expected = _expected_hash_shape(
+            current_app.config.get('PASSWORD_HASH_METHOD'),
+            current_app.config.get('PASSWORD_SALT_LENGTH', 16))
+        stored_method, salt, _ = self.password_hash.split('$', 2)
+        return (stored_method, len(salt)) != expected
+
     def __repr__(self):
         return f'<User {self.username}>'
 
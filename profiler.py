@@ -0,0 +1,254 @@
+"""
+Opt-in request profiling
+A WSGI middleware picks a share of requests (PROFILE_SAMPLE_RATE), or any
+request whose X-Profile-Token header matches PROFILE_TOKEN (default
+ADMIN_API_TOKEN). A sampler thread records that request thread's stack
+every PROFILE_INTERVAL_MS until the last byte of the body has been sent,
+so streamed template rendering and compression are included.
+
+Each profile is written to PROFILE_DIR as <name>.folded (collapsed
+stacks, "frame;frame;frame count" per line, readable by flamegraph.pl or
+speedscope) plus a <name>.json summary. With sampling off and no token
+configured the middleware is not installed at all.
+"""
+import glob
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app, request
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = 'sake.profile'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+# ランダム抽出の対象外（ヘッダー指定なら計測する）
+SKIP_PREFIXES = ('/health', '/static/')
+# 1プロセスで同時に計測するランダム抽出の上限
+MAX_ACTIVE = 2
+TOP_FRAMES = 5
+
+_ROOTS = sorted({os.path.dirname(os.path.abspath(__file__)) + os.sep,
+                 *(p + os.sep for p in sys.path if p and os.path.isdir(p))},
+                key=len, reverse=True)
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    for root in _ROOTS:
+        if filename.startswith(root):
+            return filename[len(root):]
+    return filename
+
+
+def _frame_label(code):
+    # collapsed形式では ; が区切りなので名前からは除く
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'\
+        .replace(';', ':')
+
+
+def collapse(frame):
+    """'outer;...;inner' for a frame and its callers"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def profile_dir(app=None):
+    app = app or current_app
+    return app.config.get('PROFILE_DIR') or os.path.join(
+        app.instance_path, 'profiles')
+
+
+def _top_frames(stacks):
+    """Functions with the most samples on top of the stack (self time)"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves.most_common(TOP_FRAMES)
+
+
+def save_profile(directory, name, stacks, meta, keep):
+    """Write <name>.folded and <name>.json, then drop all but the newest `keep`"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{name}.folded'), 'w',
+                  encoding='utf-8') as handle:
+            for stack, count in stacks.most_common():
+                handle.write(f'{stack} {count}\n')
+        meta = dict(meta, top_frames=_top_frames(stacks))
+        # 一覧は .json を見るので、最後に置き換えで書く
+        path = os.path.join(directory, f'{name}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(meta, handle, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        summaries = sorted(glob.glob(os.path.join(directory, '*.json')))
+        for old in summaries[:max(0, len(summaries) - keep)]:
+            for stale in (old, old[:-len('.json')] + '.folded'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+    except OSError as e:
+        logger.error("Failed to save profile %s: %s", name, e)
+
+
+def recent_profiles(directory):
+    """Summaries of the stored profiles, newest first"""
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json')), reverse=True):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                profiles.append(json.load(handle))
+        except (OSError, ValueError) as e:
+            # 書き込み中や刈り込み直後のファイルは飛ばす
+            logger.debug("Skipping profile %s: %s", path, e)
+    return profiles
+
+
+def slowest_by_endpoint(profiles, limit=5):
+    """[(endpoint, [slowest profiles])], the slowest endpoint first"""
+    groups = {}
+    for profile in profiles:
+        groups.setdefault(profile.get('endpoint') or '(unmatched)', []).append(profile)
+    slowest = [(endpoint, sorted(items, key=lambda p: -p['duration_ms'])[:limit])
+               for endpoint, items in groups.items()]
+    return sorted(slowest, key=lambda group: -group[1][0]['duration_ms'])
+
+
+class _RequestProfile(threading.Thread):
+    """Samples one request thread until finish() is called"""
+
+    _counter = 0
+    _counter_lock = threading.Lock()
+
+    def __init__(self, environ, reason, settings):
+        super().__init__(name='request-profiler', daemon=True)
+        with self._counter_lock:
+            _RequestProfile._counter += 1
+            sequence = _RequestProfile._counter
+        # 名前の先頭は時刻（辞書順 = 古い順）
+        self.profile_name = f'{int(time.time() * 1000):013d}-{os.getpid()}-{sequence}'
+        self.target = threading.get_ident()
+        self.settings = settings
+        self.stacks = Counter()
+        self.endpoint = None
+        self.status = None
+        query = environ.get('QUERY_STRING')
+        self.meta = {
+            'name': self.profile_name,
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO', '') + (f'?{query}' if query else ''),
+            'reason': reason,
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'interval_ms': settings['interval_ms'],
+        }
+        self._done = threading.Event()
+        self._began = self._ended = None
+
+    def run(self):
+        interval = self.settings['interval_ms'] / 1000
+        while not self._done.wait(interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+        self.meta.update(
+            endpoint=self.endpoint, status=self.status,
+            duration_ms=round((self._ended - self._began) * 1000, 1),
+            samples=sum(self.stacks.values()))
+        save_profile(self.settings['directory'], self.profile_name, self.stacks,
+                     self.meta, self.settings['keep'])
+
+    def begin(self):
+        self._began = time.perf_counter()
+        self.start()
+
+    def finish(self):
+        # 書き出しはサンプラーのスレッドで行い、リクエストを待たせない
+        self._ended = time.perf_counter()
+        self._done.set()
+
+
+class ProfilingMiddleware:
+    """Wraps app.wsgi_app; requests that are not profiled pass straight through"""
+
+    def __init__(self, wsgi_app, settings):
+        self.wsgi_app = wsgi_app
+        self.settings = settings
+        self.rate = settings['sample_rate']
+        self.token = (settings['token'] or '').encode() or None
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _reason(self, environ):
+        header = environ.get(TOKEN_HEADER)
+        if header and self.token and hmac.compare_digest(header.encode(), self.token):
+            return 'header'
+        if (self.rate and random.random() < self.rate
+                and not environ.get('PATH_INFO', '').startswith(SKIP_PREFIXES)
+                and self._active < MAX_ACTIVE):
+            return 'sampled'
+        return None
+
+    def __call__(self, environ, start_response):
+        reason = self._reason(environ)
+        if reason is None:
+            return self.wsgi_app(environ, start_response)
+
+        profile = _RequestProfile(environ, reason, self.settings)
+        environ[PROFILE_KEY] = profile
+
+        def capture(status, headers, exc_info=None):
+            profile.status = int(status.split(' ', 1)[0])
+            headers.append(('X-Profile-Id', profile.profile_name))
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            profile.finish()
+            with self._lock:
+                self._active -= 1
+
+        with self._lock:
+            self._active += 1
+        profile.begin()
+        try:
+            body = self.wsgi_app(environ, capture)
+        except BaseException:
+            finish()
+            raise
+        # 本文を送り終えて close() されるまでが計測範囲
+        return ClosingIterator(body, finish)
+
+
+def init_profiling(app):
+    """Install the middleware when sampling or the profiling header is enabled"""
+    settings = {
+        'sample_rate': app.config.get('PROFILE_SAMPLE_RATE', 0.0),
+        'token': app.config.get('PROFILE_TOKEN') or app.config.get('ADMIN_API_TOKEN'),
+        'interval_ms': app.config.get('PROFILE_INTERVAL_MS', 10),
+        'directory': profile_dir(app),
+        'keep': app.config.get('PROFILE_KEEP', 500),
+    }
+    if not settings['sample_rate'] and not settings['token']:
+        return
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, settings)
+
+    @app.before_request
+    def record_profile_endpoint():
+        profile = request.environ.get(PROFILE_KEY)
+        if profile is not None:
+            profile.endpoint = request.endpoint
+
+    logger.info("Request profiling enabled (sample rate %s, header %s)",
+                settings['sample_rate'], 'on' if settings['token'] else 'off')
@@ -0,0 +1,157 @@
+"""
+Ranking history
+Every Sakenowa sync appends the current rankings as one generation of
+ranking_history (one per day; a second sync on the same day replaces it),
+with the rank change since the previous generation. Trend queries read
+only the (brand, category, period) and (category, period, rank) indexes.
+
+Retention: daily generations for RANKING_HISTORY_DAILY_DAYS, then the
+last generation of each week until RANKING_HISTORY_WEEKLY_DAYS, then the
+last generation of each month.
+"""
+import logging
+import os
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db
+from models.ranking import Ranking
+from models.ranking_history import RankingHistory
+from models.sake import Sake
+
+logger = logging.getLogger(__name__)
+
+DAILY_DAYS = int(os.environ.get('RANKING_HISTORY_DAILY_DAYS', 90))
+WEEKLY_DAYS = int(os.environ.get('RANKING_HISTORY_WEEKLY_DAYS', 730))
+INSERT_BATCH_SIZE = 2000
+
+
+def _previous_ranks(period):
+    """(category, sakenowa_id) -> rank in the newest generation before period"""
+    previous = db.session.execute(
+        select(func.max(RankingHistory.period))
+        .where(RankingHistory.period < period)).scalar()
+    if previous is None:
+        return {}
+    rows = db.session.execute(
+        select(RankingHistory.category, RankingHistory.sakenowa_id,
+               RankingHistory.rank)
+        .where(RankingHistory.period == previous))
+    return {(category, brand): rank for category, brand, rank in rows}
+
+
+def record_generation(period=None):
+    """Append the current rankings as the generation for period (today)
+
+    Runs in the caller's transaction. Returns the number of rows written.
+    """
+    period = period or date.today()
+    previous = _previous_ranks(period)
+    db.session.execute(
+        delete(RankingHistory).where(RankingHistory.period == period))
+
+    rows = db.session.execute(
+        select(Ranking.category, Sake.sakenowa_id, Ranking.rank, Ranking.score)
+        .join(Sake, Ranking.sake_id == Sake.id))
+    batch, count = [], 0
+    for category, brand, rank, score in rows:
+        previous_rank = previous.get((category, brand))
+        batch.append(dict(
+            period=period, category=category, sakenowa_id=brand, rank=rank,
+            score=score,
+            rank_delta=None if previous_rank is None else previous_rank - rank))
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(insert(RankingHistory), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(RankingHistory), batch)
+        count += len(batch)
+    logger.info("Recorded %s ranking history rows for %s", count, period)
+    return count
+
+
+def _periods_to_drop(periods, today, daily_days, weekly_days):
+    """Generations outside the daily window that are not the last of their bucket"""
+    daily_cutoff = today - timedelta(days=daily_days)
+    weekly_cutoff = today - timedelta(days=weekly_days)
+    keep = {}
+    for period in periods:
+        if period >= daily_cutoff:
+            continue
+        if period >= weekly_cutoff:
+            bucket = ('week',) + tuple(period.isocalendar())[:2]
+        else:
+            bucket = ('month', period.year, period.month)
+        if bucket not in keep or period > keep[bucket]:
+            keep[bucket] = period
+    kept = set(keep.values())
+    return [p for p in periods if p < daily_cutoff and p not in kept]
+
+
+def prune_history(today=None, daily_days=DAILY_DAYS, weekly_days=WEEKLY_DAYS):
+    """Thin old generations to weekly, then monthly. Returns rows deleted."""
+    today = today or date.today()
+    periods = db.session.execute(
+        select(RankingHistory.period).distinct()
+        .where(RankingHistory.period < today - timedelta(days=daily_days))
+    ).scalars().all()
+    drop = _periods_to_drop(periods, today, daily_days, weekly_days)
+    if not drop:
+        return 0
+    result = db.session.execute(
+        delete(RankingHistory).where(RankingHistory.period.in_(drop)))
+    logger.info("Pruned %s ranking history rows from %d generations",
+                result.rowcount, len(drop))
+    return result.rowcount
+
+
+def sake_trend(sakenowa_id, category='overall', days=365):
+    """[(period, rank, score, rank_delta)] oldest first"""
+    since = date.today() - timedelta(days=days)
+    return db.session.execute(
+        select(RankingHistory.period, RankingHistory.rank,
+               RankingHistory.score, RankingHistory.rank_delta)
+        .where(RankingHistory.sakenowa_id == sakenowa_id,
+               RankingHistory.category == category,
+               RankingHistory.period >= since)
+        .order_by(RankingHistory.period)).all()
+
+
+def category_trend(category, days=90, top=10):
+    """[(period, sakenowa_id, rank, rank_delta)] for the top ranks per generation"""
+    since = date.today() - timedelta(days=days)
+    return db.session.execute(
+        select(RankingHistory.period, RankingHistory.sakenowa_id,
+               RankingHistory.rank, RankingHistory.rank_delta)
+        .where(RankingHistory.category == category,
+               RankingHistory.period >= since,
+               RankingHistory.rank <= top)
+        .order_by(RankingHistory.period, RankingHistory.rank)).all()
+
+
+def _latest(sakenowa_id, category, on_or_before=None):
+    stmt = select(RankingHistory.period, RankingHistory.rank)\
+        .where(RankingHistory.sakenowa_id == sakenowa_id,
+               RankingHistory.category == category)
+    if on_or_before is not None:
+        stmt = stmt.where(RankingHistory.period <= on_or_before)
+    return db.session.execute(
+        stmt.order_by(RankingHistory.period.desc()).limit(1)).first()
+
+
+def rank_change(sakenowa_id, category='overall', days=30):
+    """Places gained (positive) or lost over the last `days`, or None
+
+    Compares the newest generation with the newest one at least `days`
+    older; None when the brand is not ranked in both.
+    """
+    latest = _latest(sakenowa_id, category)
+    if latest is None:
+        return None
+    older = _latest(sakenowa_id, category,
+                    on_or_before=latest.period - timedelta(days=days))
+    if older is None:
+        return None
+    return older.rank - latest.rank
@@ -0,0 +1,366 @@
+"""
+Bulk review import from other tasting apps
+An uploaded CSV, JSON array or NDJSON file is parsed as a stream of rows
+(never loaded whole), brand names are resolved through an in-memory index
+of normalized sake names, and reviews are inserted in batches, each batch
+in its own transaction. Rows that cannot be imported are reported with
+their line number instead of failing the whole file.
+"""
+import csv
+import io
+import json
+import logging
+import re
+import unicodedata
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from cache import TTLCache
+from catalog import catalog_version
+from models import db
+from models.brewery import Brewery
+from models.review import Review
+from models.sake import Sake
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_CHARS = 64 * 1024
+# エラー行はこの件数まで詳細を返す（件数自体はすべて数える）
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'json', 'ndjson')
+FLAVOR_KEYS = ('f1', 'f2', 'f3', 'f4', 'f5', 'f6')
+
+# 見出しの別名 -> 項目（正規化した見出しで引く）
+FIELD_ALIASES = {
+    'name': ('name', 'sake', 'sake_name', 'brand', 'brand_name', '銘柄',
+             '銘柄名', '日本酒', 'お酒'),
+    'brewery': ('brewery', 'brewery_name', 'maker', '蔵元', '酒蔵', '蔵'),
+    'rating': ('rating', 'score', 'stars', '評価', '点数', 'スコア'),
+    'comment': ('comment', 'comments', 'memo', 'note', 'notes', 'review',
+                'コメント', 'メモ', '感想'),
+    'date': ('date', 'recorded_at', 'drank_at', 'tasted_at', 'created_at',
+             '日付', '飲んだ日'),
+}
+FIELD_ALIASES.update({key: (key,) for key in FLAVOR_KEYS})
+_ALIAS_FIELDS = {alias: field for field, aliases in FIELD_ALIASES.items()
+                 for alias in aliases}
+
+# 比較のときに無視する記号（括弧・中黒・空白など）
+_IGNORED = re.compile(r'[\s・･\-‐－_「」『』()（）\[\]【】"\'`.,、。]+')
+
+_index_cache = TTLCache('sake_name_index', ttl=600, maxsize=2)
+
+
+class ReviewImportError(ValueError):
+    """The file as a whole cannot be imported"""
+
+
+class RowError(ValueError):
+    """One row cannot be imported"""
+
+
+def normalize_name(value):
+    """Full/half width, case and punctuation insensitive key for a name"""
+    value = unicodedata.normalize('NFKC', value or '').lower()
+    return _IGNORED.sub('', value)
+
+
+def _normalize_header(value):
+    return unicodedata.normalize('NFKC', value or '').strip().lower()\
+        .replace(' ', '_')
+
+
+class SakeNameIndex:
+    """normalized sake name -> [(sake_id, normalized brewery name)]"""
+
+    def __init__(self, rows):
+        self._by_name = {}
+        for sake_id, name, brewery_name in rows:
+            self._by_name.setdefault(normalize_name(name), []).append(
+                (sake_id, normalize_name(brewery_name)))
+
+    @classmethod
+    def current(cls):
+        """The index for the current catalog version (built once per sync)
+
+        The version is read from the database, not the 30 s cache: a full
+        re-sync replaces the sake ids, so an index built before it would
+        attach reviews to ids that no longer exist.
+        """
+        version = catalog_version(cached=False)
+        index = _index_cache.get(version)
+        if index is None:
+            index = cls(db.session.execute(
+                select(Sake.id, Sake.name, Brewery.name)
+                .join(Brewery, Sake.brewery_id == Brewery.id)))
+            _index_cache.set(version, index)
+        return index
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def resolve(self, name, brewery=None):
+        candidates = self._by_name.get(normalize_name(name))
+        if not candidates:
+            raise RowError(f'銘柄が見つかりません: {name}')
+        if len(candidates) > 1 and brewery:
+            key = normalize_name(brewery)
+            candidates = [c for c in candidates
+                          if key and (key in c[1] or c[1] in key)] or candidates
+        if len(candidates) > 1:
+            raise RowError(f'同名の銘柄が{len(candidates)}件あります'
+                           f'（蔵元を指定してください）: {name}')
+        return candidates[0][0]
+
+
+def detect_format(filename):
+    """csv/json/ndjson from the file extension, or None"""
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'json': 'json', 'ndjson': 'ndjson',
+            'jsonl': 'ndjson'}.get(extension)
+
+
+def _csv_rows(text):
+    reader = csv.DictReader(text)
+    for record in reader:
+        # 見出し行が1行目なので、データ行は reader.line_num がそのまま行番号
+        yield reader.line_num, record
+
+
+def _ndjson_rows(text):
+    for line_no, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, RowError(f'JSONとして読めません: {e}')
+            continue
+        yield line_no, record
+
+
+def _json_array_rows(text, chunk_chars=READ_CHUNK_CHARS):
+    """Objects of a top-level JSON array, decoded one at a time"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = text.read(chunk_chars)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+        return not eof
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return None
+
+    if next_char() != '[':
+        raise ReviewImportError('JSONファイルはレビューの配列である必要があります')
+    pos += 1
+    item = 0
+    while True:
+        char = next_char()
+        if char == ']':
+            return
+        if char is None:
+            raise ReviewImportError('JSON配列が途中で終わっています')
+        item += 1
+        if char != '{':
+            raise ReviewImportError(f'{item}件目がオブジェクトではありません')
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                break
+            except ValueError:
+                # オブジェクトがバッファ境界をまたいでいる
+                if not fill():
+                    raise ReviewImportError(f'{item}件目のJSONが不正です')
+        pos = end
+        yield item, record
+        char = next_char()
+        if char == ',':
+            pos += 1
+        elif char != ']':
+            raise ReviewImportError(f'{item}件目の後に区切りがありません')
+
+
+PARSERS = {'csv': _csv_rows, 'json': _json_array_rows, 'ndjson': _ndjson_rows}
+
+
+_DATE = re.compile(r'(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})')
+
+
+def _parse_date(value):
+    """2024/1/5, 2024.01.05, 2024-01-05T20:00:00 -> date (the day part)"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    match = _DATE.match(value)
+    try:
+        return date(*map(int, match.groups()))
+    except (AttributeError, ValueError):
+        raise RowError(f'日付が読めません: {value}')
+
+
+def _parse_float(value, label):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{label}が数値ではありません: {value}')
+
+
+class ImportResult:
+    """Counters and per-row errors of one import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.skipped = 0  # 取り込み前からDBにあったのと同じレビュー
+        self.error_count = 0
+        self.errors = []  # [(行番号, メッセージ)]
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {'rows': self.rows, 'imported': self.imported,
+                'skipped': self.skipped, 'error_count': self.error_count,
+                'errors': [{'line': line, 'message': message}
+                           for line, message in self.errors]}
+
+
+class ReviewImport:
+    """Import one user's reviews from a CSV/JSON/NDJSON byte stream
+
+    rating_scale is the maximum rating in the source app; ratings are
+    rescaled to this app's 5-point scale.
+    """
+
+    def __init__(self, user_id, fmt, encoding='utf-8-sig', rating_scale=5,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        if fmt not in FORMATS:
+            raise ReviewImportError(f"Unknown format '{fmt}'")
+        if rating_scale <= 0:
+            raise ReviewImportError('rating_scale must be positive')
+        self.user_id = user_id
+        self.fmt = fmt
+        self.encoding = encoding
+        self.rating_scale = rating_scale
+        self.batch_size = batch_size
+        self.result = ImportResult()
+        self._headers = {}
+
+    def _fields(self, record):
+        fields = {}
+        for key, value in record.items():
+            # 見出しの正規化は列ごとに1回だけ
+            field = self._headers.get(key)
+            if field is None and key not in self._headers:
+                field = self._headers[key] = _ALIAS_FIELDS.get(
+                    _normalize_header(str(key)))
+            if field and field not in fields:
+                fields[field] = value.strip() if isinstance(value, str) else value
+        return fields
+
+    def _review(self, record, index, now):
+        if not isinstance(record, dict):
+            raise RowError('レビューの形式ではありません')
+        fields = self._fields(record)
+        name = fields.get('name')
+        if not name:
+            raise RowError('銘柄名がありません')
+        rating = _parse_float(fields.get('rating'), '評価')
+        if rating is None:
+            raise RowError('評価がありません')
+        if not 0 < rating <= self.rating_scale:
+            raise RowError(f'評価は0より大きく{self.rating_scale}以下にしてください: {rating:g}')
+        row = dict(
+            user_id=self.user_id,
+            sake_id=index.resolve(str(name), fields.get('brewery')),
+            rating=round(rating * 5 / self.rating_scale, 2),
+            comment=fields.get('comment') or None,
+            recorded_at=_parse_date(str(fields.get('date') or '')),
+            created_at=now, updated_at=now)
+        for key in FLAVOR_KEYS:
+            value = _parse_float(fields.get(key), key)
+            if value is not None and not 0 <= value <= 1:
+                raise RowError(f'{key}は0〜1で指定してください: {value:g}')
+            row[key] = value
+        return row
+
+    def _existing_keys(self):
+        # 同じファイルを2回取り込んでも重複しないよう、既存分を1回で読む
+        return set(db.session.execute(
+            select(Review.sake_id, Review.recorded_at, Review.rating)
+            .where(Review.user_id == self.user_id)).all())
+
+    def _flush(self, batch):
+        try:
+            db.session.execute(insert(Review), batch)
+            db.session.commit()
+        except Exception as e:
+            logger.error("Failed to insert review batch for user %s: %s",
+                         self.user_id, e, exc_info=True)
+            db.session.rollback()
+            raise
+        self.result.imported += len(batch)
+
+    def run(self, stream, progress=None):
+        """Import from a binary stream; progress(result) after each batch"""
+        index = SakeNameIndex.current()
+        existing = self._existing_keys()
+        now = datetime.utcnow()
+        result = self.result
+        text = io.TextIOWrapper(stream, encoding=self.encoding, newline='')
+        batch = []
+        try:
+            for line, record in PARSERS[self.fmt](text):
+                result.rows += 1
+                try:
+                    if isinstance(record, RowError):
+                        raise record
+                    row = self._review(record, index, now)
+                except RowError as e:
+                    result.add_error(line, str(e))
+                    continue
+                # 取り込み済みの行とだけ比べる。同じファイル内の同じキーは
+                # 別々のレビュー（日付なしで同じ評価など）なのでどちらも入れる
+                if (row['sake_id'], row['recorded_at'], row['rating']) in existing:
+                    result.skipped += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+                    if progress:
+                        progress(result)
+            if batch:
+                self._flush(batch)
+        except UnicodeDecodeError:
+            raise ReviewImportError(
+                f'文字コード {self.encoding} として読めません（{result.rows}行目付近）')
+        except csv.Error as e:
+            raise ReviewImportError(f'CSVが不正です（{result.rows}行目付近）: {e}')
+        finally:
+            # 呼び出し元のストリームは閉じない
+            text.detach()
+        if progress:
+            progress(result)
+        logger.info("Imported %s reviews for user %s (%s rows, %s skipped, %s errors)",
+                    result.imported, self.user_id, result.rows, result.skipped,
+                    result.error_count)
+        return result
@@ -1,28 +1,42 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort, current_app, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db
+from models.routing import statement_timeout
 from models.user import User
 from models.sake import Sake
 from models.review import Review
 from models.brewery import Brewery
 from models.region import Region
-from models.flavor_chart import FlavorChart
-from models.ranking import Ranking  # 追加: Rankingモデルのimport
+from models.catalog_listing import CatalogListing
+from models.brewery_rollup import BreweryRollup
+from models.region_rollup import RegionRollup
+from models.tag_leaderboard import TagLeaderboard
+from models.flavor_chart import HIGH, LOW, codes_matching, flavor_level
 import logging
 from datetime import datetime
-from forms import SignupForm
+from forms import ReviewImportForm, SignupForm
 from sqlalchemy.orm import joinedload
+from logging_config import sampled
+from streaming import stream_page
+from throttling import single_flight
+from tag_loader import CARD_TAG_LIMIT, card_tags, flavor_tag_names, load_flavor_tags
+from auth import admin_required
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()])
+# Logging is configured once in logging_config (queue-based, non-blocking)
 logger = logging.getLogger(__name__)
 
 # Create blueprint
 bp = Blueprint('main', __name__)
 
+# 検索結果をDBから取り出す単位（ストリーミング描画用）
+RESULT_BATCH_SIZE = 100
+# タグ別ランキングページの表示件数
+TAG_PAGE_SIZE = 20
+# 強さが未指定の検索で、味わいファセットのリンクに使う強さ（1-10）
+FACET_DEFAULT_INTENSITY = '5'
+# プロファイル一覧でエンドポイントごとに表示する件数
+PROFILES_PER_ENDPOINT = 5
+
 
 @bp.route('/signup', methods=['GET', 'POST'])
 def signup():
@@ -43,7 +57,7 @@ def signup():
             return redirect(url_for('main.index'))
 
         except Exception as e:
-            logger.error(f"Error in signup: {str(e)}")
+            logger.error("Error in signup: %s", e)
             db.session.rollback()
             flash('アカウントの登録中にエラーが発生しました。', 'error')
 
@@ -63,13 +77,22 @@ def login():
 
             user = User.query.filter_by(username=username).first()
             if user and user.check_password(password):
+                if user.password_needs_rehash():
+                    # ハッシュ設定が変わっていれば、平文が手元にある今のうちに再ハッシュ
+                    try:
+                        user.set_password(password)
+                        db.session.commit()
+                    except Exception as e:
+                        logger.error("Password rehash failed for user %s: %s",
+                                     user.id, e)
+                        db.session.rollback()
                 login_user(user)
                 flash('ログインに成功しました。', 'success')
                 return redirect(url_for('main.index'))
 
             flash('ユーザー名またはパスワードが正しくありません。', 'error')
         except Exception as e:
-            logger.error(f"Login error: {str(e)}")
+            logger.error("Login error: %s", e)
             flash('ログイン処理中にエラーが発生しました。', 'error')
 
     return render_template('login.html')
@@ -82,7 +105,7 @@ def logout():
         logout_user()
         flash('ログアウトしました。', 'success')
     except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
+        logger.error("Logout error: %s", e)
         flash('ログアウト処理中にエラーが発生しました。', 'error')
     return redirect(url_for('main.index'))
 
@@ -90,25 +113,17 @@ def logout():
 @bp.route('/')
 def index():
     try:
-        # Get top 10 overall rankings with optimized query
-        top_rankings = db.session.query(Ranking, Sake)\
-            .join(Sake)\
-            .options(
-                joinedload(Sake.brewery).joinedload(Brewery.region)
-            )\
-            .filter(Ranking.category == 'overall')\
-            .order_by(Ranking.rank)\
-            .limit(10)\
-            .all()
-
-        # Get latest sakes with eager loading
-        search_results = db.session.query(Sake)\
-            .options(
-                joinedload(Sake.brewery).joinedload(Brewery.region)
-            )\
-            .order_by(Sake.created_at.desc())\
-            .limit(20)\
-            .all()
+        # カードはすべて catalog_listings の1テーブルから読む
+        # (.all()せずに渡し、ストリーミング描画中に実行させる)
+        top_rankings = CatalogListing.query\
+            .filter(CatalogListing.overall_rank.isnot(None))\
+            .order_by(CatalogListing.overall_rank)\
+            .limit(10)
+
+        # Get latest sakes
+        search_results = CatalogListing.query\
+            .order_by(CatalogListing.created_at.desc())\
+            .limit(20)
 
         # フレーバータグの一覧を取得（検索フォーム用）
         from models.flavor_tag import FlavorTag
@@ -148,13 +163,17 @@ def index():
             },
         }
 
-        return render_template('index.html',
-                               search_results=search_results,
-                               top_rankings=top_rankings,
-                               flavor_tags=flavor_tags,
-                               flavor_profiles=flavor_profiles)
+        # カードのタグ名表を先に読んでおく（ストリーミング描画中にクエリを出さない）
+        flavor_tag_names()
+
+        return stream_page(
+            'index.html',
+            search_results=search_results,
+            top_rankings=top_rankings,
+            flavor_tags=flavor_tags,
+            flavor_profiles=flavor_profiles)
     except Exception as e:
-        logger.error(f"Error in index route: {str(e)}")
+        logger.error("Error in index route: %s", e)
         flash('エラーが発生しました。しばらくしてから再度お試しください。', 'error')
         return render_template('index.html',
                                search_results=[],
@@ -163,132 +182,234 @@ def index():
                                flavor_profiles={})
 
 
+def _search_url(params, **overrides):
+    """URL of the search page with some parameters replaced (empty ones dropped)"""
+    merged = dict(params, **overrides)
+    return url_for('main.search', **{k: v for k, v in merged.items() if v})
+
+
+def _selected_region(facets, region_id):
+    """{'id', 'name'} of the region filter (the name comes from the facets)"""
+    if not region_id:
+        return None
+    for region in (facets or {}).get('regions', []):
+        if region['id'] == region_id:
+            return {'id': region_id, 'name': region['name']}
+    return {'id': region_id, 'name': region_id}
+
+
+def _facet_links(facets, params, intensity, flavor_mapping, flavor_profiles):
+    """Facet counts with the search URL each one leads to
+
+    The flavor facets must have been counted with intensity / 10 as the
+    threshold, the same one their links filter by.
+    """
+    if not facets:
+        return None
+    directions = [d for d in params['flavor_direction'].split(',') if d]
+    chosen_axes = {flavor_mapping[d]['field'] for d in directions
+                   if d in flavor_mapping}
+    flavors = []
+    for axis, profile in sorted(flavor_profiles.items()):
+        field = f'f{axis}'
+        if field in chosen_axes:
+            continue
+        counts = facets['flavors'][field]
+        sides = []
+        for side in ('high', 'low'):
+            direction = next(d for d, info in flavor_mapping.items()
+                             if info['field'] == field and info['direction'] == side)
+            sides.append({'label': profile[side], 'count': counts[side],
+                          'url': _search_url(
+                              params,
+                              flavor_direction=','.join(directions + [direction]),
+                              flavor_intensity=intensity)})
+        flavors.append({'name': profile['name'], 'sides': sides})
+    return {
+        'total': facets['total'],
+        # タグは1つしか指定できない（リンクは選択中のタグを置き換えるので件数が合わない）
+        'tags': [dict(tag, url=_search_url(params, flavor_tag=tag['id']))
+                 for tag in facets['tags']]
+        if not params['flavor_tag'] else [],
+        'regions': [dict(region, url=_search_url(params, region=region['id']))
+                    for region in facets['regions']]
+        if not params['region'] else [],
+        'flavors': flavors,
+    }
+
+
 @bp.route('/search')
+@statement_timeout(5000)  # 部分一致検索が長引いてもプールを塞がない
 def search():
     try:
         query = request.args.get('q', '').strip()
         flavor_tag_id = request.args.get('flavor_tag', '').strip()
+        region_id = request.args.get('region', '').strip()
 
         # 新しい味わいプロファイル検索パラメータを取得
         flavor_profile = request.args.get('flavor_profile', '')
         flavor_direction = request.args.get('flavor_direction', '')
         flavor_intensity = request.args.get('flavor_intensity', '')
+        # 味わいファセットはリンク先と同じしきい値で数える（件数と結果を一致させる）
+        facet_intensity = (flavor_intensity if flavor_intensity.isdigit()
+                           else FACET_DEFAULT_INTENSITY)
+        facet_threshold = float(facet_intensity) / 10
 
         logger.info(
-            f"Search query: {query}, Flavor tag: {flavor_tag_id}, Profile: {flavor_profile}, Direction: {flavor_direction}, Intensity: {flavor_intensity}"
-        )
+            "Search query: %s, Flavor tag: %s, Profile: %s, Direction: %s, Intensity: %s",
+            query, flavor_tag_id, flavor_profile, flavor_direction,
+            flavor_intensity, extra=sampled())
 
         # フレーバータグの一覧を取得（検索フォーム用）
         from models.flavor_tag import FlavorTag
+        from facets import search_facets
         flavor_tags = FlavorTag.query.order_by(FlavorTag.name).all()
 
-        # 基本クエリを構築
-        sake_query = db.session.query(Sake)\
-            .options(
-                joinedload(Sake.brewery).joinedload(Brewery.region),
-                joinedload(Sake.flavor_chart)
-            )
+        # 基本クエリを構築（一覧用の非正規化テーブル）
+        sake_query = CatalogListing.query
 
         # 銘柄名での検索
         if query:
-            sake_query = sake_query.filter(Sake.name.ilike(f'%{query}%'))
+            sake_query = sake_query.filter(
+                CatalogListing.name.ilike(f'%{query}%'))
+
+        # 都道府県での絞り込み
+        if region_id:
+            sake_query = sake_query.filter(CatalogListing.region_id == region_id)
 
         # フレーバータグでの検索
+        tag_filtered = False
         if flavor_tag_id:
             from models.brand_flavor_tag import BrandFlavorTag
             try:
                 flavor_tag = FlavorTag.query.filter_by(
                     sakenowa_id=flavor_tag_id).first()
                 if flavor_tag:
-                    logger.info(f"Filtering by flavor tag: {flavor_tag.name}")
+                    logger.debug("Filtering by flavor tag: %s", flavor_tag.name)
                     sake_query = sake_query.join(
                         BrandFlavorTag,
-                        Sake.id == BrandFlavorTag.sake_id).filter(
+                        CatalogListing.sake_id == BrandFlavorTag.sake_id).filter(
                             BrandFlavorTag.flavor_tag_id == flavor_tag.id)
+                    tag_filtered = True
             except Exception as e:
-                logger.error(f"Error filtering by flavor tag: {str(e)}")
+                logger.error("Error filtering by flavor tag: %s", e)
+
+        # 方向によってフィールドを決定
+        flavor_mapping = {
+            'elegant': {
+                'field': 'f1',
+                'direction': 'high'
+            },  # 華やか
+            'heavy': {
+                'field': 'f1',
+                'direction': 'low'
+            },  # 重厚
+            'rich': {
+                'field': 'f2',
+                'direction': 'high'
+            },  # 芳醇
+            'mild': {
+                'field': 'f2',
+                'direction': 'low'
+            },  # 穏やか
+            'full': {
+                'field': 'f3',
+                'direction': 'high'
+            },  # 濃醇
+            'light': {
+                'field': 'f3',
+                'direction': 'low'
+            },  # 淡麗
+            'sweet': {
+                'field': 'f4',
+                'direction': 'low'
+            },  # 甘口
+            'dry': {
+                'field': 'f4',
+                'direction': 'high'
+            },  # 辛口
+            'individual': {
+                'field': 'f5',
+                'direction': 'high'
+            },  # 個性
+            'typical': {
+                'field': 'f5',
+                'direction': 'low'
+            },  # 特性
+            'aged': {
+                'field': 'f6',
+                'direction': 'high'
+            },  # 熟成
+            'fresh': {
+                'field': 'f6',
+                'direction': 'low'
+            }  # 若年
+        }
 
         # 味わいプロファイルでの絞り込み（指定がある場合）
         if flavor_direction and flavor_intensity:
-            from models.flavor_chart import FlavorChart
-
-            # 方向によってフィールドを決定
-            flavor_mapping = {
-                'elegant': {
-                    'field': 'f1',
-                    'direction': 'high'
-                },  # 華やか
-                'heavy': {
-                    'field': 'f1',
-                    'direction': 'low'
-                },  # 重厚
-                'rich': {
-                    'field': 'f2',
-                    'direction': 'high'
-                },  # 芳醇
-                'mild': {
-                    'field': 'f2',
-                    'direction': 'low'
-                },  # 穏やか
-                'full': {
-                    'field': 'f3',
-                    'direction': 'high'
-                },  # 濃醇
-                'light': {
-                    'field': 'f3',
-                    'direction': 'low'
-                },  # 淡麗
-                'sweet': {
-                    'field': 'f4',
-                    'direction': 'low'
-                },  # 甘口
-                'dry': {
-                    'field': 'f4',
-                    'direction': 'high'
-                },  # 辛口
-                'individual': {
-                    'field': 'f5',
-                    'direction': 'high'
-                },  # 個性
-                'typical': {
-                    'field': 'f5',
-                    'direction': 'low'
-                },  # 特性
-                'aged': {
-                    'field': 'f6',
-                    'direction': 'high'
-                },  # 熟成
-                'fresh': {
-                    'field': 'f6',
-                    'direction': 'low'
-                }  # 若年
-            }
-
-            profile_info = flavor_mapping.get(flavor_direction, {})
-            if profile_info:
+            # 複数指定（例: fresh,dry）は各軸の条件をすべて満たす銘柄に絞り込む
+            levels, thresholds = {}, []
+            for direction in flavor_direction.split(','):
+                profile_info = flavor_mapping.get(direction.strip())
+                if not profile_info:
+                    continue
                 flavor_field = profile_info['field']
                 is_high_direction = profile_info['direction'] == 'high'
                 threshold = float(flavor_intensity) / 10  # 1-10のスケールを0-1に変換
-
-                logger.info(
-                    f"Filtering by flavor direction: {flavor_direction}, field: {flavor_field}, high_direction: {is_high_direction}, threshold: {threshold}"
-                )
-
-                # FlavorChartとJOIN
-                sake_query = sake_query.join(FlavorChart,
-                                             Sake.id == FlavorChart.sake_id)
-
-                # 方向に基づいてフィルタリング
+                column = getattr(CatalogListing, flavor_field)
+                # 生の値での比較は常に行う。段階コードはそれを満たしうる段階に絞るだけ
                 if is_high_direction:
-                    # 高い値
-                    sake_query = sake_query.filter(
-                        getattr(FlavorChart, flavor_field) >= threshold)
+                    thresholds.append(column >= threshold)
+                    possible = frozenset(range(flavor_level(threshold), HIGH + 1))
                 else:
-                    # 低い値
+                    thresholds.append(column <= threshold)
+                    possible = frozenset(range(LOW, flavor_level(threshold) + 1))
+                axis = int(flavor_field[1])
+                levels[axis] = levels.get(axis, possible) & possible
+
+            if thresholds:
+                # 3段階すべてを許す軸は絞り込みにならない
+                narrowed = tuple(sorted((axis, tuple(sorted(allowed)))
+                                        for axis, allowed in levels.items()
+                                        if len(allowed) < 3))
+                logger.debug("Filtering by flavor levels %s, thresholds %d",
+                             narrowed, len(thresholds))
+                if narrowed:
+                    # 段階コードの一致でインデックスから引き、生の値の比較は残りの行の確認だけ
+                    # （チャートのある銘柄はすべてコードを持つ。0010で埋め戻し済み）
                     sake_query = sake_query.filter(
-                        getattr(FlavorChart, flavor_field) <= threshold)
-
-        search_results = sake_query.order_by(Sake.created_at.desc()).all()
+                        CatalogListing.flavor_code.in_(codes_matching(narrowed)))
+                sake_query = sake_query.filter(*thresholds)
+
+        if tag_filtered:
+            # タグ検索はSNSで拡散されて同じURLに集中しやすい。結果はタグの付いた
+            # 銘柄数で頭打ちなので確定させ、同時に来た同一検索で1回の実行を共有する
+            flight_key = ('search', query, flavor_tag_id, region_id,
+                          flavor_direction, flavor_intensity)
+            search_results = single_flight.do(
+                flight_key,
+                lambda: sake_query.with_entities(
+                    *CatalogListing.card_columns()).order_by(
+                        CatalogListing.created_at.desc()).all())
+            result_count = len(search_results)
+            facets = search_facets([row.sake_id for row in search_results],
+                                   threshold=facet_threshold)
+        elif query or region_id or (flavor_direction and flavor_intensity):
+            # 件数の代わりにIDを読み、同じ結果集合でファセットを数える
+            # 結果はyield_perでストリーミングしながら描画する
+            result_ids = sake_query.order_by(None).with_entities(
+                CatalogListing.sake_id).all()
+            result_count = len(result_ids)
+            facets = search_facets((sake_id for (sake_id,) in result_ids),
+                                   threshold=facet_threshold)
+            search_results = sake_query.order_by(CatalogListing.created_at.desc())\
+                .yield_per(RESULT_BATCH_SIZE)
+        else:
+            result_count = sake_query.order_by(None).count()
+            facets = search_facets(threshold=facet_threshold)
+            search_results = sake_query.order_by(CatalogListing.created_at.desc())\
+                .yield_per(RESULT_BATCH_SIZE)
 
         # フレーバープロファイルの日本語名マッピング
         flavor_profiles = {
@@ -343,8 +464,9 @@ def search():
         }
 
         if flavor_direction and flavor_intensity:
-            direction_term = flavor_direction_display.get(
-                flavor_direction, flavor_direction)
+            direction_term = '・'.join(
+                flavor_direction_display.get(d, d)
+                for d in flavor_direction.split(','))
             intensity_level = int(flavor_intensity)
             selected_flavor_profile_display = {
                 'direction': direction_term,
@@ -352,9 +474,22 @@ def search():
                 'direction_code': flavor_direction
             }
 
-        return render_template(
+        # カードのタグ名表を先に読んでおく（ストリーミング描画中にクエリを出さない）
+        flavor_tag_names()
+
+        search_params = {'q': query, 'flavor_tag': flavor_tag_id,
+                         'region': region_id,
+                         'flavor_direction': flavor_direction,
+                         'flavor_intensity': flavor_intensity}
+        facet_links = _facet_links(facets, search_params, facet_intensity,
+                                   flavor_mapping, flavor_profiles)
+
+        return stream_page(
             'search.html',
             search_results=search_results,
+            result_count=result_count,
+            facets=facet_links,
+            selected_region=_selected_region(facets, region_id),
             flavor_tags=flavor_tags,
             selected_flavor_tag=flavor_tag_id,
             query=query,
@@ -364,7 +499,7 @@ def search():
             flavor_direction=flavor_direction,
             flavor_intensity=flavor_intensity)
     except Exception as e:
-        logger.error(f"Error in search route: {str(e)}")
+        logger.error("Error in search route: %s", e)
         flash('エラーが発生しました。検索条件を変更してお試しください。', 'error')
         # フレーバープロファイルの日本語名マッピング (エラー時)
         flavor_profiles = {
@@ -402,6 +537,9 @@ def search():
 
         return render_template('search.html',
                                search_results=[],
+                               result_count=0,
+                               facets=None,
+                               selected_region=None,
                                flavor_tags=[],
                                flavor_profiles=flavor_profiles,
                                query='',
@@ -415,7 +553,8 @@ def search():
 @bp.route('/sake/<int:sake_id>')
 def sake_detail(sake_id):
     try:
-        logger.info(f"Fetching sake details for ID: {sake_id}")
+        logger.info("Fetching sake details for ID: %s", sake_id,
+                    extra=sampled())
 
         # 日本酒の基本情報とフレーバーチャートを取得（関連データを先読み）
         sake = db.session.query(Sake)\
@@ -426,33 +565,31 @@ def sake_detail(sake_id):
             .filter(Sake.id == sake_id)\
             .first_or_404()
 
-        logger.info(f"Found sake: {sake.name}")
-
-        # フレーバータグを取得（get_flavor_tags()メソッドを利用する代わりに直接クエリ）
-        from models.flavor_tag import FlavorTag
-        from models.brand_flavor_tag import BrandFlavorTag
+        logger.debug("Found sake: %s", sake.name)
 
-        flavor_tags = db.session.query(FlavorTag)\
-            .join(BrandFlavorTag, FlavorTag.id == BrandFlavorTag.flavor_tag_id)\
-            .filter(BrandFlavorTag.sake_id == sake_id)\
-            .order_by(FlavorTag.name)\
-            .all()
+        # フレーバータグを取得（1回のJOINで名前順に取得）
+        flavor_tags = sake.get_flavor_tags()
 
-        logger.info(f"Found {len(flavor_tags)} flavor tags")
+        logger.debug("Found %d flavor tags", len(flavor_tags))
 
         # レビューを取得
         reviews = Review.query.filter_by(sake_id=sake_id)\
             .order_by(Review.created_at.desc())\
             .all()
 
-        logger.info(f"Found {len(reviews)} reviews")
+        logger.debug("Found %d reviews", len(reviews))
+
+        # 総合ランキングの30日間の順位変動（履歴がなければ None）
+        from ranking_history import rank_change
+        ranking_change = rank_change(sake.sakenowa_id, 'overall', days=30)
 
         return render_template('sake_detail.html',
                                sake=sake,
                                reviews=reviews,
-                               flavor_tags=flavor_tags)
+                               flavor_tags=flavor_tags,
+                               ranking_change=ranking_change)
     except Exception as e:
-        logger.error(f"Error in sake_detail route for ID {sake_id}: {str(e)}",
+        logger.error("Error in sake_detail route for ID %s: %s", sake_id, e,
                      exc_info=True)
         flash('日本酒の詳細情報の取得中にエラーが発生しました。', 'error')
         return redirect(url_for('main.index'))
@@ -465,7 +602,7 @@ def get_regions():
         logger.debug("Fetching all regions")
         # regions = Region.query.order_by(Region.name).all()
         regions = Region.query.order_by(Region.sakenowa_id.asc()).all()
-        logger.debug(f"Found {len(regions)} regions")
+        logger.debug("Found %d regions", len(regions))
 
         # Convert to list of dictionaries
         result = [{
@@ -473,96 +610,140 @@ def get_regions():
             'name': region.name
         } for region in regions]
 
-        logger.debug(f"Returning regions data: {result}")
         return jsonify(result)
     except Exception as e:
-        logger.error(f"Error in get_regions route: {str(e)}", exc_info=True)
+        logger.error("Error in get_regions route: %s", e, exc_info=True)
         return jsonify({'error': 'エラーが発生しました'}), 500
 
 
 @bp.route('/area_rankings/<string:region_id>')
 def area_rankings(region_id):
     try:
-        logger.info(f"Fetching area rankings for region ID: {region_id}")
+        logger.info("Fetching area rankings for region ID: %s", region_id,
+                    extra=sampled())
 
         # 都道府県別ランキングを取得
-        # カテゴリは「area_地域ID」の形式
-        area_category = f'area_{region_id}'
-
-        logger.info(f"Looking for rankings with category: {area_category}")
-
-        area_rankings_query = db.session.query(
-            Ranking, Sake, Brewery,
-            Region).join(Sake, Ranking.sake_id == Sake.id).join(
-                Brewery, Sake.brewery_id == Brewery.id).join(
-                    Region, Brewery.region_id == Region.id).filter(
-                        Ranking.category == area_category).order_by(
-                            Ranking.rank).limit(10)
-
-        area_rankings_result = area_rankings_query.all()
-        logger.info(
-            f"Found {len(area_rankings_result)} area rankings for region {region_id}"
-        )
+        # catalog_listings.area_id はランキングカテゴリ「area_地域ID」の地域ID
+
+        # 同じ地域への同時リクエストはクエリ1回の結果（Rowのリスト）を共有する
+        area_rankings_result = single_flight.do(
+            ('area_rankings', region_id),
+            lambda: db.session.query(
+                CatalogListing.area_rank, CatalogListing.area_score,
+                CatalogListing.sake_id, CatalogListing.name,
+                CatalogListing.brewery_name, CatalogListing.region_name,
+                CatalogListing.tag_ids).filter(
+                    CatalogListing.area_id == region_id).order_by(
+                        CatalogListing.area_rank).limit(10).all())
+        logger.debug("Found %d area rankings for region %s",
+                     len(area_rankings_result), region_id)
 
         # レスポンス用のデータを作成
         rankings_data = []
-        for ranking, sake, brewery, region in area_rankings_result:
+        for rank, score, sake_id, sake_name, brewery_name, region_name, \
+                tag_ids in area_rankings_result:
             rankings_data.append({
-                'rank': ranking.rank,
-                'score': ranking.score,
-                'sake_id': sake.id,
-                'sake_name': sake.name,
-                'brewery_name': brewery.name,
-                'region_name': region.name
+                'rank': rank,
+                'score': score,
+                'sake_id': sake_id,
+                'sake_name': sake_name,
+                'brewery_name': brewery_name,
+                'region_name': region_name,
+                'tags': [tag.name for tag in card_tags(tag_ids)]
             })
 
         return jsonify(rankings_data)
     except Exception as e:
-        logger.error(
-            f"Error in area_rankings route for region {region_id}: {str(e)}",
-            exc_info=True)
+        logger.error("Error in area_rankings route for region %s: %s",
+                     region_id, e,
+                     exc_info=True)
         return jsonify({'error': 'エリアランキングの取得中にエラーが発生しました'}), 500
 
 
+@bp.route('/region/<string:region_id>')
+def region_page(region_id):
+    try:
+        logger.info("Fetching region page for ID: %s", region_id,
+                    extra=sampled())
+        # 集計は同期後に region_rollups に作ってあるので主キー1件の読み取りだけ
+        rollup = db.session.get(RegionRollup, region_id)
+    except Exception as e:
+        logger.error("Error in region_page route for region %s: %s",
+                     region_id, e, exc_info=True)
+        flash('地域情報の取得中にエラーが発生しました。', 'error')
+        return redirect(url_for('main.index'))
+    if rollup is None:
+        abort(404)
+    return render_template('region.html', region=rollup)
+
+
+@bp.route('/brewery/<string:brewery_id>')
+def brewery_page(brewery_id):
+    try:
+        logger.info("Fetching brewery page for ID: %s", brewery_id,
+                    extra=sampled())
+        rollup = db.session.get(BreweryRollup, brewery_id)
+        # 集計の銘柄一覧にはタグがないので、まとめて1回で引く
+        sake_tags = load_flavor_tags(
+            [sake['id'] for sake in rollup.sakes or ()],
+            limit=CARD_TAG_LIMIT) if rollup is not None else {}
+    except Exception as e:
+        logger.error("Error in brewery_page route for brewery %s: %s",
+                     brewery_id, e, exc_info=True)
+        flash('酒蔵情報の取得中にエラーが発生しました。', 'error')
+        return redirect(url_for('main.index'))
+    if rollup is None:
+        abort(404)
+    return render_template('brewery.html', brewery=rollup, sake_tags=sake_tags)
+
+
 @bp.route('/flavor_tag/<string:flavor_tag_id>')
 def flavor_tag_ranking(flavor_tag_id):
     try:
         from models.flavor_tag import FlavorTag
         from models.brand_flavor_tag import BrandFlavorTag
 
-        logger.info(f"Fetching ranking for flavor tag ID: {flavor_tag_id}")
+        logger.info("Fetching ranking for flavor tag ID: %s", flavor_tag_id,
+                    extra=sampled())
 
         # フレーバータグの情報を取得
         flavor_tag = FlavorTag.query.filter_by(
             sakenowa_id=flavor_tag_id).first_or_404()
-        logger.info(f"Found flavor tag: {flavor_tag.name}")
-
-        # このフレーバータグを持つ日本酒を取得
-        sakes_with_tag_query = db.session.query(
-            Sake, Brewery, Region, BrandFlavorTag).join(
-                BrandFlavorTag, Sake.id == BrandFlavorTag.sake_id).join(
-                    Brewery, Sake.brewery_id == Brewery.id).join(
-                        Region, Brewery.region_id == Region.id).filter(
-                            BrandFlavorTag.flavor_tag_id ==
-                            flavor_tag.id).order_by(
-                                BrandFlavorTag.created_at.desc()).limit(20)
-
-        sakes_with_tag = sakes_with_tag_query.all()
-        logger.info(
-            f"Found {len(sakes_with_tag)} sakes with flavor tag '{flavor_tag.name}'"
-        )
+        logger.debug("Found flavor tag: %s", flavor_tag.name)
+
+        # 同期後に作ったタグ別ランキングを主キー (flavor_tag_id, rank) の範囲で読む
+        sakes_with_tag = db.session.query(
+            *CatalogListing.card_columns(), TagLeaderboard.rank,
+            TagLeaderboard.score).join(
+                CatalogListing,
+                CatalogListing.sake_id == TagLeaderboard.sake_id).filter(
+                    TagLeaderboard.flavor_tag_id == flavor_tag.id).order_by(
+                        TagLeaderboard.rank).limit(TAG_PAGE_SIZE).all()
+        if not sakes_with_tag:
+            # ランキング未作成（マイグレーション直後など）は従来の新着順
+            sakes_with_tag = CatalogListing.query.join(
+                BrandFlavorTag,
+                CatalogListing.sake_id == BrandFlavorTag.sake_id).filter(
+                    BrandFlavorTag.flavor_tag_id == flavor_tag.id).order_by(
+                        BrandFlavorTag.created_at.desc()).limit(TAG_PAGE_SIZE).all()
+        logger.debug("Found %d sakes with flavor tag '%s'",
+                     len(sakes_with_tag), flavor_tag.name)
 
         # 関連するフレーバータグ（その他のタグ）を取得
         flavor_tags = FlavorTag.query.order_by(FlavorTag.name).all()
 
-        return render_template('flavor_tag_ranking.html',
-                               flavor_tag=flavor_tag,
-                               sakes_with_tag=sakes_with_tag,
-                               flavor_tags=flavor_tags)
+        # カードのタグ名表を先に読んでおく（ストリーミング描画中にクエリを出さない）
+        flavor_tag_names()
+
+        return stream_page(
+            'flavor_tag_ranking.html',
+            flavor_tag=flavor_tag,
+            sakes_with_tag=sakes_with_tag,
+            flavor_tags=flavor_tags)
     except Exception as e:
-        logger.error(
-            f"Error in flavor_tag_ranking route for tag {flavor_tag_id}: {str(e)}",
-            exc_info=True)
+        logger.error("Error in flavor_tag_ranking route for tag %s: %s",
+                     flavor_tag_id, e,
+                     exc_info=True)
         flash('フレーバータグの取得中にエラーが発生しました。', 'error')
         return redirect(url_for('main.index'))
 
@@ -571,19 +752,76 @@ def flavor_tag_ranking(flavor_tag_id):
 @login_required
 def mypage():
     try:
+        # current_userはセッション上の軽量な本人情報なので、プロフィールはここで読む
+        user = db.session.get(User, current_user.id)
+        if user is None:
+            logout_user()
+            return redirect(url_for('main.login'))
+
         # 現在ログインしているユーザーのIDを使ってレビューを取得
         # Reviewモデルにuser_idカラムがあることを前提としています
         reviews = Review.query.filter_by(user_id=current_user.id)\
                                .order_by(Review.created_at.desc())\
                                .options(joinedload(Review.sake))\
                                .all()
-        logger.info(
-            f"User {current_user.username} fetched {len(reviews)} reviews for mypage."
-        )
-        return render_template('mypage.html', reviews=reviews)
+        logger.info("User %s fetched %d reviews for mypage.",
+                    current_user.username, len(reviews), extra=sampled())
+        # レビューの銘柄にはlistingがないので、タグはページ分まとめて引く
+        review_tags = load_flavor_tags([review.sake_id for review in reviews],
+                                       limit=CARD_TAG_LIMIT)
+        return render_template('mypage.html', user=user, reviews=reviews,
+                               review_tags=review_tags)
     except Exception as e:
-        logger.error(
-            f"Error loading mypage for user {current_user.username}: {str(e)}",
-            exc_info=True)
+        logger.error("Error loading mypage for user %s: %s",
+                     current_user.username, e,
+                     exc_info=True)
         flash('マイページの表示中にエラーが発生しました。', 'error')
         return redirect(url_for('main.index'))
+
+
+@bp.route('/mypage/import', methods=['GET', 'POST'])
+@login_required
+def import_reviews():
+    from review_import import ReviewImport, ReviewImportError, detect_format
+    form = ReviewImportForm()
+    job = result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = detect_format(upload.filename)
+        try:
+            job = ReviewImport(
+                current_user.id, fmt, encoding=form.encoding.data,
+                rating_scale=form.rating_scale.data,
+                batch_size=current_app.config.get('REVIEW_IMPORT_BATCH_SIZE', 1000))
+            # アップロードはメモリに読み込まず、そのままパーサーに流す
+            result = job.run(upload.stream)
+            flash(f'{result.imported}件のレビューを取り込みました。', 'success')
+        except ReviewImportError as e:
+            flash(f'取り込めませんでした: {e}', 'error')
+        except Exception as e:
+            logger.error("Error importing reviews for user %s: %s",
+                         current_user.id, e, exc_info=True)
+            flash('レビューの取り込み中にエラーが発生しました。'
+                  '途中までのレビューは保存されています。', 'error')
+            result = job.result if job else None
+    return render_template('import_reviews.html', form=form, result=result)
+
+
+@bp.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """Slowest recent request profiles per endpoint"""
+    from profiler import profile_dir, recent_profiles, slowest_by_endpoint
+    profiles = recent_profiles(profile_dir())
+    groups = slowest_by_endpoint(profiles, limit=PROFILES_PER_ENDPOINT)
+    return render_template('admin_profiles.html', groups=groups,
+                           total=len(profiles))
+
+
+@bp.route('/admin/profiles/<string:name>.folded')
+@admin_required
+def download_profile(name):
+    # flamegraph.pl や speedscope にそのまま渡せる collapsed 形式
+    from profiler import profile_dir
+    return send_from_directory(profile_dir(), f'{name}.folded',
+                               mimetype='text/plain', as_attachment=True)
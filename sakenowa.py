@@ -1,88 +1,337 @@
 import requests
+import json
 import logging
+import os
+import random
 import sys
+import tempfile
+import time
 from datetime import datetime
+from flask import current_app, has_app_context
 from sqlalchemy import text
 from models import db
 from models.sake import Sake
 from models.region import Region
 from models.brewery import Brewery
-from models.flavor_chart import FlavorChart
+from models.flavor_chart import FlavorChart, quantize
 from models.flavor_tag import FlavorTag
 from models.ranking import Ranking
 from models.brand_flavor_tag import BrandFlavorTag
-
-SAKENOWA_API_BASE = "https://muro.sakenowa.com/sakenowa-data/api"
-
-def configure_logging():
-    """Configure logging for Sakenowa API integration"""
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("sakenowa_update.log"),
-            logging.StreamHandler(sys.stdout)
-        ])
-    return logging.getLogger(__name__)
-
-logger = configure_logging()
-
-def fetch_data(endpoint):
-    """Fetch data from Sakenowa API"""
-    try:
-        url = f"{SAKENOWA_API_BASE}/{endpoint}"
-        logger.info(f"Fetching data from {url}")
-
-        response = requests.get(url,
-                            headers={'Accept': 'application/json'},
-                            timeout=60)
-        response.raise_for_status()
-
-        data = response.json()
-        logger.debug(f"Response data structure: {data.keys()}")
-
-        if endpoint == "flavor-charts":
-            items = data.get("flavorCharts", [])
-            logger.info(f"Received {len(items)} flavor charts")
-        elif endpoint == "areas":
-            items = data.get("areas", [])
-        elif endpoint == "breweries":
-            items = data.get("breweries", [])
-        elif endpoint == "brands":
-            items = data.get("brands", [])
-        elif endpoint == "rankings":
-            items = data
-        elif endpoint == "flavor-tags":
-            items = data.get("tags", [])  # 修正: "tags"を使用
-            logger.info(f"Received {len(items)} flavor tags")
-            logger.debug(f"Sample flavor tags: {items[:2]}")  # サンプルデータをログ出力
-            logger.debug(f"Flavor tag data structure: {items[0] if items else 'No data'}")  # タグの構造を確認
-        elif endpoint == "brand-flavor-tags":
-            items = data.get("flavorTags", [])  # 修正: "flavorTags"を使用
-            logger.info(f"Received {len(items)} brand flavor tags")
-            logger.debug(f"Sample brand flavor tags: {items[:2]}")  # サンプルデータをログ出力
-            logger.debug(f"Brand flavor tag data structure: {items[0] if items else 'No data'}")  # タグの構造を確認
+from models.catalog_listing import CatalogListing
+from logging_config import configure_logging, sampled
+from tag_loader import invalidate_flavor_tag_names
+from catalog import (catalog_version, invalidate_catalog_version,
+                     refresh_listings, refresh_rollups,
+                     refresh_tag_leaderboards)
+from catalog_snapshot import write_snapshot
+from sync_history import SyncRecorder, catalog_state, row_deltas
+from ranking_history import prune_history, record_generation
+
+# ローカルのスタブサーバー（benchmarks/sakenowa_stub.py）に向けることもできる
+SAKENOWA_API_BASE = os.environ.get(
+    'SAKENOWA_API_BASE', "https://muro.sakenowa.com/sakenowa-data/api")
+
+# 取得のリトライとサーキットブレーカー（環境変数で調整）
+FETCH_TIMEOUT = float(os.environ.get('SAKENOWA_TIMEOUT', 60))
+FETCH_RETRIES = int(os.environ.get('SAKENOWA_RETRIES', 4))
+BACKOFF_BASE = float(os.environ.get('SAKENOWA_BACKOFF_BASE', 1.0))
+BACKOFF_MAX = float(os.environ.get('SAKENOWA_BACKOFF_MAX', 30))
+BREAKER_THRESHOLD = int(os.environ.get('SAKENOWA_BREAKER_THRESHOLD', 5))
+BREAKER_COOLDOWN = float(os.environ.get('SAKENOWA_BREAKER_COOLDOWN', 300))
+CHECKPOINT_MAX_AGE = float(os.environ.get('SAKENOWA_CHECKPOINT_MAX_AGE', 6 * 3600))
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# 壊れた要素がこの割合を超えるペイロードは取り込まない
+MAX_INVALID_RATIO = 0.01
+# 既存件数のこの割合を下回る取得結果は上流の異常とみなす
+MIN_KEEP_RATIO = float(os.environ.get('SAKENOWA_MIN_KEEP_RATIO', 0.5))
+
+# エンドポイント -> (レスポンス中のキー, 各要素の必須キー)。取得はこの順
+ENDPOINTS = {
+    'areas': ('areas', ('id', 'name')),
+    'breweries': ('breweries', ('id', 'name', 'areaId')),
+    'brands': ('brands', ('id', 'name', 'breweryId')),
+    'flavor-charts': ('flavorCharts', ('brandId',)),
+    'flavor-tags': ('tags', ('id', 'tag')),
+    'brand-flavor-tags': ('flavorTags', ('brandId', 'tagIds')),
+    'rankings': (None, ()),
+}
+SHRINK_GUARDS = {
+    'areas': Region,
+    'breweries': Brewery,
+    'brands': Sake,
+    'flavor-tags': FlavorTag,
+}
+
+# ログは sakenowa_update.log にも非同期で書き出される（logging_config参照）
+configure_logging()
+logger = logging.getLogger('sakenowa')
+
+# 直近の update_database() のフェーズ別所要時間（秒）
+last_phase_timings = {}
+
+
+class PhaseTimer:
+    """Lap timer: lap(name) records the time since the previous lap"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.timings.clear()
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = round(now - self._last, 4)
+        self._last = now
+        logger.debug("Phase %s took %.3fs", phase, self.timings[phase])
+
+class SyncError(Exception):
+    """The sync was aborted before the catalog was touched"""
+
+
+class FetchError(SyncError):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpenError(FetchError):
+    def __init__(self, message):
+        super().__init__(message, retryable=False)
+
+
+class CircuitBreaker:
+    """Stop calling upstream after `threshold` consecutive failures
+
+    While open every call fails fast; after `cooldown` seconds one trial
+    call is let through (half-open) and its outcome closes or re-opens the
+    circuit. State is kept in a small JSON file so that separate
+    `flask sync-sakenowa` runs share it.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN,
+                 state_path=None, clock=time.time):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state_path = state_path
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path) as handle:
+                    state = json.load(handle)
+                self.failures = state.get('failures', 0)
+                self.opened_at = state.get('opened_at')
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable circuit state %s: %s",
+                               state_path, e)
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.cooldown - self._clock()
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Sakenowa API circuit is open; next attempt in {remaining:.0f}s")
+        logger.info("Sakenowa API circuit half-open, trying one request")
+
+    def record_success(self):
+        if self.failures or self.opened_at is not None:
+            logger.info("Sakenowa API circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._save()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.error("Sakenowa API circuit opened after %d failures",
+                             self.failures)
+            self.opened_at = self._clock()
+        self._save()
+
+    def _save(self):
+        if self.state_path:
+            _write_json(self.state_path, {'failures': self.failures,
+                                          'opened_at': self.opened_at})
+
+
+def _write_json(path, value):
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as handle:
+        json.dump(value, handle, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def checkpoint_dir():
+    """SAKENOWA_CHECKPOINT_DIR, or <instance>/sakenowa_checkpoints"""
+    directory = os.environ.get('SAKENOWA_CHECKPOINT_DIR')
+    if not directory:
+        base = (current_app.instance_path if has_app_context()
+                else tempfile.gettempdir())
+        directory = os.path.join(base, 'sakenowa_checkpoints')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class CheckpointStore:
+    """Validated endpoint payloads kept on disk until a sync commits
+
+    A sync that fails part-way resumes from here instead of fetching
+    everything again; checkpoints older than max_age are refetched.
+    """
+
+    def __init__(self, directory, max_age=CHECKPOINT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, endpoint):
+        return os.path.join(self.directory, f'{endpoint}.json')
+
+    def load(self, endpoint):
+        path = self._path(endpoint)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable checkpoint %s: %s", path, e)
+            return None
+
+    def save(self, endpoint, items):
+        _write_json(self._path(endpoint), items)
+
+    def clear(self):
+        for endpoint in ENDPOINTS:
+            try:
+                os.remove(self._path(endpoint))
+            except FileNotFoundError:
+                pass
+
+
+def _valid_items(endpoint, items, required):
+    """Drop malformed items; reject the payload if too many are malformed"""
+    if not isinstance(items, list):
+        raise FetchError(f"{endpoint}: expected a list, got {type(items).__name__}")
+    valid = [item for item in items
+             if isinstance(item, dict) and all(k in item for k in required)]
+    dropped = len(items) - len(valid)
+    if not valid:
+        raise FetchError(f"{endpoint}: no usable items in payload")
+    if dropped > len(items) * MAX_INVALID_RATIO:
+        raise FetchError(f"{endpoint}: {dropped} of {len(items)} items malformed")
+    if dropped:
+        logger.warning("%s: skipped %d malformed items", endpoint, dropped)
+    return valid
+
+
+def _extract(endpoint, data):
+    """Pull the item list out of a response body and validate it"""
+    if not isinstance(data, dict):
+        raise FetchError(f"{endpoint}: expected a JSON object")
+    if endpoint == 'rankings':
+        overall = _valid_items('rankings.overall', data.get('overall'),
+                               ('brandId', 'rank'))
+        areas = _valid_items('rankings.areas', data.get('areas'),
+                             ('areaId', 'ranking'))
+        return {'overall': overall, 'areas': areas}
+    key, required = ENDPOINTS[endpoint]
+    return _valid_items(endpoint, data.get(key), required)
+
+
+def fetch_data(endpoint, session=None, breaker=None, stats=None):
+    """Fetch and validate one Sakenowa endpoint
+
+    Transient failures (connection errors, 429/5xx, truncated or invalid
+    bodies) are retried with exponential backoff and full jitter.
+    Raises FetchError once retries are exhausted. When given, stats is
+    filled with attempts, latency_ms (all attempts) and bytes.
+    """
+    url = f"{SAKENOWA_API_BASE}/{endpoint}"
+    http = session or requests
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
+    for attempt in range(FETCH_RETRIES + 1):
+        stats['attempts'] = attempt + 1
+        if breaker is not None:
+            breaker.before_call()
+        retry_after = None
+        logger.info("Fetching data from %s", url)
+        try:
+            response = http.get(url, headers={'Accept': 'application/json'},
+                                timeout=FETCH_TIMEOUT)
+            if response.status_code in RETRYABLE_STATUS:
+                retry_after = response.headers.get('Retry-After')
+                raise FetchError(f"{endpoint}: HTTP {response.status_code}")
+            if response.status_code >= 400:
+                raise FetchError(f"{endpoint}: HTTP {response.status_code}",
+                                 retryable=False)
+            stats['bytes'] = len(response.content)
+            items = _extract(endpoint, response.json())
+        except FetchError as e:
+            error = e
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # JSONDecodeError は ValueError のサブクラス（途中で切れた本文など）
+            error = FetchError(f"{endpoint}: {e}")
         else:
-            items = []
-            logger.warning(f"Unknown endpoint: {endpoint}")
+            if breaker is not None:
+                breaker.record_success()
+            stats['latency_ms'] = round((time.perf_counter() - started) * 1000)
+            logger.info("Received %s %s", len(items), endpoint)
+            return items
+
+        if breaker is not None:
+            breaker.record_failure()
+        if not error.retryable or attempt == FETCH_RETRIES:
+            stats['latency_ms'] = round((time.perf_counter() - started) * 1000)
+            raise error
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+        logger.warning("%s; retry %d/%d in %.1fs", error, attempt + 1,
+                       FETCH_RETRIES, delay)
+        time.sleep(delay)
+
+
+def fetch_all(store, breaker, stats=None):
+    """Every endpoint's validated payload, resuming from checkpoints"""
+    payloads = {}
+    stats = {} if stats is None else stats
+    with requests.Session() as session:
+        for endpoint in ENDPOINTS:
+            items = store.load(endpoint)
+            if items is not None:
+                logger.info("Resuming %s from checkpoint", endpoint)
+                stats[endpoint] = {'checkpoint': True}
+            else:
+                stats[endpoint] = {'checkpoint': False}
+                items = fetch_data(endpoint, session=session, breaker=breaker,
+                                   stats=stats[endpoint])
+                store.save(endpoint, items)
+            payloads[endpoint] = items
+    return payloads
 
-        return items
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"HTTP Request failed for {endpoint}: {str(e)}", exc_info=True)
-        return []
-    except ValueError as e:
-        logger.error(f"JSON parsing failed for {endpoint}: {str(e)}", exc_info=True)
-        return []
-    except Exception as e:
-        logger.error(f"Unexpected error fetching data from {endpoint}: {str(e)}", exc_info=True)
-        return []
+def _check_not_shrinking(payloads):
+    """Refuse payloads far smaller than what the catalog already holds"""
+    for endpoint, model in SHRINK_GUARDS.items():
+        current = db.session.query(model).count()
+        fetched = len(payloads[endpoint])
+        if current and fetched < current * MIN_KEEP_RATIO:
+            raise SyncError(
+                f"{endpoint} returned {fetched} items but the catalog has "
+                f"{current}; refusing to replace it")
+
 
 def process_rankings(rankings, areas, sake_dict):
     """Process and insert ranking data"""
     ranking_count = 0
     try:
-        logger.info(f"Starting to process overall rankings")
+        logger.info("Starting to process overall rankings")
         # Process overall rankings
         for rank_data in rankings:
             try:
@@ -91,12 +340,12 @@ def process_rankings(rankings, areas, sake_dict):
                 score = rank_data.get("score", 0)
 
                 if not all([brand_id, rank is not None]):
-                    logger.warning(f"Missing required ranking data: {rank_data}")
+                    logger.warning("Missing required ranking data: %s", rank_data)
                     continue
 
                 sake_dict_str = {str(k): v for k, v in sake_dict.items()}
                 if brand_id not in sake_dict_str:
-                    logger.warning(f"Sake not found for brand_id {brand_id} in ranking")
+                    logger.warning("Sake not found for brand_id %s in ranking", brand_id)
                     continue
 
                 ranking = Ranking(
@@ -109,16 +358,16 @@ def process_rankings(rankings, areas, sake_dict):
                 ranking_count += 1
 
             except Exception as e:
-                logger.error(f"Error processing overall ranking data: {str(e)}", exc_info=True)
+                logger.error("Error processing overall ranking data: %s", e, exc_info=True)
                 continue
 
         # Process area rankings
-        logger.info(f"Starting to process area rankings")
-        logger.debug(f"Areas data received: {areas}")  # デバッグログを追加
+        logger.info("Starting to process area rankings")
+        logger.debug("Areas data received: %d areas", len(areas))  # デバッグログを追加
         for area in areas:
             area_id = area.get("areaId")
             area_rankings = area.get("ranking", [])
-            logger.debug(f"Processing area {area_id} with {len(area_rankings)} rankings")
+            logger.debug("Processing area %s with %s rankings", area_id, len(area_rankings))
 
             for rank_data in area_rankings:
                 try:
@@ -127,12 +376,12 @@ def process_rankings(rankings, areas, sake_dict):
                     score = rank_data.get("score", 0)
 
                     if not all([brand_id, rank is not None]):
-                        logger.warning(f"Missing required area ranking data: {rank_data}")
+                        logger.warning("Missing required area ranking data: %s", rank_data)
                         continue
 
                     sake_dict_str = {str(k): v for k, v in sake_dict.items()}
                     if brand_id not in sake_dict_str:
-                        logger.warning(f"Sake not found for brand_id {brand_id} in area ranking")
+                        logger.warning("Sake not found for brand_id %s in area ranking", brand_id)
                         continue
 
                     ranking = Ranking(
@@ -145,23 +394,74 @@ def process_rankings(rankings, areas, sake_dict):
                     ranking_count += 1
 
                 except Exception as e:
-                    logger.error(f"Error processing area ranking data: {str(e)}", exc_info=True)
+                    logger.error("Error processing area ranking data: %s", e, exc_info=True)
                     continue
 
-        logger.info(f"Finished processing rankings. Added {ranking_count} rankings")
+        logger.info("Finished processing rankings. Added %s rankings", ranking_count)
         return ranking_count
 
     except Exception as e:
-        logger.error(f"Error in process_rankings: {str(e)}", exc_info=True)
+        logger.error("Error in process_rankings: %s", e, exc_info=True)
         return 0
 
 def update_database():
-    """Update database with Sakenowa API data"""
+    """Update database with Sakenowa API data
+
+    Every endpoint is fetched and validated before anything is written;
+    the old rows are then replaced in one transaction, so a failed run
+    leaves the previous catalog in place. Each call is recorded in
+    sync_runs.
+    """
+    timer = PhaseTimer(last_phase_timings)
+    recorder = SyncRecorder()
+    ok = False
     try:
-        # Clear existing data
+        ok = _sync(timer, recorder)
+    finally:
+        recorder.finish(ok, timer.timings)
+    return ok
+
+
+def _sync(timer, recorder):
+    try:
+        store = CheckpointStore(checkpoint_dir())
+        breaker = CircuitBreaker(
+            state_path=os.path.join(store.directory, 'circuit.json'))
+        try:
+            payloads = fetch_all(store, breaker, stats=recorder.fetches)
+        except SyncError as e:
+            logger.error("Sakenowa sync aborted, catalog left unchanged: %s", e)
+            recorder.fail(e)
+            return False
+        timer.lap('fetch')
+
+        areas_data = payloads['areas']
+        breweries = payloads['breweries']
+        brands = payloads['brands']
+        flavor_charts = payloads['flavor-charts']
+        flavor_tags = payloads['flavor-tags']
+        brand_flavor_tags = payloads['brand-flavor-tags']
+        rankings_data = payloads['rankings']
+        overall_rankings = rankings_data['overall']
+        area_rankings = rankings_data['areas']
+        logger.info("Fetched %s areas, %s breweries, %s brands, %s flavor charts, "
+                    "%s flavor tags, %s brand flavor tags, %s overall rankings "
+                    "and %s area rankings", len(areas_data), len(breweries),
+                    len(brands), len(flavor_charts), len(flavor_tags),
+                    len(brand_flavor_tags), len(overall_rankings),
+                    len(area_rankings))
+
+        # 削除と投入を同じトランザクションで行う（失敗時は旧データがそのまま残る）
+        # 呼び出し側の読み取りで自動開始済みのトランザクションがあると begin() できないので閉じる
+        db.session.rollback()
         with db.session.begin():
-            logger.info("Clearing existing data...")
             try:
+                _check_not_shrinking(payloads)
+                # 行の増減はSakenowaのIDで比較する（削除→再投入でも追える）
+                state_before = catalog_state()
+                timer.lap('state')
+
+                logger.info("Clearing existing data...")
                 BrandFlavorTag.query.delete()
                 Ranking.query.delete()
                 FlavorTag.query.delete()
@@ -169,58 +469,8 @@ def update_database():
                 Sake.query.delete()
                 Brewery.query.delete()
                 Region.query.delete()
-                logger.info("Existing data cleared successfully")
-            except Exception as e:
-                logger.warning(f"Some tables might not exist yet: {e}")
-                db.session.rollback()
-
-        # Fetch all data
-        areas_data = fetch_data("areas")
-        if not areas_data:
-            raise ValueError("No areas data received")
-        logger.info(f"Fetched {len(areas_data)} areas")
-
-        breweries = fetch_data("breweries")
-        if not breweries:
-            raise ValueError("No breweries data received")
-        logger.info(f"Fetched {len(breweries)} breweries")
-
-        brands = fetch_data("brands")
-        if not brands:
-            raise ValueError("No brands data received")
-        logger.info(f"Fetched {len(brands)} brands")
-
-        # Fetch flavor charts
-        flavor_charts = fetch_data("flavor-charts")
-        if not flavor_charts:
-            logger.warning("No flavor charts data received")
-        else:
-            logger.info(f"Fetched {len(flavor_charts)} flavor charts")
+                timer.lap('clear')
 
-        # Fetch flavor tags
-        flavor_tags = fetch_data("flavor-tags")
-        if not flavor_tags:
-            logger.warning("No flavor tags data received")
-        else:
-            logger.info(f"Fetched {len(flavor_tags)} flavor tags")
-
-        # Fetch brand flavor tags
-        brand_flavor_tags = fetch_data("brand-flavor-tags")
-        if not brand_flavor_tags:
-            logger.warning("No brand flavor tags data received")
-        else:
-            logger.info(f"Fetched {len(brand_flavor_tags)} brand flavor tags")
-
-        # Fetch rankings data
-        rankings_data = fetch_data("rankings")
-        if rankings_data:
-            overall_rankings = rankings_data.get("overall", [])
-            area_rankings = rankings_data.get("areas", [])
-            logger.info(f"Fetched {len(overall_rankings)} overall rankings and {len(area_rankings)} area rankings")
-
-        # Process data within a transaction
-        with db.session.begin():
-            try:
                 # Process regions
                 regions_dict = {}
                 for area in areas_data:
@@ -233,7 +483,8 @@ def update_database():
                     regions_dict[area_id] = region
 
                 db.session.flush()
-                logger.info(f"Added {len(regions_dict)} regions")
+                logger.info("Added %s regions", len(regions_dict))
+                timer.lap('regions')
 
                 # Process breweries
                 breweries_dict = {}
@@ -250,10 +501,11 @@ def update_database():
                         db.session.add(b)
                         breweries_dict[brewery_id] = b
                     else:
-                        logger.warning(f"Region {area_id} not found for brewery {brewery['name']}")
+                        logger.warning("Region %s not found for brewery %s", area_id, brewery['name'])
 
                 db.session.flush()
-                logger.info(f"Added {len(breweries_dict)} breweries")
+                logger.info("Added %s breweries", len(breweries_dict))
+                timer.lap('breweries')
 
                 # Process sakes
                 sake_dict = {}
@@ -270,10 +522,11 @@ def update_database():
                         db.session.add(sake)
                         sake_dict[brand_id] = sake
                     else:
-                        logger.warning(f"Brewery {brewery_id} not found for sake {brand['name']}")
+                        logger.warning("Brewery %s not found for sake %s", brewery_id, brand['name'])
 
                 db.session.flush()
-                logger.info(f"Added {len(sake_dict)} sakes")
+                logger.info("Added %s sakes", len(sake_dict))
+                timer.lap('sakes')
 
                 # Process flavor tags
                 flavor_tag_dict = {}
@@ -283,13 +536,14 @@ def update_database():
                             flavor_tag = FlavorTag(name=tag["tag"], sakenowa_id=str(tag["id"]))
                             db.session.add(flavor_tag)
                             flavor_tag_dict[str(tag["id"])] = flavor_tag
-                            logger.debug(f"Added flavor tag: {tag['tag']} with ID {tag['id']}")
+                            logger.debug("Added flavor tag: %s with ID %s", tag['tag'], tag['id'])
                         except KeyError as e:
-                            logger.error(f"Missing key in flavor tag data: {e}")
+                            logger.error("Missing key in flavor tag data: %s", e)
                             continue
 
                     db.session.flush()
-                    logger.info(f"Added {len(flavor_tag_dict)} flavor tags")
+                    logger.info("Added %s flavor tags", len(flavor_tag_dict))
+                timer.lap('flavor_tags')
 
                 # Process brand flavor tags
                 brand_flavor_tag_count = 0
@@ -310,75 +564,111 @@ def update_database():
                                         db.session.add(brand_flavor_tag)
                                         brand_flavor_tag_count += 1
                                         if brand_flavor_tag_count % 100 == 0:
-                                            logger.info(f"Processed {brand_flavor_tag_count} brand flavor tags")
+                                            logger.info("Processed %s brand flavor tags", brand_flavor_tag_count, extra=sampled())
                             else:
-                                logger.warning(f"Sake not found for brand_id {brand_id}")
+                                logger.warning("Sake not found for brand_id %s", brand_id)
                         except KeyError as e:
-                            logger.error(f"Missing key in brand flavor tag data: {e}")
+                            logger.error("Missing key in brand flavor tag data: %s", e)
                             continue
 
-                    logger.info(f"Added {brand_flavor_tag_count} brand flavor tags")
+                    logger.info("Added %s brand flavor tags", brand_flavor_tag_count)
+                timer.lap('brand_flavor_tags')
 
                 # Process flavor charts
                 flavor_chart_count = 0
                 if flavor_charts:
                     for chart in flavor_charts:
                         brand_id = str(chart.get("brandId"))
-                        logger.debug(f"Processing flavor chart for brand_id: {brand_id}")
+                        logger.debug("Processing flavor chart for brand_id: %s", brand_id)
 
                         if brand_id in sake_dict:
                             try:
+                                values = [float(chart.get(f"f{i}", 0))
+                                          for i in range(1, 7)]
+                                f1, f2, f3, f4, f5, f6 = values
+                                # 段階コードと説明文は取り込み時に確定させる
                                 flavor_chart = FlavorChart(
                                     sake_id=sake_dict[brand_id].id,
-                                    f1=float(chart.get("f1", 0)),
-                                    f2=float(chart.get("f2", 0)),
-                                    f3=float(chart.get("f3", 0)),
-                                    f4=float(chart.get("f4", 0)),
-                                    f5=float(chart.get("f5", 0)),
-                                    f6=float(chart.get("f6", 0))
+                                    f1=f1, f2=f2, f3=f3, f4=f4, f5=f5, f6=f6,
+                                    **quantize(values)
                                 )
                                 db.session.add(flavor_chart)
                                 flavor_chart_count += 1
                             except (ValueError, TypeError) as e:
-                                logger.error(f"Error processing flavor values for brand_id {brand_id}: {e}")
+                                logger.error("Error processing flavor values for brand_id %s: %s", brand_id, e)
                                 continue
                         else:
-                            logger.warning(f"Sake not found for brand_id {brand_id} in flavor chart")
+                            logger.warning("Sake not found for brand_id %s in flavor chart", brand_id)
 
-                    logger.info(f"Added {flavor_chart_count} flavor charts")
+                    logger.info("Added %s flavor charts", flavor_chart_count)
+                timer.lap('flavor_charts')
 
                 # Process rankings with both overall and area rankings
-                if rankings_data:
-                    ranking_count = process_rankings(
-                        rankings=overall_rankings,
-                        areas=area_rankings,
-                        sake_dict=sake_dict
-                    )
-                    logger.info(f"Added {ranking_count} rankings")
-
-                # Final commit
-                db.session.commit()
-                logger.info("All data committed successfully")
+                ranking_count = process_rankings(
+                    rankings=overall_rankings,
+                    areas=area_rankings,
+                    sake_dict=sake_dict
+                )
+                logger.info("Added %s rankings", ranking_count)
+                timer.lap('rankings')
 
-                # Log final counts
-                logger.info("Final database counts:")
-                logger.info(f"Regions: {Region.query.count()}")
-                logger.info(f"Breweries: {Brewery.query.count()}")
-                logger.info(f"Sakes: {Sake.query.count()}")
-                logger.info(f"Rankings: {Ranking.query.count()}")
-                logger.info(f"Flavor Charts: {FlavorChart.query.count()}")
-                logger.info(f"Flavor Tags: {FlavorTag.query.count()}")
-                logger.info(f"Brand Flavor Tags: {BrandFlavorTag.query.count()}")
+                # 今回のランキングを履歴に1世代として追記し、古い世代を間引く
+                db.session.flush()
+                record_generation()
+                prune_history()
+                timer.lap('ranking_history')
 
-                return True
+                db.session.flush()
+                recorder.tables = row_deltas(state_before, catalog_state())
+                timer.lap('deltas')
 
+                # 一覧ページ用の非正規化テーブルも同じトランザクションで作り直す
+                refresh_listings(commit=False)
+                timer.lap('listings')
+                db.session.flush()
+                refresh_rollups(commit=False)
+                timer.lap('rollups')
+                refresh_tag_leaderboards(commit=False)
+                timer.lap('leaderboards')
+
+            except SyncError as e:
+                logger.error("Sakenowa sync aborted, catalog left unchanged: %s", e)
+                recorder.fail(e)
+                db.session.rollback()
+                # 疑わしいペイロードから再開しないよう、次回は取り直す
+                store.clear()
+                return False
             except Exception as e:
-                logger.error(f"Error processing data: {str(e)}", exc_info=True)
+                logger.error("Error processing data: %s", e, exc_info=True)
+                recorder.fail(e)
                 db.session.rollback()
                 return False
 
+        # begin() ブロックを抜けた時点でコミット済み
+        timer.lap('commit')
+        logger.info("All data committed successfully")
+        store.clear()
+        invalidate_catalog_version()
+        invalidate_flavor_tag_names()
+
+        # 各ワーカーが共有するmmapスナップショットを差し替える
+        try:
+            write_snapshot(version=catalog_version())
+        except Exception as e:
+            logger.error("Failed to write catalog snapshot: %s", e, exc_info=True)
+        timer.lap('snapshot')
+
+        for table, delta in recorder.tables.items():
+            logger.info("%s: %s rows (+%s ~%s -%s)", table, delta['rows'],
+                        delta['inserted'], delta['updated'], delta['deleted'])
+
+        # 読み取りだけで始まったトランザクションを閉じ、次回の begin() に備える
+        db.session.rollback()
+        return True
+
     except Exception as e:
-        logger.error(f"Database update failed: {str(e)}", exc_info=True)
+        logger.error("Database update failed: %s", e, exc_info=True)
+        recorder.fail(e)
         return False
 
 def clear_database():
@@ -386,6 +676,7 @@ def clear_database():
     try:
         logger.info("Starting database clear")
         with db.session.begin():
+            CatalogListing.query.delete()
             BrandFlavorTag.query.delete()
             Ranking.query.delete()
             FlavorTag.query.delete()
@@ -396,7 +687,7 @@ def clear_database():
             logger.info("All tables cleared")
         return True
     except Exception as e:
-        logger.error(f"Error clearing database: {str(e)}", exc_info=True)
+        logger.error("Error clearing database: %s", e, exc_info=True)
         return False
 
 if __name__ == '__main__':
@@ -410,5 +701,5 @@ if __name__ == '__main__':
                 logger.error("Database update failed")
                 sys.exit(1)
     except Exception as e:
-        logger.error(f"Failed to run database update: {str(e)}", exc_info=True)
+        logger.error("Failed to run database update: %s", e, exc_info=True)
         sys.exit(1)
\ No newline at end of file
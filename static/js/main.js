@@ -86,6 +86,9 @@ document.addEventListener('DOMContentLoaded', function() {
                             }
                         }
 
+                        const tags = (ranking.tags || []).map(name =>
+                            `<span class="badge bg-tag"><i class="bi bi-tag-fill me-1"></i>${name}</span>`).join('');
+
                         html += `
                             <div class="col-md-6 col-lg-4">
                                 <a href="/sake/${ranking.sake_id}" class="card-link text-decoration-none">
@@ -105,6 +108,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                                 </span>
                                                 <small class="text-muted ms-2">${ranking.score.toFixed(1)}</small>
                                             </p>
+                                            ${tags ? `<div class="flavor-tags d-flex flex-wrap gap-1">${tags}</div>` : ''}
                                         </div>
                                     </div>
                                 </a>
@@ -0,0 +1,166 @@
+"""
+Streaming page rendering and response compression
+Large result pages are rendered with stream_template() so the first bytes
+leave before the last row is fetched, and compressible responses (streamed
+or not) are gzip/brotli encoded on the fly.
+"""
+import gzip
+import logging
+import zlib
+
+from flask import get_flashed_messages, request, stream_template
+from flask_login import current_user
+from werkzeug.wsgi import ClosingIterator
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = frozenset([
+    'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+])
+MIN_SIZE = 1024
+# ストリーミング時はこのサイズ毎に圧縮データを送り出す
+FLUSH_BYTES = 8 * 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def stream_page(template_name, **context):
+    """stream_template() that is safe to use with flash() and Flask-Login
+
+    Headers (and the session cookie) are sent before the body is rendered,
+    so anything that touches the session must happen here, not in the
+    template: pop the flashed messages and resolve current_user up front.
+
+    The request's db.session is removed before the body is generated, so
+    pass un-executed queries (they run inside the stream) or results whose
+    relationships were eager loaded; lazy loads on them would fail.
+    Those queries reopen the removed session, so it is closed again once
+    the body has been sent (otherwise its connection stays checked out).
+    """
+    get_flashed_messages(with_categories=True)
+    current_user._get_current_object()
+    session = db.session()
+    return ClosingIterator(stream_template(template_name, **context),
+                           session.close)
+
+
+class _GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self):
+        # wbits=31 -> gzipヘッダー付き
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+class _BrotliEncoder:
+    name = 'br'
+
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=5)
+
+    def process(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+def preferred_encoding(candidates):
+    """The candidate the client accepts with the highest q, or None
+
+    Ties go to the earlier candidate. 'br;q=0' and '*;q=0' are refusals.
+    """
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for name in candidates:
+        quality = accepted[name]
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _choose_encoder():
+    encoding = preferred_encoding(('br', 'gzip') if brotli is not None else ('gzip',))
+    if encoding == 'br':
+        return _BrotliEncoder()
+    if encoding == 'gzip':
+        return _GzipEncoder()
+    return None
+
+
+def _compress_stream(chunks, encoder):
+    pending = 0
+    for chunk in chunks:
+        out = encoder.process(chunk)
+        pending += len(chunk)
+        if pending >= FLUSH_BYTES:
+            out += encoder.flush()
+            pending = 0
+        if out:
+            yield out
+    yield encoder.finish()
+
+
+def _weaken_etag(response):
+    # 圧縮後は別の表現になるので弱いETagにする（If-None-Matchは弱比較で照合）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """after_request hook: encode compressible responses"""
+    if (request.method == 'HEAD' or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoder = _choose_encoder()
+    if encoder is None:
+        return response
+
+    if response.is_streamed:
+        # 元の本文の close() を引き継ぐ（stream_page のセッション解放など）
+        body = response.response
+        response.response = ClosingIterator(
+            _compress_stream(response.iter_encoded(), encoder),
+            getattr(body, 'close', None))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        if encoder.name == 'gzip':
+            body = gzip.compress(data, compresslevel=6)
+        else:
+            body = brotli.compress(data, quality=5)
+        response.set_data(body)
+
+    response.headers['Content-Encoding'] = encoder.name
+    _weaken_etag(response)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,142 @@
+"""
+Sakenowa sync run history
+Each update_database() call records one sync_runs row: phase timings,
+per-endpoint fetch latency and size, per-table row deltas and the outcome.
+Rows are written on their own connection so that a failed catalog
+transaction still leaves its run behind.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from models import db
+from models.brand_flavor_tag import BrandFlavorTag
+from models.brewery import Brewery
+from models.flavor_chart import FlavorChart
+from models.flavor_tag import FlavorTag
+from models.ranking import Ranking
+from models.region import Region
+from models.sake import Sake
+from models.sync_run import SyncRun
+
+logger = logging.getLogger(__name__)
+
+# このプロセスで実行中の同期の数（readiness チェックが見る）
+_running = 0
+_running_lock = threading.Lock()
+
+
+def sync_running():
+    """True while update_database() is running in this process"""
+    return _running > 0
+
+
+def _state_statements():
+    """table -> (SELECT of natural key columns + content columns, key width)
+
+    Keys are Sakenowa ids, which survive the delete + reinsert of a sync,
+    so comparing two states gives real inserted/updated/deleted counts.
+    """
+    return {
+        'regions': (select(Region.sakenowa_id, Region.name), 1),
+        'breweries': (select(Brewery.sakenowa_brewery_id, Brewery.name,
+                             Region.sakenowa_id)
+                      .join(Region, Brewery.region_id == Region.id), 1),
+        'sakes': (select(Sake.sakenowa_id, Sake.name,
+                         Brewery.sakenowa_brewery_id)
+                  .join(Brewery, Sake.brewery_id == Brewery.id), 1),
+        'flavor_tags': (select(FlavorTag.sakenowa_id, FlavorTag.name), 1),
+        'flavor_charts': (select(Sake.sakenowa_id, FlavorChart.f1,
+                                 FlavorChart.f2, FlavorChart.f3,
+                                 FlavorChart.f4, FlavorChart.f5,
+                                 FlavorChart.f6)
+                          .join(Sake, FlavorChart.sake_id == Sake.id), 1),
+        'rankings': (select(Ranking.category, Sake.sakenowa_id, Ranking.rank,
+                            Ranking.score)
+                     .join(Sake, Ranking.sake_id == Sake.id), 2),
+        'brand_flavor_tags': (select(Sake.sakenowa_id, FlavorTag.sakenowa_id)
+                              .select_from(BrandFlavorTag)
+                              .join(Sake, BrandFlavorTag.sake_id == Sake.id)
+                              .join(FlavorTag,
+                                    BrandFlavorTag.flavor_tag_id == FlavorTag.id),
+                              2),
+    }
+
+
+def catalog_state():
+    """{table: {natural key: content tuple}} read in the current transaction"""
+    state = {}
+    for table, (stmt, width) in _state_statements().items():
+        state[table] = {tuple(row[:width]): tuple(row[width:])
+                        for row in db.session.execute(stmt)}
+    return state
+
+
+def row_deltas(before, after):
+    """Per-table inserted/updated/deleted counts between two states"""
+    deltas = {}
+    for table, new in after.items():
+        old = before.get(table, {})
+        common = old.keys() & new.keys()
+        deltas[table] = {
+            'inserted': len(new.keys() - old.keys()),
+            'updated': sum(1 for key in common if old[key] != new[key]),
+            'deleted': len(old.keys() - new.keys()),
+            'rows': len(new),
+        }
+    return deltas
+
+
+class SyncRecorder:
+    """Collects what a sync did and writes it to sync_runs"""
+
+    def __init__(self):
+        global _running
+        with _running_lock:
+            _running += 1
+        self.fetches = {}
+        self.tables = {}
+        self.error = None
+        self.run_id = None
+        self._started = time.perf_counter()
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(insert(SyncRun).values(
+                    started_at=datetime.utcnow(), status='running'))
+                self.run_id = result.inserted_primary_key[0]
+        except Exception as e:
+            # sync_runs が未作成（マイグレーション前）でも同期自体は続ける
+            logger.error("Failed to record sync run start: %s", e)
+
+    def fail(self, error):
+        self.error = str(error)
+
+    def finish(self, ok, phases):
+        global _running
+        with _running_lock:
+            _running -= 1
+        if self.run_id is None:
+            return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(SyncRun).where(SyncRun.id == self.run_id).values(
+                    finished_at=datetime.utcnow(),
+                    status='succeeded' if ok else 'failed',
+                    error=None if ok else (self.error or 'unknown error'),
+                    duration_ms=round((time.perf_counter() - self._started) * 1000),
+                    phases=dict(phases),
+                    fetches=self.fetches,
+                    tables=self.tables,
+                ))
+        except Exception as e:
+            logger.error("Failed to record sync run %s: %s", self.run_id, e)
+
+
+def recent_runs(limit=20, status=None):
+    query = SyncRun.query.order_by(SyncRun.started_at.desc(), SyncRun.id.desc())
+    if status:
+        query = query.filter(SyncRun.status == status)
+    return query.limit(limit).all()
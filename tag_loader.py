@@ -0,0 +1,96 @@
+"""
+Batch flavor tag loading for listing pages
+Cards never touch the BrandFlavorTag relationship: catalog_listings (and
+the catalog snapshot) already carry each sake's tag ids, and the id ->
+name map is cached in each worker, so tag chips on a page of N cards
+cost no queries at all. For sakes without a listing row the tags for a
+whole page are fetched with one IN query.
+"""
+import logging
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from cache import TTLCache
+from catalog_snapshot import get_snapshot
+from models import db
+from models.brand_flavor_tag import BrandFlavorTag
+from models.flavor_tag import FlavorTag
+
+logger = logging.getLogger(__name__)
+
+# カード1枚に並べるタグの数
+CARD_TAG_LIMIT = 4
+
+TagRef = namedtuple('TagRef', 'id sakenowa_id name')
+
+# タグ名の表。同期後も catalog_version と同じく30秒以内に新しい表へ切り替わる
+_names_cache = TTLCache('flavor_tag_names', ttl=30, maxsize=1)
+
+
+def flavor_tag_names():
+    """flavor_tags.id -> TagRef, cached for a few seconds per worker"""
+    names = _names_cache.get('names')
+    if names is None:
+        names = {tag_id: TagRef(tag_id, sakenowa_id, name)
+                 for tag_id, sakenowa_id, name in db.session.execute(
+                     select(FlavorTag.id, FlavorTag.sakenowa_id, FlavorTag.name))}
+        _names_cache.set('names', names)
+    return names
+
+
+def invalidate_flavor_tag_names():
+    """Forget this worker's tag names (call after a sync)"""
+    _names_cache.clear()
+
+
+def tags_for_ids(tag_ids, names=None, limit=None):
+    """TagRefs for precomputed tag ids (catalog_listings.tag_ids), by name"""
+    names = flavor_tag_names() if names is None else names
+    tags = sorted((names[t] for t in tag_ids or () if t in names),
+                  key=lambda tag: tag.name)
+    return tags[:limit] if limit else tags
+
+
+def _snapshot_tag_ids(snapshot, sake_ids):
+    found = {}
+    for sake_id in sake_ids:
+        i = snapshot.index_of(sake_id)
+        if i is None:
+            return None  # スナップショットが古い。DBから引き直す
+        found[sake_id] = snapshot.tag_ids(i)
+    return found
+
+
+def load_flavor_tags(sake_ids, limit=None):
+    """sake_id -> [TagRef] for a page of sakes without catalog_listings rows
+
+    Reads the memory-mapped snapshot when it covers every id, otherwise one
+    IN query on brand_flavor_tags. Never issues a query per sake.
+    """
+    sake_ids = list(dict.fromkeys(sake_ids))
+    if not sake_ids:
+        return {}
+    names = flavor_tag_names()
+    tag_ids = None
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        tag_ids = _snapshot_tag_ids(snapshot, sake_ids)
+    if tag_ids is None:
+        tag_ids = {sake_id: [] for sake_id in sake_ids}
+        for sake_id, tag_id in db.session.execute(
+                select(BrandFlavorTag.sake_id, BrandFlavorTag.flavor_tag_id)
+                .where(BrandFlavorTag.sake_id.in_(sake_ids))):
+            tag_ids[sake_id].append(tag_id)
+    return {sake_id: tags_for_ids(ids, names, limit)
+            for sake_id, ids in tag_ids.items()}
+
+
+def card_tags(tag_ids, limit=CARD_TAG_LIMIT):
+    """Template helper: the first few tags of a listing row, by name"""
+    return tags_for_ids(tag_ids, limit=limit)
+
+
+def init_tag_loader(app):
+    """Register the template helpers"""
+    app.jinja_env.globals.update(card_tags=card_tags)
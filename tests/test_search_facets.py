@@ -0,0 +1,81 @@
+"""
+Search facets: every facet's count must equal the result count of the
+search its link leads to (run with python -m pytest from the repo root)
+"""
+import html
+import os
+import re
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FACET_LINK = re.compile(
+    r'<a href="(/search\?[^"]+)" class="[^"]*text-decoration-none">\s*'
+    r'(?:[^<]+?) (?:<span class="opacity-75">(\d+)</span>|\((\d+)\))')
+RESULT_COUNT = re.compile(r'(\d+)件見つかりました')
+
+SEARCHES = [
+    '/search',
+    '/search?q=%E9%9B%AA',
+    '/search?flavor_direction=dry&flavor_intensity=8',
+    '/search?flavor_direction=sweet&flavor_intensity=3',
+    '/search?flavor_direction=fresh,dry&flavor_intensity=6',
+]
+
+
+@pytest.fixture(scope='module')
+def client():
+    directory = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(directory, 'facets.db')}",
+                      CATALOG_SNAPSHOT_PATH=os.path.join(directory, 'catalog.snapshot'),
+                      RATE_LIMIT_ENABLED='0', LOG_LEVEL='WARNING')
+    from app import create_app
+    from benchmarks.catalog_factory import seed_catalog
+    from catalog_snapshot import write_snapshot
+
+    app = create_app()
+    with app.app_context():
+        seed_catalog(scale=0.2)
+        write_snapshot()
+    return app.test_client()
+
+
+def _page(client, url):
+    response = client.get(url)
+    body = response.get_data(as_text=True)
+    response.close()
+    assert response.status_code == 200
+    return body
+
+
+def _result_count(body):
+    match = RESULT_COUNT.search(body)
+    return int(match.group(1)) if match else 0
+
+
+def _facets(body):
+    start = body.index('search-facets')
+    section = body[start:body.index('search-results-card', start)]
+    return [(html.unescape(url), int(badge or plain))
+            for url, badge, plain in FACET_LINK.findall(section)]
+
+
+@pytest.mark.parametrize('url', SEARCHES)
+def test_facet_counts_match_their_links(client, url):
+    facets = _facets(_page(client, url))
+    assert facets
+    for link, count in facets:
+        assert _result_count(_page(client, link)) == count, link
+
+
+def test_region_and_tag_searches_follow_facet_counts(client):
+    # 都道府県・タグで絞った先のページのファセットも同じ規則で数える
+    body = _page(client, '/search')
+    links = [link for link, _ in _facets(body)]
+    for link in ([l for l in links if 'region=' in l][:1]
+                 + [l for l in links if 'flavor_tag=' in l][:1]):
+        for facet_link, count in _facets(_page(client, link)):
+            assert _result_count(_page(client, facet_link)) == count, facet_link
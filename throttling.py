@@ -0,0 +1,181 @@
+"""
+Request coalescing and rate limiting
+SingleFlight lets concurrent identical requests in one worker share a
+single in-flight computation; the token-bucket limiter turns bursts from
+one client into cheap 429s before they reach the database pool.
+
+Both are per process: with N workers the effective rate limit is up to N
+times the configured one.
+"""
+import logging
+import math
+import threading
+import time
+
+from flask import Response, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# 先行リクエストが戻らない場合、後続はこの秒数待ってから自分で実行する
+FLIGHT_WAIT_SECONDS = 30
+# これを超えたら満タンで放置されたバケットを掃除する
+MAX_BUCKETS = 10000
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run fn() once per key among concurrent callers and share the result
+
+    Results must be safe to share between threads (plain data or Row
+    tuples, not ORM instances bound to the leader's session).
+    """
+
+    def __init__(self, wait_seconds=FLIGHT_WAIT_SECONDS):
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0  # 相乗りできた回数（観測用）
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if call.done.wait(self.wait_seconds):
+                if call.error is not None:
+                    raise call.error
+                with self._lock:
+                    self.shared += 1
+                return call.result
+            logger.warning("Single-flight wait timed out for %s", key)
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+            if call.waiters:
+                logger.debug("Single-flight %s shared with %d waiters", key,
+                             call.waiters)
+
+
+single_flight = SingleFlight()
+
+
+class RateLimiter:
+    """Token bucket per (client, rule)
+
+    rules maps an endpoint name, or "METHOD endpoint" to limit only one
+    method (e.g. "POST main.import_reviews"), to (tokens per second,
+    burst size).
+    """
+
+    def __init__(self, rules, clock=time.monotonic):
+        self.rules = dict(rules)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # (client, endpoint) -> [tokens, updated_at]
+
+    def rule_for(self, endpoint, method):
+        """The rule name that applies to a request, or None"""
+        # メソッド指定のルールを優先する（フォームの表示は数えずに送信だけ数える等）
+        for name in (f'{method} {endpoint}', endpoint):
+            if name in self.rules:
+                return name
+        return None
+
+    def acquire(self, client, rule_name):
+        """None when allowed, otherwise seconds until a token is available"""
+        rule = self.rules.get(rule_name)
+        if rule is None:
+            return None
+        rate, burst = rule
+        now = self._clock()
+        key = (client, rule_name)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[key] = [burst, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return None
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def _prune(self, now):
+        # 満タンまで回復しているバケットは初期状態と同じなので捨ててよい
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            rate, burst = self.rules[key[1]]
+            if tokens + (now - updated_at) * rate >= burst:
+                del self._buckets[key]
+
+
+def client_address(proxy_count=0):
+    """Client IP, taking the Nth-from-last X-Forwarded-For hop behind proxies"""
+    if proxy_count:
+        hops = [h.strip() for h in
+                request.headers.get('X-Forwarded-For', '').split(',') if h.strip()]
+        if len(hops) >= proxy_count:
+            return hops[-proxy_count]
+    return request.remote_addr or 'unknown'
+
+
+def _too_many_requests(retry_after):
+    seconds = str(max(1, math.ceil(retry_after)))
+    # JSONを返すエンドポイントにはJSON、ページには短いテキストで返す
+    if request.path.startswith('/api/') or request.endpoint == 'main.area_rankings':
+        response = jsonify({'error': 'Too many requests'})
+        response.status_code = 429
+    else:
+        response = Response('リクエストが多すぎます。しばらくしてから再度お試しください。',
+                            status=429, mimetype='text/plain')
+    response.headers['Retry-After'] = seconds
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_throttling(app):
+    """Register the rate limiter as the first before_request hook"""
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+    limiter = RateLimiter(app.config.get('RATE_LIMITS', {}))
+    proxy_count = app.config.get('TRUSTED_PROXY_COUNT', 0)
+    app.extensions['rate_limiter'] = limiter
+
+    @app.before_request
+    def apply_rate_limit():
+        rule_name = limiter.rule_for(request.endpoint, request.method)
+        if rule_name is None:
+            return None
+        client = client_address(proxy_count)
+        retry_after = limiter.acquire(client, rule_name)
+        if retry_after is None:
+            return None
+        logger.info("Rate limited %s on %s", client, request.endpoint)
+        return _too_many_requests(retry_after)
+
+    logger.info("Rate limiting enabled for %s", ', '.join(sorted(limiter.rules)))